@@ -0,0 +1,207 @@
+import concurrent.futures
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import typing as t
+from contextlib import redirect_stdout
+
+from pytest_embedded.utils import to_str
+
+
+def decode_panic(panic_output: bytes, target: str, toolchain_prefix: str, prefix_map_path: str, elf_file: str) -> str:
+    """
+    Decode the panic output with `gdb` and `esp_idf_panic_decoder`.
+
+    Returns:
+        The backtrace
+
+    Raises:
+        subprocess.CalledProcessError: if `gdb` failed
+    """
+    with tempfile.NamedTemporaryFile(mode='wb', delete=False) as panic_output_file:
+        panic_output_file.write(panic_output)
+        panic_output_file.flush()
+
+    cmd = [
+        f'{toolchain_prefix}gdb',
+        '--command',
+        prefix_map_path,
+        '--batch',
+        '-n',
+        elf_file,
+        '-ex',
+        f'target remote | "{sys.executable}" -m esp_idf_panic_decoder --target {target} "{panic_output_file.name}"',
+        '-ex',
+        'bt',
+    ]
+    try:
+        return subprocess.check_output(cmd, stderr=subprocess.STDOUT).decode('utf-8')
+    finally:
+        try:
+            os.unlink(panic_output_file.name)
+        except OSError as e:
+            logging.debug(f"Couldn't remove temporary panic output file ({e})")
+
+
+def decode_coredump(coredump: bytes, target: str, elf_file: str, core_format: str | None = None) -> str:
+    """
+    Decode the core dump with `esp_coredump`.
+
+    Args:
+        coredump: the base64 encoded core dump printed to UART, or the raw one read from the flash
+        core_format: ``raw`` for the core dumps read from the flash. Detected by `esp_coredump` if not set
+
+    Returns:
+        The output of ``info_corefile``
+    """
+    from esp_coredump import CoreDump  # need IDF_PATH
+
+    with tempfile.NamedTemporaryFile(mode='wb', delete=False) as coredump_file:
+        coredump_file.write(coredump.strip().replace(b'\r', b'') if core_format != 'raw' else coredump)
+        coredump_file.flush()
+
+    try:
+        kwargs = {'core_format': core_format} if core_format else {}
+        coredump = CoreDump(chip=target, core=coredump_file.name, prog=elf_file, **kwargs)
+        output = io.StringIO()
+        with redirect_stdout(output):
+            coredump.info_corefile()
+        return output.getvalue()
+    finally:
+        os.remove(coredump_file.name)
+
+
+class DecodePool:
+    """
+    Session scoped process pool decoding the panic output and the core dumps captured while the DUT teardown, so
+    that the next test case starts without waiting for `gdb` or `esp_coredump`.
+
+    Identical dumps are decoded only once, even if they are captured by different DUTs. The decoded outputs are
+    written to the same files as decoding them while teardown, at the end of the session. They're also collected by
+    the test case capturing them, to be attached to the junit report, see `pop_junit_outputs()`.
+    """
+
+    MAX_WORKERS = 4
+
+    _executor: t.ClassVar[concurrent.futures.ProcessPoolExecutor | None] = None
+    # decoding of each dump, keyed by the SHA-256 of the dump and how it's decoded
+    _futures: t.ClassVar[dict[str, concurrent.futures.Future]] = {}
+    # keys of the dumps decoded into each output file, in the order they're captured
+    _outputs: t.ClassVar[dict[str, list[str]]] = {}
+    # test case capturing the dumps of each output file
+    _test_cases: t.ClassVar[dict[str, str]] = {}
+    # test case name -> junit tag, ``system-out`` for the decoded outputs, ``system-err`` for the errors -> texts
+    _junit_outputs: t.ClassVar[dict[str, dict[str, list[str]]]] = {}
+    _duplicates = 0
+
+    @classmethod
+    def submit(
+        cls,
+        output_path: str,
+        fn: t.Callable[..., str],
+        dump: bytes,
+        test_case_name: str | None = None,
+        **kwargs,
+    ) -> None:
+        """
+        Queue the decoding of one dump.
+
+        Args:
+            output_path: file to write the decoded output to. Outputs of several dumps are joined
+            fn: picklable function decoding the dump, called as ``fn(dump, **kwargs)`` in a worker process
+            dump: raw bytes of the dump
+            test_case_name: name of the test case capturing the dump, the one to attach the decoded output to
+        """
+        sha256 = hashlib.sha256(dump)
+        sha256.update(repr((getattr(fn, '__module__', None), fn.__qualname__, sorted(kwargs.items()))).encode())
+        key = sha256.hexdigest()
+
+        if key in cls._futures:
+            logging.debug('Identical dump already queued for decoding, skipped')
+            cls._duplicates += 1
+        else:
+            if cls._executor is None:
+                cls._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=min(cls.MAX_WORKERS, os.cpu_count() or 1),
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            cls._futures[key] = cls._executor.submit(fn, dump, **kwargs)
+
+        keys = cls._outputs.setdefault(output_path, [])
+        if key not in keys:
+            keys.append(key)
+        if test_case_name:
+            cls._test_cases[output_path] = test_case_name
+
+    @classmethod
+    def shutdown(cls) -> str | None:
+        """
+        Wait for all the dumps queued, and write the decoded outputs. Called at the end of the session.
+
+        Returns:
+            Summary of the decoded outputs, None if nothing queued
+        """
+        if not cls._futures:
+            return None
+
+        decoded = []
+        for output_path, keys in cls._outputs.items():
+            outputs = []
+            errors = []
+            for key in keys:
+                try:
+                    outputs.append(cls._futures[key].result())
+                except subprocess.CalledProcessError as e:
+                    errors.append(
+                        f'Failed to decode {output_path}: {to_str(e.output)}. Command was: \n{" ".join(e.cmd)}'
+                    )
+                except Exception as e:
+                    errors.append(f'Failed to decode {output_path}: {e}')
+
+            for error in errors:
+                logging.error(error)
+
+            test_case_name = cls._test_cases.get(output_path)
+            if test_case_name:
+                junit_outputs = cls._junit_outputs.setdefault(test_case_name, {})
+                if outputs:
+                    junit_outputs.setdefault('system-out', []).append(
+                        f'----- decoded {output_path} -----\n' + '\n'.join(outputs)
+                    )
+                if errors:
+                    junit_outputs.setdefault('system-err', []).extend(errors)
+
+            if outputs:
+                with open(output_path, 'w') as fw:
+                    fw.write('\n'.join(outputs))
+                decoded.append(output_path)
+
+        summary = f'Decoded {len(cls._futures)} panic output(s) and core dump(s) in the background'
+        if cls._duplicates:
+            summary += f', {cls._duplicates} identical one(s) skipped'
+        if decoded:
+            summary += '. Please check the decoded outputs at:\n' + '\n'.join(f'  {p}' for p in decoded)
+
+        cls._executor.shutdown()
+        cls._executor = None
+        cls._futures = {}
+        cls._outputs = {}
+        cls._test_cases = {}
+        cls._duplicates = 0
+
+        return summary
+
+    @classmethod
+    def pop_junit_outputs(cls) -> dict[str, dict[str, list[str]]]:
+        """
+        Returns:
+            test case name -> junit tag -> texts, of the dumps decoded by `shutdown()`
+        """
+        junit_outputs = cls._junit_outputs
+        cls._junit_outputs = {}
+        return junit_outputs
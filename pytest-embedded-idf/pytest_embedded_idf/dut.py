@@ -2,8 +2,6 @@ import logging
 import os
 import re
 import subprocess
-import sys
-import tempfile
 import typing as t
 import warnings
 from contextlib import redirect_stdout
@@ -13,6 +11,7 @@ from pytest_embedded_serial.dut import SerialDut
 from pytest_embedded_serial_esp import EspSerial
 
 from .app import IdfApp
+from .decoder import DecodePool, decode_coredump, decode_panic
 from .unity_tester import (
     IdfUnityDutMixin,
     UnittestMenuCase,  # noqa # keep backward compatibility
@@ -27,6 +26,8 @@ class IdfDut(IdfUnityDutMixin, SerialDut):
         target (str): target chip type
         skip_check_coredump (bool): skip check core dumped or not while dut teardown if set to True
         skip_decode_panic (bool): skip decode panic output or not while dut teardown if set to True
+        async_decode (bool): capture the panic output and the core dumps while dut teardown, and decode them in a
+            session-level process pool if set to True
     """
 
     XTENSA_TARGETS = IdfApp.XTENSA_TARGETS
@@ -40,6 +41,9 @@ class IdfDut(IdfUnityDutMixin, SerialDut):
     PANIC_START = b'register dump:'
     PANIC_END = b'ELF file SHA256:'
 
+    # seconds to wait for OpenOCD `program_esp` to write and verify one flash file
+    JTAG_FLASH_TIMEOUT = 300
+
     app: IdfApp
     serial: EspSerial
 
@@ -48,15 +52,22 @@ class IdfDut(IdfUnityDutMixin, SerialDut):
         app: IdfApp,
         skip_check_coredump: bool = False,
         skip_decode_panic: bool = False,
+        async_decode: bool = False,
         **kwargs,
     ) -> None:
         self.target = app.target
         self.skip_check_coredump = skip_check_coredump
         self.skip_decode_panic = skip_decode_panic
+        self.async_decode = async_decode
         super().__init__(app=app, **kwargs)
 
         self._hard_reset_func = self.serial.hard_reset
 
+        # searched in the log file while teardown
+        self.pexpect_proc.watch_markers(
+            self.PANIC_START, self.PANIC_END, self.COREDUMP_UART_START, self.COREDUMP_UART_END
+        )
+
     @property
     def toolchain_prefix(self) -> str:
         """
@@ -87,47 +98,30 @@ class IdfDut(IdfUnityDutMixin, SerialDut):
             logging.warning('No elf file found. Skipping decode panic output...')
             return
 
-        with open(self.logfile, 'rb') as output_file:
-            output = output_file.read()
-        # get the panic output by looking for the indexes
-        # of the first occurrences of PANIC_START and PANIC_END patterns
-        panic_output_idx_start = output.find(self.PANIC_START) - 10
-        panic_output_idx_end = output.find(self.PANIC_END, output.find(self.PANIC_START) + 1) + 15
-        panic_output_res = output[panic_output_idx_start:panic_output_idx_end]
-        panic_output = panic_output_res if panic_output_res else None
+        # the first panic output, from the line of PANIC_START to the line of PANIC_END
+        panic_output = next(self.search_log(self.PANIC_START, self.PANIC_END), None)
         if panic_output is None:
             return
 
-        with tempfile.NamedTemporaryFile(mode='wb', delete=False) as panic_output_file:
-            panic_output_file.write(panic_output)
-            panic_output_file.flush()
-
-        cmd = [
-            f'{self.toolchain_prefix}gdb',
-            '--command',
-            self._get_prefix_map_path(),
-            '--batch',
-            '-n',
-            self.app.elf_file,
-            '-ex',
-            f'target remote | "{sys.executable}" -m esp_idf_panic_decoder --target {self.target} "{panic_output_file.name}"',  # noqa: E501
-            '-ex',
-            'bt',
-        ]
+        kwargs = {
+            'target': self.target,
+            'toolchain_prefix': self.toolchain_prefix,
+            'prefix_map_path': self._get_prefix_map_path(),
+            'elf_file': self.app.elf_file,
+        }
+        output_path = self.logfile.replace('dut', 'panic_decoded', 1)
+        if self.async_decode:
+            DecodePool.submit(output_path, decode_panic, panic_output, test_case_name=self.test_case_name, **kwargs)
+            return
+
         try:
-            output = subprocess.check_output(cmd, stderr=subprocess.STDOUT).decode('utf-8')
+            output = decode_panic(panic_output, **kwargs)
             logging.info(f'Backtrace:\n{output}')
-            with open(self.logfile.replace('dut', 'panic_decoded', 1), 'w') as fw:
+            with open(output_path, 'w') as fw:
                 fw.write(output)
                 logging.info(f'Please check decoded panic output file at: {fw.name}')
         except subprocess.CalledProcessError as e:
-            logging.error(f'Failed to decode panic output: {e.output}. Command was: \n{" ".join(cmd)}')
-        finally:
-            if panic_output_file is not None:
-                try:
-                    os.unlink(panic_output_file.name)
-                except OSError as e:
-                    logging.debug(f"Couldn't remove temporary panic output file ({e})")
+            logging.error(f'Failed to decode panic output: {e.output}. Command was: \n{" ".join(e.cmd)}')
 
     def _check_coredump(self) -> None:
         """
@@ -157,38 +151,58 @@ class IdfDut(IdfUnityDutMixin, SerialDut):
             logging.debug('no elf file. skipping dumping core dumps')
             return
 
-        from esp_coredump import CoreDump  # need IDF_PATH
-
-        with open(self.logfile, 'rb') as fr:
-            s = fr.read()
-
-            for i, coredump in enumerate(set(self.COREDUMP_UART_REGEX.findall(s))):  # may duplicate
-                coredump_file = None
-                try:
-                    with tempfile.NamedTemporaryFile(mode='wb', delete=False) as coredump_file:
-                        coredump_file.write(coredump.strip().replace(b'\r', b''))
-                        coredump_file.flush()
+        output_path = self.logfile.replace('dut', 'coredump', 1)
+        dumped = set()
+        for i, region in enumerate(self.search_log(self.COREDUMP_UART_START, self.COREDUMP_UART_END)):
+            start = region.index(self.COREDUMP_UART_START) + len(self.COREDUMP_UART_START)
+            coredump = region[start : region.rindex(self.COREDUMP_UART_END)]
+            if coredump in dumped:  # may duplicate
+                continue
+            dumped.add(coredump)
+
+            if self.async_decode:
+                DecodePool.submit(
+                    output_path,
+                    decode_coredump,
+                    coredump,
+                    test_case_name=self.test_case_name,
+                    target=self.target,
+                    elf_file=self.app.elf_file,
+                )
+                continue
 
-                    coredump = CoreDump(
-                        chip=self.target,
-                        core=coredump_file.name,
-                        prog=self.app.elf_file,
-                    )
-                    with open(self.logfile.replace('dut', 'coredump', 1), 'w') as fw:
-                        with redirect_stdout(fw):
-                            coredump.info_corefile()
-                        logging.info(f'Please check coredump output file at: {fw.name}')
-                except Exception as e:
-                    logging.error(f'Error dumping b64 coredump {i} for target: {self.target}: {e}')
-                finally:
-                    if coredump_file:
-                        os.remove(coredump_file.name)
+            try:
+                output = decode_coredump(coredump, self.target, self.app.elf_file)
+                with open(output_path, 'w') as fw:
+                    fw.write(output)
+                    logging.info(f'Please check coredump output file at: {fw.name}')
+            except Exception as e:
+                logging.error(f'Error dumping b64 coredump {i} for target: {self.target}: {e}')
 
     def _dump_flash_coredump(self) -> None:
         if not self.app.elf_file:
             logging.debug('no elf file. skipping dumping core dumps')
             return
 
+        if self.async_decode:
+            partition = next((name for name, p in self.app.partition_table.items() if p['subtype'] == 'coredump'), None)
+            if partition:
+                # reading the flash still needs the port, only the decoding is queued
+                coredump = self.serial.dump_flash(partition=partition)
+                if coredump.strip(b'\xff'):  # not erased
+                    DecodePool.submit(
+                        self.logfile.replace('dut', 'coredump', 1),
+                        decode_coredump,
+                        coredump,
+                        test_case_name=self.test_case_name,
+                        target=self.target,
+                        elf_file=self.app.elf_file,
+                        core_format='raw',
+                    )
+                return
+
+            logging.debug('no coredump partition found in the partition table, decoding the core dump now')
+
         from esp_coredump import CoreDump  # need IDF_PATH
 
         self.serial.close()
@@ -275,10 +289,15 @@ class IdfDut(IdfUnityDutMixin, SerialDut):
             logging.debug('Linux ELF-only build; skipping OpenOCD program_esp.')
             return
 
+        commands = []
         for _f in self.app.flash_files:
             if _f.encrypted:
                 raise ValueError("Encrypted files can't be flashed in via JTAG")
-            self.openocd.write(f'program_esp {_f.file_path} {hex(_f.offset)} verify')
+            commands.append((f'program_esp {_f.file_path} {hex(_f.offset)} verify', self.JTAG_FLASH_TIMEOUT))
+
+        # sent at once, without waiting for a telnet prompt between the files
+        for result in self.openocd.tcl.execute_batch(commands):
+            result.raise_for_error()
 
         if self._meta:
             self._meta.set_port_app_cache(self.serial.port, self.app)
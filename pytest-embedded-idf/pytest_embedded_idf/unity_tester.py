@@ -1,22 +1,30 @@
 # SPDX-FileCopyrightText: 2022 Espressif Systems (Shanghai) CO LTD
 # SPDX-License-Identifier: Apache-2.0
+import concurrent.futures
+import hashlib
+import json
 import logging
+import math
+import os
+import queue
 import re
+import selectors
+import stat
 import time
 import typing as t
 import warnings
 from collections import namedtuple
 from collections.abc import Iterable
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 
+import filelock
 import pexpect
 from pexpect.exceptions import TIMEOUT
 from pytest_embedded.unity import (
-    UNITY_BASIC_REGEX,
-    UNITY_FIXTURE_REGEX,
     UNITY_SUMMARY_LINE_REGEX,
     TestCase,
     TestSuite,
+    UnityParser,
 )
 from pytest_embedded.utils import remove_asci_color_code
 
@@ -32,20 +40,30 @@ READY_PATTERN_LIST = [
     'Enter test for running',
     "Enter next test, or 'enter' to see menu",
 ]
+_READY_PATTERN_REGEX = re.compile('|'.join(re.escape(p) for p in READY_PATTERN_LIST).encode())
+
+# reset reason printed by the ROM bootloader each time the chip boots
+UNITY_REBOOT_REGEX = re.compile(rb'rst:0x[0-9a-fA-F]+ \(')
+# the case crashed instead of printing the summary line. The panic handler output (`IdfDut.PANIC_START` and the
+# lines printed before it), the core dump printed to UART (`IdfDut.COREDUMP_UART_START`), or the chip rebooted
+UNITY_CRASH_REGEX = re.compile(
+    rb'Guru Meditation Error|abort\(\) was called|register dump:|================= CORE DUMP START =================|'
+    + UNITY_REBOOT_REGEX.pattern
+)
+# the chip reboots or halts after printing the crash output
+UNITY_CRASH_END_REGEX = re.compile(UNITY_REBOOT_REGEX.pattern + rb'|CPU halted')
+CRASH_OUTPUT_TIMEOUT = 5
+CRASH_EXCERPT_MAX_LINES = 20
+# resets without printing the ready pattern in between
+BOOT_LOOP_RESETS = 3
 
 _PRE_RUN_FAILURE_STR = '_PRE_RUN_FAILURE'
 
 
 def _parse_unity_test_output(log: t.AnyStr | None, case_name: str, buffer_debug_str: str) -> dict:
     if log:
-        # check format
-        check = UNITY_FIXTURE_REGEX.search(log)
-        if check:
-            regex = UNITY_FIXTURE_REGEX
-        else:
-            regex = UNITY_BASIC_REGEX
-
-        res = list(regex.finditer(log))
+        parser = UnityParser(remove_asci_escape_code=False)
+        res = parser.feed(log) + parser.flush()
     else:
         res = []
 
@@ -61,10 +79,10 @@ def _parse_unity_test_output(log: t.AnyStr | None, case_name: str, buffer_debug_
             'message': buffer_debug_str or 'timeout',
         }
     elif len(res) == 1:
-        attrs = {k: v for k, v in res[0].groupdict().items() if v is not None}
+        attrs = {'name': res[0].name, 'result': res[0].result, **res[0].attrs}
     else:
         warnings.warn('This function is for recording single unity test case only. Use the last matched one')
-        attrs = {k: v for k, v in res[-1].groupdict().items() if v is not None}
+        attrs = {'name': res[-1].name, 'result': res[-1].result, **res[-1].attrs}
 
     if log:
         attrs.update({'stdout': log})
@@ -80,6 +98,7 @@ def _add_test_case_to_test_suite(test_suite: TestSuite, attrs: dict) -> None:
     :param attrs: The attributes of the test case.
     """
     testcase = TestCase(**attrs)
+    test_suite.limit_stdout(testcase)
     test_suite.testcases.append(testcase)
     if testcase.result == 'FAIL':
         test_suite.attrs['failures'] += 1
@@ -89,6 +108,119 @@ def _add_test_case_to_test_suite(test_suite: TestSuite, attrs: dict) -> None:
         test_suite.attrs['tests'] += 1
 
 
+class CaseDurationHistory:
+    """
+    Durations of the unity test cases observed in the previous runs, used by ``--adaptive-timeouts``.
+
+    The durations are stored under ``<cache_dir>/unity-case-durations/``, one file for each app, keyed by the case
+    name. The adaptive timeout of a case with enough history is `SAFETY_FACTOR` times the `PERCENTILE` of its
+    durations, plus `MARGIN` seconds, and never longer than the timeout given.
+    """
+
+    MAX_SAMPLES = 20
+    MIN_SAMPLES = 3
+    PERCENTILE = 95
+    SAFETY_FACTOR = 2.0
+    MARGIN = 5.0
+
+    _instances: t.ClassVar[dict[str, 'CaseDurationHistory']] = {}
+    # cases that ran into an adaptive timeout in this session, and the seconds saved by them
+    timed_out: t.ClassVar[int] = 0
+    saved_seconds: t.ClassVar[float] = 0.0
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._durations = self._load()
+        self._new_durations: dict[str, list[float]] = {}
+
+    @classmethod
+    def for_app(cls, cache_dir: str, app) -> 'CaseDurationHistory':
+        """
+        Get the history of the app, shared by all the duts flashed with it.
+        """
+        key = hashlib.sha256(os.path.realpath(app.binary_path or app.app_path).encode()).hexdigest()
+        path = os.path.join(cache_dir, 'unity-case-durations', f'{key}.json')
+        if path not in cls._instances:
+            cls._instances[path] = cls(path)
+
+        return cls._instances[path]
+
+    def _load(self) -> dict[str, list[float]]:
+        try:
+            with open(self.path) as fr:
+                return json.load(fr)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            logging.warning('Ignore broken unity case durations %s: %s', self.path, e)
+            return {}
+
+    def timeout(self, case_name: str, timeout: float) -> float:
+        """
+        Returns:
+            The adaptive timeout of the case, or `timeout` if the history is not enough
+        """
+        durations = sorted(self._durations.get(case_name, []))
+        if len(durations) < self.MIN_SAMPLES:
+            return timeout
+
+        percentile = durations[max(math.ceil(len(durations) * self.PERCENTILE / 100) - 1, 0)]
+        return min(timeout, round(percentile * self.SAFETY_FACTOR + self.MARGIN, 3))
+
+    def record(self, case_name: str, duration: float) -> None:
+        for durations in (self._durations, self._new_durations):
+            durations.setdefault(case_name, []).append(duration)
+            del durations[case_name][: -self.MAX_SAMPLES]
+
+    @classmethod
+    def record_timed_out(cls, timeout: float, adaptive_timeout: float) -> None:
+        cls.timed_out += 1
+        cls.saved_seconds += timeout - adaptive_timeout
+
+    def save(self) -> None:
+        if not self._new_durations:
+            return
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # the workers of the same session may record the durations of the same app
+        with filelock.FileLock(f'{self.path}.lock'):
+            durations = self._load()
+            for case_name, new_durations in self._new_durations.items():
+                durations[case_name] = (durations.get(case_name, []) + new_durations)[-self.MAX_SAMPLES :]
+
+            with open(self.path, 'w') as fw:
+                json.dump(durations, fw)
+
+        self._new_durations.clear()
+
+    @classmethod
+    def shutdown(cls) -> str | None:
+        """
+        Save the durations recorded in this session. Called at the end of the session.
+
+        Returns:
+            The summary of the time saved by the adaptive timeouts, None if no case ran into them
+        """
+        for history in cls._instances.values():
+            try:
+                history.save()
+            except OSError as e:
+                logging.warning('Failed to save unity case durations %s: %s', history.path, e)
+
+        cls._instances.clear()
+
+        if not cls.timed_out:
+            return None
+
+        summary = (
+            f'Adaptive timeouts saved {cls.saved_seconds:.1f} seconds of wall-clock time '
+            f'in {cls.timed_out} timed out unity case(s)'
+        )
+        cls.timed_out = 0
+        cls.saved_seconds = 0.0
+        return summary
+
+
 @dataclass
 class UnittestMenuCase:
     """
@@ -122,8 +254,12 @@ class IdfUnityDutMixin:
 
     def __init__(self, *args, **kwargs):
         self._test_menu: list[UnittestMenuCase] = None  # type: ignore
+        # set when the test menu is loaded from the cache, till the first case started with it
+        self._test_menu_unverified = False
 
         self._hard_reset_func: t.Callable | None = None
+        # set when a case crashed and the chip did not reboot by itself
+        self._reset_before_next_case = False
 
         super().__init__(*args, **kwargs)
 
@@ -265,25 +401,142 @@ class IdfUnityDutMixin:
     def _get_ready(self, timeout: float = 30, *, return_before: bool = False) -> bytes | None:
         if self._ignore_first_ready_pattern:
             self._ignore_first_ready_pattern = False
-        else:
-            self.expect_exact(READY_PATTERN_LIST, timeout=timeout)
-            if return_before:
-                return self.pexpect_proc.before
+            return None
+
+        before = b''
+        resets = 0
+        deadline = time.perf_counter() + timeout
+        while True:
+            match = self.expect(
+                [_READY_PATTERN_REGEX, UNITY_REBOOT_REGEX], timeout=max(deadline - time.perf_counter(), 0)
+            )
+            before += self.pexpect_proc.before
+            if match.re is _READY_PATTERN_REGEX:
+                break
+
+            before += match.group()
+            resets += 1
+            if resets >= BOOT_LOOP_RESETS:
+                raise ValueError(
+                    f'The chip reset {resets} times without printing any of {READY_PATTERN_LIST}, '
+                    f'probably in a boot loop'
+                )
+
+        if return_before:
+            return before
 
         return None
 
+    @property
+    def _test_menu_cache_path(self) -> str | None:
+        cache_dir = self._meta.cache_dir if self._meta else None
+        elf_file = getattr(self.app, 'elf_file', None)
+        if not cache_dir or not elf_file or not os.path.isfile(elf_file):
+            return None
+
+        sha256 = hashlib.sha256()
+        with open(elf_file, 'rb') as fr:
+            for chunk in iter(lambda: fr.read(1 << 20), b''):
+                sha256.update(chunk)
+
+        return os.path.join(cache_dir, 'unity-test-menu', f'{sha256.hexdigest()}.json')
+
+    def _load_cached_test_menu(self, path: str) -> list[UnittestMenuCase] | None:
+        try:
+            with open(path) as fr:
+                cached = json.load(fr)
+
+            test_menu = [UnittestMenuCase(**case) for case in cached['cases']]
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError) as e:
+            logging.warning('Ignore broken unity test menu cache %s: %s', path, e)
+            return None
+
+        if len(test_menu) != cached.get('count'):
+            logging.warning('Ignore broken unity test menu cache %s: case count mismatch', path)
+            return None
+
+        return test_menu
+
+    @staticmethod
+    def _save_cached_test_menu(path: str, test_menu: list[UnittestMenuCase]) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # the same app may be tested by multiple workers at the same time
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as fw:
+            json.dump({'count': len(test_menu), 'cases': [asdict(case) for case in test_menu]}, fw)
+        os.replace(tmp_path, path)
+
+    def _drop_cached_test_menu(self) -> None:
+        path = self._test_menu_cache_path
+        if path and os.path.isfile(path):
+            os.remove(path)
+            logging.debug('Dropped unity test menu cache %s', path)
+
     @property
     def test_menu(self) -> list[UnittestMenuCase]:
+        """
+        Test cases parsed from the test menu printed by the app.
+
+        The parsed menu is cached in the ``cache_dir`` by the SHA-256 of the app ELF file. With a cache hit, the
+        menu is neither printed nor followed by a hard reset. The cache is verified by the first case started:
+        it's dropped if the app doesn't echo the same case name for its index, and the menu is parsed from the app
+        again. The cases taken from the stale menu are looked up by name in the new one.
+        """
         if self._test_menu is None:
-            self._test_menu = self._parse_test_menu()
-            logging.debug('Successfully parsed unity test menu')
-            self._hard_reset()
+            cache_path = self._test_menu_cache_path
+            if cache_path:
+                self._test_menu = self._load_cached_test_menu(cache_path)  # type: ignore
+
+            if self._test_menu is not None:
+                logging.debug('Loaded unity test menu from cache %s', cache_path)
+                self._test_menu_unverified = True
+            else:
+                self._test_menu = self._parse_test_menu()
+                logging.debug('Successfully parsed unity test menu')
+                if cache_path:
+                    self._save_cached_test_menu(cache_path, self._test_menu)
+                self._hard_reset()
 
         return self._test_menu
 
     def _add_test_case_to_suite(self, attrs: dict):
         _add_test_case_to_test_suite(self.testsuite, attrs)
 
+    @property
+    def case_durations(self) -> CaseDurationHistory | None:
+        """
+        Durations of the cases of the app observed in this and the previous runs, None without a cache dir.
+        """
+        cache_dir = self._meta.cache_dir if self._meta else None
+        if not cache_dir:
+            return None
+
+        return CaseDurationHistory.for_app(cache_dir, self.app)
+
+    def _adaptive_timeout(self, case: UnittestMenuCase, timeout: float) -> float:
+        if not getattr(self, 'adaptive_timeouts', False) or self.case_durations is None:
+            return timeout
+
+        adaptive_timeout = self.case_durations.timeout(case.name, timeout)
+        if adaptive_timeout < timeout:
+            logging.debug('Adaptive timeout of case %s: %s seconds', case.name, adaptive_timeout)
+
+        return adaptive_timeout
+
+    def _record_case_duration(
+        self, case: UnittestMenuCase, duration: float | None, timeout: float, timeout_limit: float | None
+    ) -> None:
+        if self.case_durations is None:
+            return
+
+        if duration is not None:
+            self.case_durations.record(case.name, duration)
+        elif timeout_limit is not None and timeout < timeout_limit:
+            logging.warning('Case %s ran into the adaptive timeout, %s seconds', case.name, timeout)
+            CaseDurationHistory.record_timed_out(timeout_limit, timeout)
+
     def _analyze_test_case_result(
         self,
         case: UnittestMenuCase,
@@ -291,6 +544,7 @@ class IdfUnityDutMixin:
         *,
         start_time: float = 0,
         timeout: float = 30,
+        timeout_limit: float | None = None,
     ):
         # if the pre_run_failure is not None, then the test case is skipped, since the error happens before
         if pre_run_failure:
@@ -305,39 +559,148 @@ class IdfUnityDutMixin:
             self._add_test_case_to_suite(attrs)
             return
 
-        attrs = self._read_result_and_parse_attrs(case, start_time, timeout)
+        attrs = self._read_result_and_parse_attrs(case, start_time, timeout, timeout_limit)
 
         self._add_test_case_to_suite(attrs)
 
-    def _read_result_and_parse_attrs(self, case: UnittestMenuCase, start_time: float, timeout: float) -> dict:
+    def _read_result_and_parse_attrs(
+        self, case: UnittestMenuCase, start_time: float, timeout: float, timeout_limit: float | None = None
+    ) -> dict:
+        """
+        Args:
+            timeout: seconds since `start_time` to wait for the result
+            timeout_limit: the timeout given, if `timeout` is the adaptive one
+        """
         log = ''
+        finished = False
+        crash_attrs = None
+        patterns = [UNITY_SUMMARY_LINE_REGEX]
+        # normal cases with the "reset" attribute reset the chip on purpose
+        if case.type != 'normal' or 'reset' not in case.attributes:
+            patterns.append(UNITY_CRASH_REGEX)
         try:
             remaining_timeout = timeout - (time.perf_counter() - start_time)
             if remaining_timeout < 0:  # pexpect process would expect 30s if < 0
                 remaining_timeout = 0
-            self.expect(UNITY_SUMMARY_LINE_REGEX, timeout=remaining_timeout)
+            match = self.expect(patterns, timeout=remaining_timeout)
         except Exception:  # result block missing
             pass
-        else:  # result block exists
-            log = remove_asci_color_code(self.pexpect_proc.before)
-
-        attrs = _parse_unity_test_output(log, case.name, self.pexpect_proc.buffer_debug_str)
+        else:
+            if match.re is UNITY_CRASH_REGEX:
+                crash_attrs = self._read_crash_output(case, self.pexpect_proc.before, match.group())
+            else:  # result block exists
+                log = remove_asci_color_code(self.pexpect_proc.before)
+                finished = True
+
+        if crash_attrs:
+            attrs = crash_attrs
+        else:
+            attrs = _parse_unity_test_output(log, case.name, self.pexpect_proc.buffer_debug_str)
         attrs.update(
             {
                 'app_path': self.app.app_path,
                 'time': round(time.perf_counter() - start_time, 3),
             }
         )
+        if not crash_attrs:
+            self._record_case_duration(case, attrs['time'] if finished else None, timeout, timeout_limit)
         return attrs
 
-    def _prepare_and_start_case(self, case: UnittestMenuCase, reset: bool, timeout: float) -> float:
-        if reset:
+    def _read_crash_output(self, case: UnittestMenuCase, case_output: bytes, crash_start: bytes) -> dict:
+        """
+        Read the rest of the crash output till the chip reboots or halts, instead of waiting for the summary line
+        till the timeout. The chip would be reset before the next case if it did not reboot by itself.
+
+        Args:
+            case_output: output of the case before the crash
+            crash_start: the matched `UNITY_CRASH_REGEX`
+
+        Returns:
+            attrs of the failed case, the excerpt of the crash output as the message
+        """
+        crash_output = crash_start
+        rebooted = bool(UNITY_REBOOT_REGEX.match(crash_start))
+        if not rebooted:
+            try:
+                match = self.expect(UNITY_CRASH_END_REGEX, timeout=CRASH_OUTPUT_TIMEOUT)
+            except TIMEOUT:
+                crash_output += self.pexpect_proc.before
+            else:
+                crash_output += self.pexpect_proc.before + match.group()
+                rebooted = bool(UNITY_REBOOT_REGEX.match(match.group()))
+
+        self._reset_before_next_case = not rebooted
+
+        # from the beginning of the line, e.g. "Core  0 register dump:"
+        crash_line_start = case_output.rfind(b'\n') + 1
+        excerpt_lines = remove_asci_color_code(case_output[crash_line_start:] + crash_output).splitlines()
+        if len(excerpt_lines) > CRASH_EXCERPT_MAX_LINES:
+            excerpt_lines = [*excerpt_lines[:CRASH_EXCERPT_MAX_LINES], '...']
+        logging.warning('case %s crashed before printing the result', case.name)
+
+        return {
+            'name': case.name,
+            'result': 'FAIL',
+            'message': 'Crashed before printing the result:\n' + '\n'.join(excerpt_lines),
+            'stdout': remove_asci_color_code(case_output + crash_output),
+        }
+
+    @staticmethod
+    def _resolve_case(case: UnittestMenuCase, test_menu: list[UnittestMenuCase] | None) -> UnittestMenuCase:
+        """
+        Returns:
+            The case of the same name and type in `test_menu`, since the cases taken from a stale cached menu may
+            have wrong indices
+        """
+        if test_menu is None or case in test_menu:
+            return case
+
+        for _case in test_menu:
+            if _case.name == case.name and _case.type == case.type:
+                return _case
+
+        raise ValueError(f'"{case.name}" is not in the unity test menu of the app')
+
+    def _prepare_and_start_case(
+        self, case: UnittestMenuCase, reset: bool, timeout: float
+    ) -> tuple[float, UnittestMenuCase]:
+        """
+        Returns:
+            (start time, the case started), the case may be re-parsed from the app if the cached menu is stale
+        """
+        case = self._resolve_case(case, self._test_menu)
+        if reset or self._reset_before_next_case:
+            self._reset_before_next_case = False
             self._hard_reset()
 
         _start_at = time.perf_counter()
         self._get_ready(timeout)
-        self.confirm_write(case.index, expect_str=f'Running {case.name}...')
-        return _start_at
+        try:
+            self.confirm_write(case.index, expect_str=f'Running {case.name}...')
+        except TIMEOUT:
+            if not self._test_menu_unverified:
+                raise
+
+            logging.warning(
+                '"%s" is not the case %s of the app, the cached unity test menu is stale. '
+                'The app flashed may not be built from %s. Parsing the test menu printed by the app again',
+                case.name,
+                case.index,
+                self.app.elf_file,
+            )
+            self._test_menu_unverified = False
+            self._drop_cached_test_menu()
+            self._test_menu = None
+            self._hard_reset()
+            # parsed from the app, cached, and hard reset again
+            case = self._resolve_case(case, self.test_menu)
+
+            _start_at = time.perf_counter()
+            self._get_ready(timeout)
+            self.confirm_write(case.index, expect_str=f'Running {case.name}...')
+
+        self._test_menu_unverified = False
+        return _start_at, case
 
     def _squash_failed_subcases(self, failed_subcases: list[dict], start_time: float) -> dict:
         squashed_attrs = failed_subcases[0].copy()
@@ -377,16 +740,22 @@ class IdfUnityDutMixin:
             return
 
         try:
-            _start_at = self._prepare_and_start_case(case, reset, timeout)
+            _start_at, case = self._prepare_and_start_case(case, reset, timeout)
         except Exception as e:
             logging.debug('pre_run_failure: %s. hard reset and retry', e)
             try:
-                _start_at = self._prepare_and_start_case(case, True, timeout)
+                _start_at, case = self._prepare_and_start_case(case, True, timeout)
             except Exception as e2:
                 self._analyze_test_case_result(case, e2)
                 return
 
-        self._analyze_test_case_result(case, None, start_time=_start_at, timeout=timeout)
+        self._analyze_test_case_result(
+            case,
+            None,
+            start_time=_start_at,
+            timeout=self._adaptive_timeout(case, timeout),
+            timeout_limit=timeout,
+        )
 
     def _run_multi_stage_case(
         self,
@@ -411,20 +780,21 @@ class IdfUnityDutMixin:
             return
 
         try:
-            _start_at = self._prepare_and_start_case(case, reset, timeout)
+            _start_at, case = self._prepare_and_start_case(case, reset, timeout)
         except Exception as e:
             logging.debug('pre_run_failure: %s. hard reset and retry', e)
             try:
-                _start_at = self._prepare_and_start_case(case, True, timeout)
+                _start_at, case = self._prepare_and_start_case(case, True, timeout)
             except Exception as e2:
                 self._analyze_test_case_result(case, e2)
                 return
 
+        adaptive_timeout = self._adaptive_timeout(case, timeout)
         failed_subcases = []
         try:
             for sub_case in case.subcases:
                 if sub_case != case.subcases[0]:
-                    ready_before = self._get_ready(timeout, return_before=True)
+                    ready_before = self._get_ready(adaptive_timeout, return_before=True)
                     if ready_before and UNITY_SUMMARY_LINE_REGEX.search(ready_before):
                         attrs = _parse_unity_test_output(
                             remove_asci_color_code(ready_before), case.name, self.pexpect_proc.buffer_debug_str
@@ -440,7 +810,7 @@ class IdfUnityDutMixin:
             # We'll stop sending commands and let the result recorder handle the failure.
             pass
         finally:
-            attrs = self._read_result_and_parse_attrs(case, _start_at, timeout)
+            attrs = self._read_result_and_parse_attrs(case, _start_at, adaptive_timeout, timeout)
 
             if attrs['result'] == 'FAIL':
                 failed_subcases.append(attrs)
@@ -544,6 +914,9 @@ class IdfUnityDutMixin:
 class _MultiDevTestDut:
     """
     Dut control for multidevice test case
+
+    It doesn't wait for the output itself. `MultiDevRunTestManager` feeds it with the output read from the dut, and
+    the patterns expected in the current step are only searched in the output not searched yet.
     """
 
     # The signal pattens come from 'test_utils.c'
@@ -578,132 +951,179 @@ class _MultiDevTestDut:
         self.wait_for_menu_timeout = wait_for_menu_timeout
         self.runtest_timeout = runtest_timeout
 
-        self.work = self.run_case()
         self.init_time = time.perf_counter()
         self.response: _MultiDevTestDut.DevResponse = _MultiDevTestDut.DevResponse(False, None)
 
-    def __iter__(self):
-        return self.work
+        # output not consumed by the matches yet, starting from the bytes already read into the pexpect buffer
+        self._data = bytearray(self.dut.pexpect_proc.buffer)
+        # `_data` before this position has been searched with the current patterns
+        self._pos = 0
+        self._before = b''
+
+        self._step = 'menu'
+        self._patterns = self._compile_exact(READY_PATTERN_LIST)
+        self.deadline = self.init_time + self.wait_for_menu_timeout
+        self._retry = 0
+        self._start_time = 0.0
+        self._waiting_signal: str | None = None
+        # the case finished with the summary line
+        self.finished = False
 
-    def __next__(self):
-        if self.response.completed:
-            return self.response
-        else:
-            try:
-                next(self.__iter__())
-            except StopIteration as e:
-                self.response = _MultiDevTestDut.DevResponse(True, self.process_raw_report_data(e.value))
-                self.work.close()
-            except TIMEOUT as e:
-                self.response = _MultiDevTestDut.DevResponse(True, self.process_raw_report_data(e))
-                self.work.close()
-        return self.response
+    @staticmethod
+    def _compile_exact(patterns: str | list[str]) -> list[re.Pattern]:
+        return [re.compile(re.escape(p.encode())) for p in ([patterns] if isinstance(patterns, str) else patterns)]
 
-    def close(self):
-        self.work.close()
+    @classmethod
+    def _compile_signal_patterns(cls) -> list[re.Pattern]:
+        return [p if isinstance(p, re.Pattern) else re.compile(p.encode()) for p in cls.signal_pattern_list]
 
-    def interrupt(self):
-        if not self.response.completed:
-            self.response = _MultiDevTestDut.DevResponse(
-                True, self.process_raw_report_data('Some of the dut failed, so this dut was interrupted.')
-            )
-            self.work.close()
+    def fileno(self) -> int:
+        return self.dut.pexpect_proc.child_fd
+
+    def read(self) -> bool:
+        """
+        Read the output of the dut without blocking.
 
-    def run_case(self):
+        Returns:
+            True if anything is read
+        """
+        proc = self.dut.pexpect_proc
         try:
-            yield from self._expect_exact(READY_PATTERN_LIST, self.wait_for_menu_timeout)
-            # yield version of confirm_write
-            for retry in range(self.start_retry):
-                self.dut.write(str(self.case.index))
-                try:
-                    yield from self._expect_exact(self.case.name, 1)
+            data = proc.read_nonblocking(proc.maxread, timeout=0)
+        except TIMEOUT:
+            return False
+
+        self._data += data
+        return bool(data)
+
+    def _search(self) -> tuple[int, re.Match] | None:
+        window = bytes(self._data[self._pos :])
+        found = None
+        for i, pattern in enumerate(self._patterns):
+            m = pattern.search(window)
+            if m and (found is None or m.start() < found[1].start()):
+                found = i, m
+
+        if found is None:
+            # search the last complete line again with the next output, the summary pattern takes two lines
+            last_lines = window.rsplit(b'\n', 2)
+            if len(last_lines) == 3:
+                self._pos += len(window) - len(last_lines[1]) - len(last_lines[2]) - 1
+            return None
+
+        m = found[1]
+        self._before = bytes(self._data[: self._pos + m.start()])
+        del self._data[: self._pos + m.end()]
+        self._pos = 0
+        return found
+
+    def _expect_next(self, step: str, patterns: list[re.Pattern], timeout: float) -> None:
+        self._step = step
+        self._patterns = patterns
+        self._pos = 0
+        self.deadline = time.perf_counter() + timeout
+
+    def _write_case_index(self) -> None:
+        self._retry += 1
+        self.dut.write(str(self.case.index))
+        self._expect_next('start', self._compile_exact(self.case.name), 1)
+
+    def _deliver_signal(self) -> bool:
+        for sig_name, sig_data in self.shared_message_query[self.dut_index]:
+            if sig_name == self._waiting_signal:
+                self.shared_message_query[self.dut_index].remove((sig_name, sig_data))
+                self.dut.write(sig_data)
+                self._waiting_signal = None
+                return True
+
+        return False
+
+    def _handle(self, index: int, match: re.Match) -> None:
+        if self._step == 'menu':
+            self._write_case_index()
+        elif self._step == 'start':
+            self.dut.write(str(self.sub_case_index))
+            self._start_time = time.perf_counter()
+            self._expect_next('run', self._compile_signal_patterns(), self.runtest_timeout)
+        # Send a signal
+        elif index == 0:
+            sig_name, sig_data = match.group(1).decode('utf-8'), ''
+            matched = re.search(r'(.*)\]\[(.*)', sig_name)
+            if matched:
+                sig_name, sig_data = matched.group(1), matched.group(2)
+
+            for i, q in enumerate(self.shared_message_query):
+                if i != self.dut_index:
+                    q.append((sig_name, sig_data))
+        # Waiting for a signal
+        elif index == 1:
+            self._waiting_signal = match.group(1).decode('utf-8')
+        # Case finished
+        else:
+            case_duration = time.perf_counter() - self._start_time
+            additional_attrs = {'time': round(case_duration, 3)}
+            self.finished = True
+            self._complete((remove_asci_color_code(self._before), additional_attrs))
+
+    def _pre_run_failure(self, e: Exception) -> tuple[str, dict]:
+        return _PRE_RUN_FAILURE_STR, {
+            'name': self.case.name,
+            'result': _PRE_RUN_FAILURE_STR,
+            'message': f'Skipped due to a failure before test execution. The write command probably failed: {e}',
+            'time': 0,
+        }
+
+    def _handle_timeout(self) -> None:
+        if self._step == 'menu':
+            self._complete(self._pre_run_failure(TIMEOUT(f'Not found {READY_PATTERN_LIST}')))
+        elif self._step == 'start':
+            if self._retry < self.start_retry:
+                self._write_case_index()
+            else:
+                self._complete(self._pre_run_failure(TIMEOUT(f'Not found "{self.case.name}"')))
+        elif self._waiting_signal is not None:
+            self._complete(TIMEOUT(f'Not receive signal {self._waiting_signal!r}'))
+        else:
+            self._complete(TIMEOUT('Tasks timed out, without other exception'))
+
+    def process(self, now: float) -> bool:
+        """
+        Handle the output read and the signals received so far.
+
+        Returns:
+            True if any progress is made, the signals sent by this dut may wake up the others
+        """
+        progress = False
+        while not self.response.completed:
+            if self._waiting_signal is not None:
+                if not self._deliver_signal():
                     break
-                except TIMEOUT as e:
-                    if retry >= self.start_retry - 1:
-                        raise e
-        except Exception as e:
-            return _PRE_RUN_FAILURE_STR, {
-                'name': self.case.name,
-                'result': _PRE_RUN_FAILURE_STR,
-                'message': f'Skipped due to a failure before test execution. The write command probably failed: {e}',
-                'time': 0,
-            }
+                progress = True
 
-        self.dut.write(str(self.sub_case_index))
+            found = self._search()
+            if found is None:
+                break
 
-        _start_time = time.perf_counter()
-        while True:
-            _current = time.perf_counter()
-            _timeout = _start_time + self.runtest_timeout - _current
-
-            if _timeout < 0:
-                raise TIMEOUT('Tasks timed out, without other exception')
-
-            pat = yield from self._expect(self.signal_pattern_list, _timeout)
-
-            if pat is not None:
-                match_str = pat.group().decode('utf-8')
-
-                # Send a signal
-                if self.SEND_SIGNAL_PREFIX in match_str:
-                    send_sig = pat.group(1).decode('utf-8')
-
-                    sig_name, sig_data = send_sig, ''
-                    matched = re.search(r'(.*)\]\[(.*)', send_sig)
-                    if matched:
-                        sig_name, sig_data = matched.group(1), matched.group(2)
-
-                    for i, q in enumerate(self.shared_message_query):
-                        if i != self.dut_index:
-                            q.append((sig_name, sig_data))
-
-                # Waiting for a signal
-                elif self.WAIT_SIGNAL_PREFIX in match_str:
-                    wait_sig = pat.group(1).decode('utf-8')
-                    while True:
-                        yield
-
-                        for i, (sig_name, sig_data) in enumerate(self.shared_message_query[self.dut_index]):
-                            if wait_sig == sig_name:
-                                break
-                        else:
-                            # Keep waiting the signal
-                            if _start_time + self.runtest_timeout < time.perf_counter():
-                                raise TIMEOUT(f'Not receive signal {wait_sig!r}')
-                            continue
-
-                        self.shared_message_query[self.dut_index].remove((sig_name, sig_data))
-                        self.dut.write(sig_data)
-                        break
+            self._handle(*found)
+            progress = True
 
-                # Case finished
-                elif 'Tests' in match_str:
-                    case_duration = time.perf_counter() - _start_time
-                    additional_attrs = {'time': round(case_duration, 3)}
-                    log = remove_asci_color_code(self.dut.pexpect_proc.before)
-                    return log, additional_attrs
+        if not self.response.completed and now >= self.deadline:
+            self._handle_timeout()
+            progress = True
 
-    def _expect_exact(self, pattern, timeout):
-        start = time.perf_counter()
-        while True:
-            try:
-                yield 'Await for result'
-                res = self.dut.expect_exact(pattern, timeout=0.01)
-                return res
-            except TIMEOUT as e:
-                if time.perf_counter() - start > timeout:
-                    raise e
-
-    def _expect(self, pattern, timeout):
-        start = time.perf_counter()
-        while True:
-            try:
-                yield 'Await for result'
-                res = self.dut.expect(pattern, timeout=0.01)
-                return res
-            except TIMEOUT as e:
-                if time.perf_counter() - start > timeout:
-                    raise e
+        return progress
+
+    def _complete(self, raw_data_to_report) -> None:
+        self.response = _MultiDevTestDut.DevResponse(True, self.process_raw_report_data(raw_data_to_report))
+        self.close()
+
+    def close(self):
+        # the output not consumed is still expected by the following `expect()` calls
+        self.dut.pexpect_proc.buffer = bytes(self._data)
+
+    def interrupt(self):
+        if not self.response.completed:
+            self._complete('Some of the dut failed, so this dut was interrupted.')
 
     def process_raw_report_data(self, raw_data_to_report) -> dict:
         additional_attrs = {}
@@ -728,9 +1148,17 @@ class _MultiDevTestDut:
 
 class MultiDevRunTestManager:
     """
-    Manager for control dut generator function
+    Manager for running a multi_device case on all the duts at the same time
+
+    The output of all the duts is waited for at once, and the signals are forwarded as soon as they are read. The
+    pexpect streams backed by pipes or sockets are waited for with a selector. The ones backed by log files, which
+    are always readable, are polled at an interval growing from `MIN_POLL_INTERVAL` to `MAX_POLL_INTERVAL` while
+    all the duts are idle.
     """
 
+    MIN_POLL_INTERVAL = 0.001
+    MAX_POLL_INTERVAL = 0.05
+
     def __init__(self, duts, case, start_retry, wait_for_menu_timeout, runtest_timeout):
         self.case = case
         self.workers: list[_MultiDevTestDut] = []
@@ -754,31 +1182,58 @@ class MultiDevRunTestManager:
                 )
             )
 
-    def next_for_all(self):
-        res = []
-        err = []
-        for i, it in enumerate(self.workers):
-            try:
-                r = next(it)
-                if r.completed:
-                    res.append(r.data)
-            except Exception as e:
-                err.append(e)
-        return res, err
+    def _process_all(self) -> None:
+        now = time.perf_counter()
+        # a signal sent by a dut could be waited for by a dut processed before it
+        while any([w.process(now) for w in self.workers if not w.response.completed]):
+            pass
 
     def gather(self):
+        selector = selectors.DefaultSelector()
+        polled = False
+        for worker in self.workers:
+            try:
+                if stat.S_ISREG(os.fstat(worker.fileno()).st_mode):
+                    polled = True
+                else:
+                    selector.register(worker.fileno(), selectors.EVENT_READ)
+            except (OSError, ValueError):  # not supported by the selector, e.g. pipes on Windows
+                polled = True
+
+        interval = self.MIN_POLL_INTERVAL
         try:
             while True:
-                res, er = self.next_for_all()
-                if er:
-                    raise Exception('There are Exception: ', er)
+                received = False
+                for worker in self.workers:
+                    if not worker.response.completed and worker.read():
+                        received = True
+
+                self._process_all()
+
+                res = [w.response.data for w in self.workers if w.response.completed]
                 if len(res) == len(self.workers):
                     return res
 
                 if any(True for r in res if r['result'] == 'FAIL'):
                     for it in self.workers:
                         it.interrupt()
+                    continue
+
+                if received:
+                    interval = self.MIN_POLL_INTERVAL
+                    continue
+
+                timeout = min(w.deadline for w in self.workers if not w.response.completed) - time.perf_counter()
+                if polled:
+                    timeout = min(timeout, interval)
+                    interval = min(interval * 2, self.MAX_POLL_INTERVAL)
+
+                if selector.get_map():
+                    selector.select(max(timeout, 0))
+                elif timeout > 0:
+                    time.sleep(timeout)
         finally:
+            selector.close()
             for _t in self.workers:
                 _t.close()
 
@@ -883,16 +1338,42 @@ class CaseTester:
             )
             return
 
+        self._run_multi_dev_case_on(self.dut, case, reset, timeout, start_retry)
+
+    @staticmethod
+    def _run_multi_dev_case_on(
+        duts: list['IdfDut'],
+        case: UnittestMenuCase,
+        reset: bool,
+        timeout: float,
+        start_retry: int,
+    ) -> None:
         if reset:
-            for dut in self.dut:
+            for dut in duts:
                 dut.serial.hard_reset()
 
+        adaptive_timeout = duts[0]._adaptive_timeout(case, timeout)
         mdm = MultiDevRunTestManager(
-            duts=self.dut, case=case, start_retry=start_retry, wait_for_menu_timeout=timeout, runtest_timeout=timeout
+            duts=duts,
+            case=case,
+            start_retry=start_retry,
+            wait_for_menu_timeout=timeout,
+            runtest_timeout=adaptive_timeout,
         )
         data_to_report = mdm.gather()
         merged_data = mdm.get_merge_data(data_to_report)
         _add_test_case_to_test_suite(mdm.workers[0].dut.testsuite, merged_data)
+        duts[0]._record_case_duration(
+            case,
+            merged_data['time'] if all(w.finished for w in mdm.workers) else None,
+            adaptive_timeout,
+            timeout,
+        )
+
+    def _check_same_app(self) -> None:
+        app_paths = {getattr(dut.app, 'binary_path', None) for dut in self.dut}
+        if len(app_paths) > 1:
+            raise ValueError(f'Cases could only be distributed to duts flashed with the same app, got {app_paths}')
 
     def run_normal_case(self, case: UnittestMenuCase, reset: bool = False, timeout: int = 90) -> None:
         """
@@ -949,6 +1430,7 @@ class CaseTester:
         reset: bool = False,
         timeout: float = DEFAULT_TIMEOUT,
         start_retry: int = DEFAULT_START_RETRY,
+        parallel: bool = False,
     ) -> None:
         """
         Run only multi_device cases
@@ -957,16 +1439,77 @@ class CaseTester:
             reset: whether to perform a hardware reset before running a case
             timeout: timeout in second
             start_retry (int): number of retries for a single case when it is failed to start
+            parallel: split the duts, which must be flashed with the same app, into groups sized by the subcases of
+                each case, and run different cases on disjoint groups at the same time
         """
+        if parallel:
+            self.run_multi_dev_cases_in_parallel(self.test_menu, reset, timeout, start_retry)
+            return
+
         for case in self.test_menu:
             # Run multi_device case on every device
             self.run_multi_dev_case(case, reset, timeout, start_retry)
 
+    def run_multi_dev_cases_in_parallel(
+        self,
+        cases: Iterable[UnittestMenuCase],
+        reset: bool = False,
+        timeout: float = DEFAULT_TIMEOUT,
+        start_retry: int = DEFAULT_START_RETRY,
+    ) -> None:
+        """
+        Run the multi_device cases on disjoint groups of the duts at the same time. Each case takes the first idle
+        duts as many as its subcases, the result is recorded in the testsuite of the first dut of the group. A case
+        waiting for more duts doesn't block the following cases which need less.
+
+        Args:
+            cases: cases to run, the other types are skipped
+            reset: whether to perform a hardware reset before running a case
+            timeout: timeout in second, overridden by the ``timeout`` attribute of the case
+            start_retry (int): number of retries for a single case when it is failed to start
+        """
+        self._check_same_app()
+
+        pending = []
+        for case in cases:
+            if case.type != 'multi_device':
+                continue
+
+            if len(case.subcases) > len(self.dut):
+                logging.warning(
+                    'case %s requires %s duts, but only %s available', case.name, len(case.subcases), len(self.dut)
+                )
+                continue
+
+            pending.append(case)
+
+        idle = list(self.dut)
+        running: dict[concurrent.futures.Future, list[IdfDut]] = {}
+        with concurrent.futures.ThreadPoolExecutor(len(self.dut), thread_name_prefix='unity-multi-dev') as executor:
+            while pending or running:
+                for case in list(pending):
+                    if len(case.subcases) <= len(idle):
+                        group, idle = idle[: len(case.subcases)], idle[len(case.subcases) :]
+                        pending.remove(case)
+                        case_timeout = int(case.attributes['timeout']) if case.attributes.get('timeout') else timeout
+                        logging.debug('Run case "%s" on %s', case.name, [dut.logfile for dut in group])
+                        future = executor.submit(
+                            self._run_multi_dev_case_on, group, case, reset, case_timeout, start_retry
+                        )
+                        running[future] = group
+
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    idle.extend(running.pop(future))
+                    idle.sort(key=self.dut.index)
+                    future.result()
+
     def run_all_cases(
         self,
         reset: bool = False,
         timeout: int = DEFAULT_TIMEOUT,
         start_retry: int = DEFAULT_START_RETRY,
+        parallel: bool = False,
     ) -> None:
         """
         Run all cases
@@ -975,9 +1518,59 @@ class CaseTester:
             reset: whether to perform a hardware reset before running a case
             timeout: timeout in second
             start_retry (int): number of retries for a single case when it is failed to start
+            parallel: distribute the normal and multi_stage cases to all the duts, which must be flashed with the
+                same app. Each dut takes the next case once it's idle, and records the results in its own testsuite.
+                The multi_device cases are run after them, on disjoint groups of the duts at the same time.
         """
-        for case in self.test_menu:
-            self.run_case(case, reset, timeout=timeout, start_retry=start_retry)
+        if not parallel or len(self.dut) < 2:
+            for case in self.test_menu:
+                self.run_case(case, reset, timeout=timeout, start_retry=start_retry)
+            return
+
+        self.run_single_board_cases_in_parallel(self.test_menu, reset=reset, timeout=timeout)
+        self.run_multi_dev_cases_in_parallel(self.test_menu, reset=reset, timeout=timeout, start_retry=start_retry)
+
+    def run_single_board_cases_in_parallel(
+        self,
+        cases: Iterable[UnittestMenuCase],
+        reset: bool = False,
+        timeout: int = DEFAULT_TIMEOUT,
+    ) -> None:
+        """
+        Run the normal and multi_stage cases on all the duts at the same time. The cases are taken from a shared
+        queue, so a dut running short cases takes more of them.
+
+        Args:
+            cases: cases to run, the other types are skipped
+            reset: whether to perform a hardware reset before running a case
+            timeout: timeout in second, overridden by the ``timeout`` attribute of the case
+        """
+        self._check_same_app()
+
+        pending: queue.Queue[UnittestMenuCase] = queue.Queue()
+        for case in cases:
+            if case.type in ('normal', 'multi_stage'):
+                pending.put(case)
+
+        def _worker(dut: 'IdfDut') -> None:
+            while True:
+                try:
+                    case = pending.get_nowait()
+                except queue.Empty:
+                    return
+
+                case_timeout = int(case.attributes['timeout']) if case.attributes.get('timeout') else timeout
+                logging.debug('Run case "%s" on %s', case.name, dut.logfile)
+                if case.type == 'normal':
+                    dut._run_normal_case(case, reset=reset, timeout=case_timeout)
+                else:
+                    dut._run_multi_stage_case(case, reset=reset, timeout=case_timeout)
+
+        with concurrent.futures.ThreadPoolExecutor(len(self.dut), thread_name_prefix='unity-case') as executor:
+            futures = [executor.submit(_worker, dut) for dut in self.dut]
+
+        for future in futures:
+            future.result()
 
     def run_case(
         self,
@@ -2,6 +2,7 @@ import os
 import platform
 import re
 import tempfile
+import time
 import xml.etree.ElementTree as ET
 
 import pytest
@@ -700,6 +701,289 @@ def test_idf_parse_test_menu():
     assert test_menu[2].subcases[1]['name'] == 'ledc_cpu_reset_test_second_stage'
 
 
+def test_idf_test_menu_cache(tmp_path):
+    from types import SimpleNamespace
+
+    from pexpect import TIMEOUT
+    from pytest_embedded.utils import Meta
+
+    elf_file = tmp_path / 'app.elf'
+    elf_file.write_bytes(b'\x7fELF')
+    s = """(1)\t"case one" [a]
+(2)\t"case two" [b][multi_stage]
+\t(1)\t"first_stage"
+\t(2)\t"second_stage"
+"""
+    calls = []
+
+    def new_dut():
+        dut = IdfDut.__new__(IdfDut)
+        dut._test_menu = None
+        dut._test_menu_unverified = False
+        dut._meta = Meta(str(tmp_path), {}, {}, cache_dir=str(tmp_path / 'cache'))
+        dut.app = SimpleNamespace(elf_file=str(elf_file))
+        dut._parse_test_menu = lambda: calls.append('menu') or IdfDut._parse_unity_menu_from_str(s)
+        dut._hard_reset = lambda: calls.append('reset')
+        dut._reset_before_next_case = False
+        dut._get_ready = lambda _timeout: None
+        return dut
+
+    parsed = new_dut().test_menu
+    assert calls == ['menu', 'reset']
+    assert len(os.listdir(tmp_path / 'cache' / 'unity-test-menu')) == 1
+
+    dut = new_dut()
+    assert dut.test_menu == parsed
+    assert calls == ['menu', 'reset']  # neither printed nor reset
+
+    # the first case started verifies the cache
+    def confirm_write(*_args, **_kwargs):
+        raise TIMEOUT('timeout')
+
+    dut.confirm_write = confirm_write
+    with pytest.raises(TIMEOUT):
+        dut._prepare_and_start_case(dut.test_menu[1], False, 1)
+    # the menu is parsed from the app again only once
+    assert calls == ['menu', 'reset', 'reset', 'menu', 'reset']
+    with pytest.raises(TIMEOUT):
+        dut._prepare_and_start_case(dut.test_menu[1], False, 1)
+    assert calls == ['menu', 'reset', 'reset', 'menu', 'reset']
+
+
+def test_idf_test_menu_cache_stale_indices(tmp_path):
+    import json
+    from types import SimpleNamespace
+
+    from pexpect import TIMEOUT
+    from pytest_embedded.utils import Meta
+
+    elf_file = tmp_path / 'app.elf'
+    elf_file.write_bytes(b'\x7fELF')
+    s = """(1)\t"case one" [a]
+(2)\t"case two" [b]
+(3)\t"case three" [c][multi_stage]
+\t(1)\t"first_stage"
+\t(2)\t"second_stage"
+"""
+    real_menu = IdfDut._parse_unity_menu_from_str(s)
+    calls = []
+    written = []
+
+    dut = IdfDut.__new__(IdfDut)
+    dut._test_menu = None
+    dut._test_menu_unverified = False
+    dut._meta = Meta(str(tmp_path), {}, {}, cache_dir=str(tmp_path / 'cache'))
+    dut.app = SimpleNamespace(elf_file=str(elf_file))
+    dut._parse_test_menu = lambda: calls.append('menu') or IdfDut._parse_unity_menu_from_str(s)
+    dut._hard_reset = lambda: calls.append('reset')
+    dut._reset_before_next_case = False
+    dut._get_ready = lambda _timeout: None
+
+    def confirm_write(index, expect_str):
+        written.append(index)
+        if expect_str != f'Running {real_menu[int(index) - 1].name}...':
+            raise TIMEOUT('timeout')
+
+    dut.confirm_write = confirm_write
+
+    # cached by an app with the cases in another order
+    cache_path = dut._test_menu_cache_path
+    stale_menu = IdfDut._parse_unity_menu_from_str(s.replace('(1)\t"case one"', '(9)\t"case one"'))
+    for case, index in zip(stale_menu, (2, 1, 3)):
+        case.index = index
+    IdfDut._save_cached_test_menu(cache_path, stale_menu)
+
+    stale_cases = list(dut.test_menu)
+    assert calls == []
+
+    # the stale menu is parsed again from the app, and the case is started with the new index
+    _, case = dut._prepare_and_start_case(stale_cases[0], False, 1)
+    assert (case.name, case.index) == ('case one', 1)
+    assert written == [2, 1]
+    assert calls == ['reset', 'menu', 'reset']
+    with open(cache_path) as fr:
+        assert [c['index'] for c in json.load(fr)['cases']] == [1, 2, 3]
+
+    # the following cases taken from the stale menu are looked up by name, without parsing again
+    _, case = dut._prepare_and_start_case(stale_cases[1], False, 1)
+    assert (case.name, case.index) == ('case two', 2)
+    _, case = dut._prepare_and_start_case(stale_cases[2], False, 1)
+    assert case.subcases == real_menu[2].subcases
+    assert written == [2, 1, 2, 3]
+    assert calls == ['reset', 'menu', 'reset']
+
+
+def test_idf_adaptive_timeouts(tmp_path):
+    from types import SimpleNamespace
+
+    from pytest_embedded.utils import Meta
+    from pytest_embedded_idf.unity_tester import CaseDurationHistory
+
+    case = IdfDut._parse_unity_menu_from_str('(1)\t"case" [a]\n')[0]
+
+    def new_dut(adaptive_timeouts):
+        dut = IdfDut.__new__(IdfDut)
+        dut.adaptive_timeouts = adaptive_timeouts
+        dut._meta = Meta(str(tmp_path), {}, {}, cache_dir=str(tmp_path / 'cache'))
+        dut.app = SimpleNamespace(binary_path=str(tmp_path / 'build'))
+        return dut
+
+    dut = new_dut(False)
+    for duration in (1, 2, 3):
+        dut._record_case_duration(case, duration, 30, None)
+    assert dut._adaptive_timeout(case, 30) == 30  # not enabled
+    assert CaseDurationHistory.shutdown() is None
+
+    # the durations are loaded from the cache dir, 2 * 3 + 5
+    dut = new_dut(True)
+    assert dut._adaptive_timeout(case, 30) == 11
+    assert dut._adaptive_timeout(case, 10) == 10  # never longer than the timeout given
+
+    dut._record_case_duration(case, None, 11, 30)
+    assert CaseDurationHistory.shutdown() == (
+        'Adaptive timeouts saved 19.0 seconds of wall-clock time in 1 timed out unity case(s)'
+    )
+
+
+def test_idf_unity_case_crashed():
+    from types import SimpleNamespace
+
+    from pytest_embedded.log import PexpectProcess
+
+    case = IdfDut._parse_unity_menu_from_str('(1)\t"case" [a]\n')[0]
+
+    fr, fw = os.pipe()
+    dut = IdfDut.__new__(IdfDut)
+    dut.pexpect_proc = PexpectProcess(fr)
+    dut.logfile = 'dut.log'
+    dut.app = SimpleNamespace(app_path='app')
+    dut._meta = None
+    dut._ignore_first_ready_pattern = False
+    dut._reset_before_next_case = False
+
+    # panicked and rebooted
+    os.write(
+        fw,
+        b'Running case...\n'
+        b"Guru Meditation Error: Core  0 panic'ed (LoadProhibited). Exception was unhandled.\n\n"
+        b'Core  0 register dump:\nPC      : 0x400d1234\n\nELF file SHA256: 0123456789abcdef\n\nRebooting...\n'
+        b'rst:0xc (SW_CPU_RESET),boot:0x13 (SPI_FAST_FLASH_BOOT)\nPress ENTER to see the list of tests\n',
+    )
+    start = time.perf_counter()
+    attrs = dut._read_result_and_parse_attrs(case, start, 30)
+    assert time.perf_counter() - start < 5
+    assert attrs['result'] == 'FAIL'
+    assert attrs['message'].startswith('Crashed before printing the result:\nGuru Meditation Error')
+    assert 'PC      : 0x400d1234' in attrs['message']
+    assert not dut._reset_before_next_case
+    dut._get_ready(1)  # the ready pattern printed after the reboot is kept
+
+    # halted, reset before the next case
+    os.write(fw, b'Running case...\nCore  0 register dump:\nPC      : 0x400d1234\nCPU halted.\n')
+    attrs = dut._read_result_and_parse_attrs(case, time.perf_counter(), 30)
+    assert attrs['message'].startswith('Crashed before printing the result:\nCore  0 register dump:')
+    assert dut._reset_before_next_case
+
+    # boot loop
+    os.write(fw, b'rst:0x10 (RTCWDT_RTC_RESET),boot:0x13\n' * 3)
+    with pytest.raises(ValueError, match='boot loop'):
+        dut._get_ready(30)
+
+
+def test_decode_pool(tmp_path):
+    from pytest_embedded_idf.decoder import DecodePool
+
+    dut_0 = str(tmp_path / 'coredump-0.txt')
+    dut_1 = str(tmp_path / 'coredump-1.txt')
+    DecodePool.submit(dut_0, bytes.decode, b'foo', test_case_name='test_0', encoding='ascii')
+    DecodePool.submit(dut_0, bytes.decode, b'bar', test_case_name='test_0', encoding='ascii')
+    DecodePool.submit(dut_1, bytes.decode, b'foo', test_case_name='test_1', encoding='ascii')  # identical
+    DecodePool.submit(dut_1, bytes.decode, b'\xff', test_case_name='test_1', encoding='ascii')  # failed
+    assert len(DecodePool._futures) == 3
+
+    summary = DecodePool.shutdown()
+    assert summary.startswith('Decoded 3 panic output(s) and core dump(s) in the background, 1 identical one(s)')
+    with open(dut_0) as fr:
+        assert fr.read() == 'foo\nbar'
+    with open(dut_1) as fr:
+        assert fr.read() == 'foo'
+
+    junit_outputs = DecodePool.pop_junit_outputs()
+    assert junit_outputs['test_0'] == {'system-out': [f'----- decoded {dut_0} -----\nfoo\nbar']}
+    assert junit_outputs['test_1']['system-out'] == [f'----- decoded {dut_1} -----\nfoo']
+    assert junit_outputs['test_1']['system-err'][0].startswith(f'Failed to decode {dut_1}: ')
+
+    assert DecodePool.shutdown() is None
+    assert DecodePool.pop_junit_outputs() == {}
+
+
+def _fake_decode(dump, **kwargs):
+    return f'decoded {len(dump)} bytes for {kwargs["target"]}'
+
+
+def test_idf_close_async_decode(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+
+    import pytest_embedded_idf.dut
+    from pytest_embedded.unity import JunitMerger
+    from pytest_embedded_idf.decoder import DecodePool
+
+    monkeypatch.setattr(pytest_embedded_idf.dut, 'decode_panic', _fake_decode)
+    monkeypatch.setattr(pytest_embedded_idf.dut, 'decode_coredump', _fake_decode)
+
+    logfile = tmp_path / 'dut.log'
+    logfile.write_bytes(
+        b'Guru Meditation Error\nCore 0 register dump:\nMEPC: 0x42000000\nELF file SHA256: 1234\n'
+        + IdfDut.COREDUMP_UART_START
+        + b'\nAAAA\n'
+        + IdfDut.COREDUMP_UART_END
+        + b'\n'
+    )
+
+    dut = IdfDut.__new__(IdfDut)
+    dut.logfile = str(logfile)
+    dut.pexpect_proc = None
+    dut.testsuite = SimpleNamespace(testcases=[])
+    dut.test_case_name = 'test_crash'
+    dut.target = 'esp32c3'
+    dut.app = SimpleNamespace(
+        elf_file='app.elf',
+        binary_path=str(tmp_path),
+        is_xtensa=False,
+        is_riscv32=True,
+        sdkconfig={'ESP_COREDUMP_ENABLE_TO_UART': True},
+    )
+    dut.skip_decode_panic = False
+    dut.skip_check_coredump = False
+    dut.async_decode = True
+
+    dut.close()  # queued only
+    assert not (tmp_path / 'panic_decoded.log').exists()
+    assert len(DecodePool._futures) == 2
+
+    assert DecodePool.shutdown()
+    assert (tmp_path / 'panic_decoded.log').read_text() == 'decoded 61 bytes for esp32c3'
+    assert (tmp_path / 'coredump.log').read_text() == 'decoded 6 bytes for esp32c3'
+
+    junit = tmp_path / 'junit.xml'
+    junit.write_text(
+        '<?xml version="1.0" encoding="utf-8"?><testsuites><testsuite name="pytest">'
+        '<testcase classname="test_app" name="test_crash"><failure message="crashed" /></testcase>'
+        '<testcase classname="test_app" name="test_other" /></testsuite></testsuites>'
+    )
+    JunitMerger(str(junit)).attach(DecodePool.pop_junit_outputs())
+
+    cases = ET.parse(junit).getroot().findall('.//testcase')
+    assert cases[0].find('failure').get('message') == 'crashed'
+    assert cases[0].find('system-out').text.split('\n') == [
+        f'----- decoded {tmp_path / "panic_decoded.log"} -----',
+        'decoded 61 bytes for esp32c3',
+        f'----- decoded {tmp_path / "coredump.log"} -----',
+        'decoded 6 bytes for esp32c3',
+    ]
+    assert cases[1].find('system-out') is None
+
+
 def test_idf_multi_hard_reset_and_expect(testdir):
     testdir.makepyfile(r"""
         def test_idf_hard_reset_and_expect(dut):
@@ -757,6 +1041,182 @@ def test_select_to_run():
     assert IdfUnityDutMixin._select_to_run([['hello', '!w']], None, None, ['hello', 'world'], None, None)
 
 
+def test_case_tester_run_all_cases_in_parallel(monkeypatch):
+    import threading
+    import time
+    from types import SimpleNamespace
+
+    from pytest_embedded_idf.unity_tester import CaseTester
+
+    s = """(1)\t"slow" [a][timeout=5]
+(2)\t"fast 1" [a]
+(3)\t"fast 2" [a]
+(4)\t"stages" [a][multi_stage]
+\t(1)\t"first_stage"
+\t(2)\t"second_stage"
+(5)\t"fast 3" [a]
+(6)\t"devices" [a][multi_device][timeout=7]
+\t(1)\t"master"
+\t(2)\t"slave"
+"""
+    test_menu = IdfDut._parse_unity_menu_from_str(s)
+    lock = threading.Lock()
+    runs = []
+    multi_dev_runs = []
+
+    def _run_multi_dev_case_on(duts, case, reset, timeout, start_retry):  # noqa: ARG001
+        multi_dev_runs.append((case.name, [dut.i for dut in duts], timeout))
+
+    monkeypatch.setattr(CaseTester, '_run_multi_dev_case_on', staticmethod(_run_multi_dev_case_on))
+
+    class FakeDut:
+        def __init__(self, i):
+            self.i = i
+            self.logfile = f'dut-{i}.log'
+            self.test_menu = test_menu
+            self.app = SimpleNamespace(binary_path='build')
+
+        def _run_normal_case(self, case, timeout, **_kwargs):
+            time.sleep(0.5 if case.name == 'slow' else 0.05)
+            with lock:
+                runs.append((self.i, case.name, timeout))
+
+        _run_multi_stage_case = _run_normal_case
+
+    tester = CaseTester([FakeDut(0), FakeDut(1)])
+    tester.run_all_cases(timeout=10, parallel=True)
+
+    assert sorted(name for _, name, _ in runs) == ['fast 1', 'fast 2', 'fast 3', 'slow', 'stages']
+    # the dut running the slow case is not waited for
+    assert [(i, name) for i, name, _ in runs if i == runs[-1][0]] == [(runs[-1][0], 'slow')]
+    assert (runs[-1][0], 'slow', 5) in runs
+    # the multi_device cases honor their own timeout
+    assert multi_dev_runs == [('devices', [0, 1], 7)]
+
+
+def test_case_tester_run_all_multi_dev_cases_in_parallel(monkeypatch):
+    import threading
+    import time
+    from types import SimpleNamespace
+
+    from pytest_embedded_idf.unity_tester import CaseTester
+
+    s = """(1)\t"a" [a][multi_device]
+\t(1)\t"a1"
+\t(2)\t"a2"
+(2)\t"b" [a][multi_device]
+\t(1)\t"b1"
+\t(2)\t"b2"
+(3)\t"c" [a][multi_device]
+\t(1)\t"c1"
+\t(2)\t"c2"
+\t(3)\t"c3"
+(4)\t"d" [a][multi_device][timeout=5]
+\t(1)\t"d1"
+\t(2)\t"d2"
+(5)\t"normal" [a]
+"""
+    test_menu = IdfDut._parse_unity_menu_from_str(s)
+    lock = threading.Lock()
+    runs = []
+
+    timeouts = {}
+
+    def _run_multi_dev_case_on(duts, case, reset, timeout, start_retry):  # noqa: ARG001
+        start = time.perf_counter()
+        time.sleep(0.4 if case.name == 'b' else 0.1)
+        with lock:
+            runs.append((case.name, [dut.i for dut in duts], start, time.perf_counter()))
+            timeouts[case.name] = timeout
+
+    monkeypatch.setattr(CaseTester, '_run_multi_dev_case_on', staticmethod(_run_multi_dev_case_on))
+
+    duts = [
+        SimpleNamespace(i=i, logfile=f'dut-{i}.log', test_menu=test_menu, app=SimpleNamespace(binary_path='build'))
+        for i in range(4)
+    ]
+    CaseTester(duts).run_all_multi_dev_cases(timeout=10, parallel=True)
+
+    assert sorted(name for name, *_ in runs) == ['a', 'b', 'c', 'd']
+    assert timeouts == {'a': 10, 'b': 10, 'c': 10, 'd': 5}
+    for name, group, *_ in runs:
+        assert len(group) == len(test_menu['abcd'.index(name)].subcases)
+
+    # the cases running at the same time run on disjoint groups
+    for name, group, start, end in runs:
+        for _name, _group, _start, _end in runs:
+            if name != _name and start < _end and _start < end:
+                assert not set(group) & set(_group)
+
+    # "d" doesn't wait for "c", which requires 3 duts
+    starts = {name: start for name, _, start, _ in runs}
+    ends = {name: end for name, _, _, end in runs}
+    assert starts['d'] < ends['b'] <= starts['c']
+
+
+@pytest.mark.parametrize('stream', ['pipe', 'file'])
+def test_multi_dev_run_test_manager(tmp_path, stream):
+    from types import SimpleNamespace
+
+    from pytest_embedded.log import PexpectProcess
+    from pytest_embedded_idf.unity_tester import MultiDevRunTestManager
+
+    test_menu = IdfDut._parse_unity_menu_from_str(
+        '(1)\t"multi dev case" [a][multi_device]\n\t(1)\t"first"\n\t(2)\t"second"\n'
+    )
+    result = b'foo.c:1:multi dev case:PASS\n-----------------------\n1 Tests 0 Failures 0 Ignored\nOK\n'
+
+    class FakeDut:
+        def __init__(self, i, script):
+            # (expected input, output replied)
+            self.script = script
+            self.written = []
+            self.app = SimpleNamespace(app_path=f'app-{i}')
+            if stream == 'pipe':
+                fr, self._fw = os.pipe()
+                self.pexpect_proc = PexpectProcess(fr)
+            else:
+                path = tmp_path / f'dut-{i}.log'
+                path.touch()
+                self._fw = os.open(path, os.O_WRONLY | os.O_APPEND)
+                self._fr = open(path, 'rb')
+                self.pexpect_proc = PexpectProcess(self._fr)
+            os.write(self._fw, b'Press ENTER to see the list of tests\n')
+
+        def write(self, s):
+            self.written.append(s)
+            expected, output = self.script.pop(0)
+            assert s == expected
+            os.write(self._fw, output)
+
+    dut1 = FakeDut(
+        1,
+        [
+            ('1', b'Running multi dev case...\n'),
+            ('1', b'Send signal: [ready][42]!\nWaiting for signal: [ack]!\n'),
+            ('ok', result),
+        ],
+    )
+    dut2 = FakeDut(
+        2,
+        [
+            ('1', b'Running multi dev case...\n'),
+            ('2', b'Waiting for signal: [ready]!\n'),
+            ('42', b'Send signal: [ack][ok]!\n' + result),
+        ],
+    )
+
+    mdm = MultiDevRunTestManager([dut1, dut2], test_menu[0], 3, 5, 5)
+    res = mdm.gather()
+
+    assert [r['result'] for r in res] == ['PASS', 'PASS']
+    assert dut1.written == ['1', '1', 'ok']
+    assert dut2.written == ['1', '2', '42']
+    merged = mdm.get_merge_data(res)
+    assert merged['result'] == 'PASS'
+    assert merged['app_path'] == 'app-1|app-2'
+
+
 @pytest.mark.parametrize('reset', [True, False])
 def test_dut_run_all_single_board_cases(testdir, reset):
     testdir.makepyfile(rf"""
@@ -2,11 +2,16 @@
 
 from ._telnetlib.telnetlib import Telnet
 from .gdb import Gdb
+from .mi import MiRecord
 from .openocd import OpenOcd
+from .tcl import OpenOcdTclClient, TclResult
 
 __all__ = [
     'Gdb',
+    'MiRecord',
     'OpenOcd',
+    'OpenOcdTclClient',
+    'TclResult',
     'Telnet',
 ]
 
@@ -1,10 +1,20 @@
+import concurrent.futures
+import itertools
 import logging
+import os
+import queue
 import re
 import shlex
+import subprocess
+import threading
 import time
+import typing as t
 from typing import AnyStr
 
 from pytest_embedded.log import DuplicateStdoutPopen
+from pytest_embedded.utils import to_str
+
+from .mi import PROMPT, STREAM_PREFIXES, MiRecord, parse_record, parse_stream
 
 
 class Gdb(DuplicateStdoutPopen):
@@ -16,15 +26,51 @@ class Gdb(DuplicateStdoutPopen):
 
     _GDB_RESPONSE_FINISHED_RE = re.compile(r'^\(gdb\)\s*$')
 
-    def __init__(self, gdb_prog_path: str | None = None, gdb_cli_args: str | None = None, **kwargs):
+    def __init__(
+        self,
+        gdb_prog_path: str | None = None,
+        gdb_cli_args: str | None = None,
+        gdb_mi: bool = False,
+        **kwargs,
+    ):
+        """
+        Args:
+            gdb_prog_path: GDB program path
+            gdb_cli_args: GDB cli arguments
+            gdb_mi: use the GDB/MI interpreter. The output is read from a pipe and parsed in a reader thread,
+                the commands are matched with their results by tokens.
+        """
         gdb_prog_path = gdb_prog_path or self.GDB_PROG_PATH
         gdb_cli_args = shlex.split(gdb_cli_args or self.GDB_DEFAULT_ARGS)
 
         self._gdb_first_write = True
 
+        self.mi = gdb_mi
+        self._mi_tokens = itertools.count(1)
+        self._mi_pending: dict[int, concurrent.futures.Future] = {}
+        self._mi_streams: list[str] = []
+        self._mi_lock = threading.Lock()
+        self._mi_stopped: queue.Queue[MiRecord] = queue.Queue()
+        self._mi_reader: threading.Thread | None = None
+
+        if self.mi:
+            gdb_cli_args.append('--interpreter=mi3')
+            kwargs['stdout'] = subprocess.PIPE
+
         super().__init__(cmd=[gdb_prog_path, *gdb_cli_args], **kwargs)
 
+        if self.mi:
+            self._mi_reader = threading.Thread(target=self._read_mi, name='gdb-mi-reader', daemon=True)
+            self._mi_reader.start()
+
     def write(self, s: AnyStr, non_blocking: bool = False, timeout: float = 30) -> str | None:
+        if self.mi:
+            if non_blocking:
+                self.submit(to_str(s))
+                return None
+
+            return self.execute(to_str(s), timeout=timeout).output
+
         with open(self._logfile) as fr:
             if self._gdb_first_write:
                 # Discard all queued responses before the first write
@@ -47,6 +93,8 @@ class Gdb(DuplicateStdoutPopen):
                     _buffer += line
                     if self._GDB_RESPONSE_FINISHED_RE.match(line):
                         break
+                else:
+                    time.sleep(0.01)  # wait for more output, instead of spinning
 
                 _t_now = time.time()
                 if (_t_now - _t_start) >= timeout:
@@ -57,3 +105,113 @@ class Gdb(DuplicateStdoutPopen):
 
         logging.debug(f'{self.SOURCE} <-: {_buffer}')
         return _buffer
+
+    ##########
+    # GDB/MI #
+    ##########
+    def _read_mi(self) -> None:
+        for raw in iter(self.stdout.readline, b''):
+            # still keep the complete output in the log file
+            try:
+                os.write(self._fw.fileno(), raw)
+            except (OSError, ValueError):  # closed
+                pass
+
+            line = to_str(raw).rstrip('\r\n')
+            if not line or line.strip() == PROMPT:
+                continue
+
+            if line[0] in STREAM_PREFIXES:
+                try:
+                    self._mi_streams.append(parse_stream(line))
+                except IndexError:
+                    pass
+                continue
+
+            record = parse_record(line)
+            if record is None:  # output of the inferior
+                continue
+
+            if record.is_result:
+                record.streams, self._mi_streams = self._mi_streams, []
+                with self._mi_lock:
+                    future = self._mi_pending.pop(record.token, None)
+                if future is not None:
+                    future.set_result(record)
+            elif record.kind == '*' and record.cls == 'stopped':
+                self._mi_stopped.put(record)
+
+        # exited
+        with self._mi_lock:
+            pending, self._mi_pending = self._mi_pending, {}
+        for future in pending.values():
+            future.set_exception(EOFError('GDB exited'))
+
+    def _submit_all(self, commands: t.Sequence[str]) -> list[concurrent.futures.Future]:
+        if not self.mi:
+            raise ValueError('GDB is not running in MI mode, set "gdb_mi" to True')
+
+        futures = []
+        lines = []
+        with self._mi_lock:
+            for command in commands:
+                token = next(self._mi_tokens)
+                futures.append(concurrent.futures.Future())
+                self._mi_pending[token] = futures[-1]
+                lines.append(f'{token}{command}\n')
+
+        logging.debug(f'{self.SOURCE} ->: {"".join(lines)}')
+        self.stdin.write(''.join(lines).encode())
+        return futures
+
+    def submit(self, command: str) -> concurrent.futures.Future:
+        """
+        Send one command without waiting for its result. MI commands start with ``-``, CLI commands are also
+        accepted.
+
+        Returns:
+            Future of the result record, a `MiRecord`
+        """
+        return self._submit_all([command])[0]
+
+    def execute(self, command: str, timeout: float | None = 30) -> MiRecord:
+        """
+        Send one command and wait for its result record.
+
+        Raises:
+            TimeoutError: if the result record is not received in `timeout` seconds
+        """
+        return self.execute_batch([command], timeout)[0]
+
+    def execute_batch(self, commands: t.Sequence[str], timeout: float | None = 30) -> list[MiRecord]:
+        """
+        Send all the commands at once, then wait for all the result records.
+
+        Args:
+            commands: commands
+            timeout: seconds to wait for all the result records
+
+        Returns:
+            Result records in the same order of the commands
+        """
+        futures = self._submit_all(commands)
+        _, not_done = concurrent.futures.wait(futures, timeout)
+        if not_done:
+            raise TimeoutError(f'GDB got no result in {timeout} seconds')
+
+        return [f.result() for f in futures]
+
+    def wait_stopped(self, timeout: float | None = 30) -> MiRecord:
+        """
+        Wait for the next ``*stopped`` record not waited for yet, e.g. a breakpoint hit or a signal.
+
+        Returns:
+            The ``*stopped`` record, with ``reason``, ``frame``... in its `results`
+
+        Raises:
+            TimeoutError: if the target does not stop in `timeout` seconds
+        """
+        try:
+            return self._mi_stopped.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f'GDB target not stopped in {timeout} seconds')
@@ -0,0 +1,141 @@
+import re
+import typing as t
+from dataclasses import dataclass, field
+
+# [token] ("^" | "*" | "+" | "=") class ["," results]
+_RECORD_RE = re.compile(r'^(\d*)([\^*+=])([\w-]+)(?:,(.*))?$')
+
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '"': '"', '\\': '\\', 'a': '\a', 'b': '\b', 'f': '\f', 'v': '\v'}
+
+STREAM_PREFIXES = '~@&'
+PROMPT = '(gdb)'
+
+
+@dataclass
+class MiRecord:
+    """
+    One GDB/MI output record.
+
+    Attributes:
+        kind: ``^`` for result records, ``*`` for exec async records, ``=`` for notify async records, ``+`` for
+            status async records
+        cls: result or async class, e.g. ``done``, ``error``, ``stopped``, ``breakpoint-modified``
+        results: the ``name=value`` pairs. Values are strings, dicts for tuples, and lists for lists
+        token: token of the command this result record answers
+        streams: console, target and log stream output received since the previous result record, only for
+            result records
+    """
+
+    kind: str
+    cls: str
+    results: dict[str, t.Any] = field(default_factory=dict)
+    token: int | None = None
+    streams: list[str] = field(default_factory=list)
+
+    @property
+    def is_result(self) -> bool:
+        return self.kind == '^'
+
+    @property
+    def output(self) -> str:
+        """Console output of the command, what the CLI would print."""
+        return ''.join(self.streams)
+
+    def raise_for_error(self) -> 'MiRecord':
+        """
+        Raises:
+            RuntimeError: if this is an ``^error`` result record
+        """
+        if self.cls == 'error':
+            raise RuntimeError(f'GDB command failed: {self.results.get("msg", "")}')
+
+        return self
+
+
+def _parse_cstring(s: str, i: int) -> tuple[str, int]:
+    # s[i] is the opening quote
+    chars = []
+    i += 1
+    while s[i] != '"':
+        if s[i] == '\\':
+            i += 1
+            if s[i] in '01234567':
+                j = i
+                while j < i + 3 and s[j] in '01234567':
+                    j += 1
+                chars.append(chr(int(s[i:j], 8)))
+                i = j
+                continue
+
+            chars.append(_ESCAPES.get(s[i], s[i]))
+        else:
+            chars.append(s[i])
+        i += 1
+
+    return ''.join(chars), i + 1
+
+
+def _parse_value(s: str, i: int) -> tuple[t.Any, int]:
+    if s[i] == '"':
+        return _parse_cstring(s, i)
+
+    if s[i] == '{':
+        return _parse_results(s, i + 1, '}')
+
+    if s[i] == '[':
+        values: list[t.Any] = []
+        i += 1
+        while s[i] != ']':
+            if s[i] in '"{[':
+                value, i = _parse_value(s, i)
+            else:  # name=value, the names in lists are always the same, e.g. [frame={...},frame={...}]
+                i = s.index('=', i) + 1
+                value, i = _parse_value(s, i)
+            values.append(value)
+            if s[i] == ',':
+                i += 1
+
+        return values, i + 1
+
+    raise ValueError(f'Invalid GDB/MI value at {i}: {s}')
+
+
+def _parse_results(s: str, i: int, end: str | None = None) -> tuple[dict[str, t.Any], int]:
+    results: dict[str, t.Any] = {}
+    while i < len(s) and (end is None or s[i] != end):
+        eq = s.index('=', i)
+        results[s[i:eq]], i = _parse_value(s, eq + 1)
+        if i < len(s) and s[i] == ',':
+            i += 1
+
+    return results, i + 1
+
+
+def parse_stream(line: str) -> str:
+    """
+    Text of a stream record, e.g. ``~"Breakpoint 1 at 0x42001234\\n"``.
+    """
+    return _parse_cstring(line, 1)[0]
+
+
+def parse_record(line: str) -> MiRecord | None:
+    """
+    Parse one result record or async record.
+
+    Returns:
+        None if the line is not a result record or an async record, e.g. stream records, the prompt, or the
+        output of the inferior
+    """
+    match = _RECORD_RE.match(line)
+    if not match:
+        return None
+
+    token, kind, cls, rest = match.groups()
+    results = {}
+    if rest:
+        try:
+            results, _ = _parse_results(rest, 0)
+        except (IndexError, ValueError):
+            return None
+
+    return MiRecord(kind=kind, cls=cls, results=results, token=int(token) if token else None)
@@ -1,13 +1,16 @@
+import collections
 import logging
 import os
 import shlex
 import time
+import typing as t
 from typing import AnyStr
 
 from pytest_embedded.log import DuplicateStdoutPopen
 from pytest_embedded.utils import to_bytes, to_str
 
 from ._telnetlib.telnetlib import Telnet
+from .tcl import OpenOcdTclClient
 
 
 class OpenOcd(DuplicateStdoutPopen):
@@ -25,6 +28,15 @@ class OpenOcd(DuplicateStdoutPopen):
     TELNET_BASE_PORT = 4444
     GDB_BASE_PORT = 3333
 
+    # seconds to wait for OpenOCD to listen on the telnet port
+    STARTUP_TIMEOUT = 30
+    # the telnet connection is retried after 10ms, 20ms, 40ms... at most this many seconds
+    CONNECT_RETRY_MAX_INTERVAL = 0.1
+
+    # running instances kept by ``--openocd-keep-session``, keyed by the program, the cli args and the port offset.
+    # the one released first is leased first
+    _kept: t.ClassVar[dict[tuple, collections.deque]] = collections.defaultdict(collections.deque)
+
     def __init__(
         self,
         openocd_prog_path: str | None = None,
@@ -54,17 +66,123 @@ class OpenOcd(DuplicateStdoutPopen):
             ]
         )
 
+        # set by `lease()` while this instance is kept for the whole session
+        self._keep_key: tuple | None = None
+        self._tcl: OpenOcdTclClient | None = None
+
         super().__init__(cmd=[openocd_prog_path, *openocd_cli_args], **kwargs)
 
         # open telnet port to interact with openocd
-        for i in range(30):
+        self.telnet = self._connect_telnet()
+
+    @property
+    def tcl(self) -> OpenOcdTclClient:
+        """
+        Client of the TCL RPC port, connected on the first use. Prefer it over `write()` for running many commands,
+        e.g. ``openocd.tcl.execute_batch([...])``.
+        """
+        if self._tcl is None:
+            self._tcl = OpenOcdTclClient('127.0.0.1', self.tcl_port)
+
+        return self._tcl
+
+    def _log_tail(self, size: int = 2048) -> str:
+        with open(self._logfile, 'rb') as fr:
+            fr.seek(max(0, os.path.getsize(self._logfile) - size))
+            return to_str(fr.read())
+
+    def _connect_telnet(self) -> Telnet:
+        """
+        Connect to the telnet port as soon as OpenOCD listens on it, retrying with a short backoff. Fail fast if
+        OpenOCD exited before that, e.g. the adapter was not found.
+        """
+        deadline = time.monotonic() + self.STARTUP_TIMEOUT
+        interval = 0.01
+        while True:
+            if self.poll() is not None:
+                raise RuntimeError(
+                    f'OpenOCD exited with code {self.returncode} before listening on telnet port {self.telnet_port}:\n'
+                    f'{self._log_tail()}'
+                )
+
             try:
-                self.telnet = Telnet('127.0.0.1', self.telnet_port, 5)
-                break
+                return Telnet('127.0.0.1', self.telnet_port, 5)
             except ConnectionRefusedError:
-                time.sleep(1)
-        else:
-            raise ConnectionRefusedError
+                if time.monotonic() >= deadline:
+                    raise ConnectionRefusedError(
+                        f'OpenOCD is not listening on telnet port {self.telnet_port} '
+                        f'after {self.STARTUP_TIMEOUT} seconds:\n{self._log_tail()}'
+                    )
+
+                time.sleep(interval)
+                interval = min(interval * 2, self.CONNECT_RETRY_MAX_INTERVAL)
+
+    @classmethod
+    def lease(cls, **kwargs) -> 'OpenOcd':
+        """
+        Get the running instance kept for the same program, cli args and port offset, or start a new one and keep
+        it until the end of the session.
+
+        Args:
+            **kwargs: keyword arguments used for initializing `cls`
+
+        Returns:
+            `OpenOcd` instance, its `terminate()` gives it back instead of terminating it
+        """
+        key = (cls, kwargs.get('openocd_prog_path'), kwargs.get('openocd_cli_args'), kwargs.get('port_offset', 0))
+        kept = cls._kept[key]
+        while kept:
+            openocd = kept.popleft()
+            if openocd.poll() is not None:
+                logging.debug('Kept OpenOCD instance %s exited with code %s, dropped', openocd.pid, openocd.returncode)
+                openocd._keep_key = None
+                openocd.terminate()
+                continue
+
+            logging.debug('Reuse kept OpenOCD instance %s', openocd.pid)
+            return openocd
+
+        openocd = cls(**kwargs)
+        openocd._keep_key = key
+        return openocd
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """
+        Terminate all kept instances. Called at the end of the session.
+        """
+        for kept in cls._kept.values():
+            while kept:
+                openocd = kept.popleft()
+                openocd._keep_key = None
+                openocd.terminate()
+                openocd.kill()
+
+        cls._kept.clear()
+
+    def close(self):
+        if self._tcl is not None:
+            self._tcl.close()
+            self._tcl = None
+
+        super().close()
+
+    def terminate(self):
+        if self._keep_key is not None:
+            if self.poll() is None:
+                if self not in self._kept[self._keep_key]:
+                    self._kept[self._keep_key].append(self)
+                return
+
+            self._keep_key = None
+
+        super().terminate()
+
+    def kill(self):
+        if self._keep_key is not None:  # kept alive for the session
+            return
+
+        super().kill()
 
     def write(self, s: AnyStr) -> str:
         # read all output already sent
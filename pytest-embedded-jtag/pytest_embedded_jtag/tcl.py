@@ -0,0 +1,171 @@
+import logging
+import socket
+import threading
+import time
+import typing as t
+from dataclasses import dataclass
+
+from pytest_embedded.utils import to_str
+
+# each command and each response of the OpenOCD TCL RPC server ends with this byte
+TCL_TERMINATOR = b'\x1a'
+
+
+@dataclass
+class TclResult:
+    command: str
+    output: str
+    ok: bool = True
+
+    def raise_for_error(self) -> 'TclResult':
+        """
+        Raises:
+            RuntimeError: if the command failed
+        """
+        if not self.ok:
+            raise RuntimeError(f'OpenOCD command "{self.command}" failed: {self.output}')
+
+        return self
+
+
+class OpenOcdTclClient:
+    """
+    Client of the OpenOCD TCL RPC server, on ``tcl_port``.
+
+    Unlike the telnet port, no prompt is waited for between the commands. A batch of commands is sent at once, and
+    OpenOCD answers them one by one in the same order. Each command runs in ``catch {capture {...}}``, so its
+    output and whether it failed are returned separately.
+
+    Examples:
+        >>> tcl = OpenOcdTclClient('127.0.0.1', 6666)
+        >>> tcl.execute('reset halt').raise_for_error()
+        >>> tcl.execute_batch([f'mww {hex(0x3FC88000 + i * 4)} {i}' for i in range(100)])
+        >>> tcl.read_memory(0x3FC88000, 32, 100)
+        >>> tcl.close()
+    """
+
+    DEFAULT_TIMEOUT = 10
+    CONNECT_TIMEOUT = 5
+
+    # the output of the command is stored in this Tcl variable
+    _RESULT_VAR = '__pytest_embedded_result'
+
+    def __init__(self, addr: str, port: int) -> None:
+        """
+        Args:
+            addr: TCL RPC server address
+            port: TCL RPC server port
+        """
+        self.addr = addr
+        self.port = int(port)
+
+        self._sock: socket.socket | None = None
+        self._buffer = b''
+        self._lock = threading.Lock()
+
+    def _connected(self) -> socket.socket:
+        if self._sock is None:
+            self._sock = socket.create_connection((self.addr, self.port), self.CONNECT_TIMEOUT)
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._buffer = b''
+
+        return self._sock
+
+    def _read_frame(self, sock: socket.socket, timeout: float) -> bytes:
+        deadline = time.monotonic() + timeout
+        while TCL_TERMINATOR not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError
+
+            sock.settimeout(remaining)
+            data = sock.recv(65536)  # raises TimeoutError
+
+            if not data:
+                raise ConnectionError(f'OpenOCD TCL connection {self.addr}:{self.port} closed')
+
+            self._buffer += data
+
+        frame, _, self._buffer = self._buffer.partition(TCL_TERMINATOR)
+        return frame
+
+    @classmethod
+    def _wrap(cls, command: str) -> str:
+        return f'format "%d %s" [catch {{capture {{{command}}}}} {cls._RESULT_VAR}] ${cls._RESULT_VAR}'
+
+    def execute_batch(
+        self, commands: t.Sequence[str | tuple[str, float]], timeout: float | None = None
+    ) -> list[TclResult]:
+        """
+        Send all the commands at once, then read all the results.
+
+        Args:
+            commands: commands, or (command, timeout) tuples
+            timeout: seconds to wait for the result of each command since the previous one is received.
+                (Default: 10 seconds)
+
+        Returns:
+            The results, in the same order of the commands. A failed command does not stop the following ones.
+
+        Raises:
+            TimeoutError: if any result is not received in time. The connection is dropped, and reconnected on the
+                next call.
+        """
+        default_timeout = self.DEFAULT_TIMEOUT if timeout is None else timeout
+        items = [(c, default_timeout) if isinstance(c, str) else c for c in commands]
+        if not items:
+            return []
+
+        with self._lock:
+            sock = self._connected()
+            results = []
+            try:
+                sock.sendall(b''.join(self._wrap(cmd).encode() + TCL_TERMINATOR for cmd, _ in items))
+                for cmd, cmd_timeout in items:
+                    try:
+                        frame = self._read_frame(sock, cmd_timeout)
+                    except TimeoutError:
+                        raise TimeoutError(f'OpenOCD command "{cmd}" got no result in {cmd_timeout} seconds')
+
+                    code, _, output = to_str(frame).partition(' ')
+                    results.append(TclResult(command=cmd, output=output, ok=code == '0'))
+                    logging.debug('OpenOCD TCL %s: %s', cmd, output)
+            except Exception:
+                # the responses of the remaining commands may still come, the connection could not be reused
+                self._close()
+                raise
+
+        return results
+
+    def execute(self, command: str, timeout: float | None = None) -> TclResult:
+        """
+        Execute one command and wait for its result.
+
+        Args:
+            command: OpenOCD command
+            timeout: seconds to wait for the result. (Default: 10 seconds)
+        """
+        return self.execute_batch([command], timeout)[0]
+
+    def read_memory(self, address: int, width: int, count: int, timeout: float | None = None) -> list[int]:
+        """
+        Read `count` items of `width` bits from the target memory in one command.
+        """
+        output = self.execute(f'read_memory {hex(address)} {width} {count}', timeout).raise_for_error().output
+        return [int(v, 0) for v in output.split()]
+
+    def write_memory(self, address: int, width: int, values: t.Sequence[int], timeout: float | None = None) -> None:
+        """
+        Write `values` of `width` bits to the target memory in one command.
+        """
+        data = ' '.join(hex(v) for v in values)
+        self.execute(f'write_memory {hex(address)} {width} {{{data}}}', timeout).raise_for_error()
+
+    def _close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
@@ -35,3 +35,290 @@ def test_pexpect_by_jtag(testdir):
     )
 
     result.assert_outcomes(passed=1)
+
+
+_FAKE_OPENOCD = """\
+import re
+import socket
+import sys
+import threading
+import time
+
+args = sys.argv[1:]
+if '--exit' in args:
+    print('Error: unable to open ftdi device', file=sys.stderr)
+    sys.exit(1)
+
+
+def port_of(name):
+    return int(next(a for a in args if a.startswith(name)).split()[1])
+
+
+def serve_tcl_conn(conn):
+    buffer = b''
+    while True:
+        data = conn.recv(1024)
+        if not data:
+            break
+        buffer += data
+        while b'\\x1a' in buffer:
+            frame, _, buffer = buffer.partition(b'\\x1a')
+            cmd = re.search(r'capture \\{(.*)\\}\\} ', frame.decode()).group(1)
+            if cmd.startswith('sleep'):
+                time.sleep(float(cmd.split()[1]))
+            if cmd.startswith('read_memory'):
+                res = '0 ' + ' '.join(hex(i) for i in range(int(cmd.split()[3])))
+            elif 'fail' in cmd:
+                res = '1 invalid command name ' + cmd
+            else:
+                res = '0 ' + cmd
+            try:
+                conn.sendall(res.encode() + b'\\x1a')
+            except OSError:  # closed by the client
+                return
+
+
+def serve_tcl(server):
+    while True:
+        conn, _ = server.accept()
+        threading.Thread(target=serve_tcl_conn, args=(conn,), daemon=True).start()
+
+
+time.sleep(0.2)  # initializing the adapter
+
+tcl_server = socket.create_server(('127.0.0.1', port_of('tcl_port')))
+threading.Thread(target=serve_tcl, args=(tcl_server,), daemon=True).start()
+
+server = socket.create_server(('127.0.0.1', port_of('telnet_port')))
+print(f'Info : Listening on port {port_of("telnet_port")} for telnet connections', file=sys.stderr, flush=True)
+while True:
+    conn, _ = server.accept()
+    while True:
+        data = conn.recv(1024)
+        if not data:
+            break
+        conn.sendall(b'echo: ' + data + b'> ')
+"""
+
+
+def _free_port_offset():
+    import socket
+
+    from pytest_embedded_jtag import OpenOcd
+
+    # both the telnet port and the tcl port should be free
+    while True:
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            offset = s.getsockname()[1] - OpenOcd.TELNET_BASE_PORT
+
+        with socket.socket() as s:
+            try:
+                s.bind(('127.0.0.1', OpenOcd.TCL_BASE_PORT + offset))
+            except OSError:
+                continue
+
+        return offset
+
+
+def test_openocd_startup(tmp_path):
+    import sys
+    import time
+
+    from pytest_embedded.log import MessageQueue
+    from pytest_embedded_jtag import OpenOcd
+
+    fake_openocd = tmp_path / 'fake_openocd.py'
+    fake_openocd.write_text(_FAKE_OPENOCD)
+
+    start = time.monotonic()
+    openocd = OpenOcd(
+        msg_queue=MessageQueue(),
+        openocd_prog_path=sys.executable,
+        openocd_cli_args=str(fake_openocd),
+        port_offset=_free_port_offset(),
+    )
+    try:
+        # ready right after listening, instead of retrying every second
+        assert time.monotonic() - start < 1
+        assert 'echo: reset halt' in openocd.write('reset halt')
+    finally:
+        openocd.terminate()
+
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match='unable to open ftdi device'):
+        OpenOcd(
+            msg_queue=MessageQueue(),
+            openocd_prog_path=sys.executable,
+            openocd_cli_args=f'{fake_openocd} --exit',
+            port_offset=_free_port_offset(),
+        )
+    assert time.monotonic() - start < 1
+
+
+def test_openocd_keep_session(tmp_path):
+    import sys
+
+    from pytest_embedded.dut_factory import _close_or_terminate
+    from pytest_embedded.log import MessageQueue
+    from pytest_embedded_jtag import OpenOcd
+
+    fake_openocd = tmp_path / 'fake_openocd.py'
+    fake_openocd.write_text(_FAKE_OPENOCD)
+    kwargs = {
+        'openocd_prog_path': sys.executable,
+        'openocd_cli_args': str(fake_openocd),
+        'port_offset': _free_port_offset(),
+    }
+
+    first = OpenOcd.lease(msg_queue=MessageQueue(), **kwargs)
+    _close_or_terminate(first)
+    assert first.poll() is None
+
+    second = OpenOcd.lease(msg_queue=MessageQueue(), **kwargs)
+    assert second is first
+    assert 'echo: halt' in second.write('halt')
+    _close_or_terminate(second)
+
+    OpenOcd.shutdown()
+    assert first.wait(5) is not None
+
+
+def test_openocd_tcl(tmp_path):
+    import sys
+
+    from pytest_embedded.log import MessageQueue
+    from pytest_embedded_jtag import OpenOcd
+
+    fake_openocd = tmp_path / 'fake_openocd.py'
+    fake_openocd.write_text(_FAKE_OPENOCD)
+
+    openocd = OpenOcd(
+        msg_queue=MessageQueue(),
+        openocd_prog_path=sys.executable,
+        openocd_cli_args=str(fake_openocd),
+        port_offset=_free_port_offset(),
+    )
+    try:
+        commands = [f'mww {hex(0x3FC88000 + i * 4)} {i}' for i in range(200)]
+        results = openocd.tcl.execute_batch([*commands, 'fail_cmd'])
+        assert [r.command for r in results] == [*commands, 'fail_cmd']
+        assert all(r.ok and r.output == r.command for r in results[:-1])
+        assert not results[-1].ok
+        with pytest.raises(RuntimeError, match='invalid command name fail_cmd'):
+            results[-1].raise_for_error()
+
+        assert openocd.tcl.read_memory(0x3FC88000, 32, 4) == [0, 1, 2, 3]
+
+        with pytest.raises(TimeoutError, match='sleep 1'):
+            openocd.tcl.execute_batch(['halt', ('sleep 1', 0.2), 'resume'])
+        # reconnected
+        assert openocd.tcl.execute('resume').output == 'resume'
+    finally:
+        openocd.terminate()
+
+
+def test_gdb_mi_parse_record():
+    from pytest_embedded_jtag.mi import parse_record, parse_stream
+
+    record = parse_record(
+        '12^done,bkpt={number="1",type="breakpoint",addr="0x42000010",func="app_main",'
+        'thread-groups=["i1"],times="0"},list=[frame={level="0"},frame={level="1"}],empty={},none=[]'
+    )
+    assert record.is_result
+    assert record.token == 12
+    assert record.cls == 'done'
+    assert record.results == {
+        'bkpt': {
+            'number': '1',
+            'type': 'breakpoint',
+            'addr': '0x42000010',
+            'func': 'app_main',
+            'thread-groups': ['i1'],
+            'times': '0',
+        },
+        'list': [{'level': '0'}, {'level': '1'}],
+        'empty': {},
+        'none': [],
+    }
+
+    record = parse_record('*stopped,reason="signal-received",signal-name="SIGTRAP",frame={func="f",args=[]}')
+    assert (record.kind, record.cls, record.token) == ('*', 'stopped', None)
+    assert record.results['frame'] == {'func': 'f', 'args': []}
+
+    with pytest.raises(RuntimeError, match='Undefined command: "foo"'):
+        parse_record('3^error,msg="Undefined command: \\"foo\\"."').raise_for_error()
+
+    assert parse_stream('~"Breakpoint 1 at 0x42\\n\\303\\251"') == 'Breakpoint 1 at 0x42\n\xc3\xa9'
+    assert parse_record('Hello world!') is None
+    assert parse_record('(gdb) ') is None
+
+
+_FAKE_GDB_MI = """\
+import re
+import sys
+import time
+
+
+def out(*lines):
+    sys.stdout.write(''.join(line + '\\n' for line in lines))
+    sys.stdout.flush()
+
+
+assert '--interpreter=mi3' in sys.argv
+out('=thread-group-added,id="i1"', '(gdb)')
+for line in sys.stdin:
+    token, command = re.match(r'(\\d*)(.*)', line.strip()).groups()
+    if command == '-break-insert app_main':
+        out('~"Breakpoint 1 at 0x42000010\\\\n"', token + '^done,bkpt={number="1",func="app_main"}', '(gdb)')
+    elif command == '-exec-continue':
+        out(token + '^running', '*running,thread-id="all"', '(gdb)')
+        time.sleep(0.1)
+        out('Hello world!', '*stopped,reason="breakpoint-hit",bkptno="1",frame={func="app_main",args=[]}', '(gdb)')
+    elif command == 'hang':
+        pass
+    elif command.startswith('-'):
+        out(token + '^error,msg="Undefined MI command: ' + command[1:] + '"', '(gdb)')
+    else:
+        out('~"' + command + '\\\\n"', token + '^done', '(gdb)')
+"""
+
+
+def test_gdb_mi(tmp_path):
+    import sys
+
+    from pytest_embedded.log import MessageQueue
+    from pytest_embedded_jtag import Gdb
+
+    fake_gdb = tmp_path / 'fake_gdb.py'
+    fake_gdb.write_text(_FAKE_GDB_MI)
+
+    gdb = Gdb(msg_queue=MessageQueue(), gdb_prog_path=sys.executable, gdb_cli_args=str(fake_gdb), gdb_mi=True)
+    try:
+        assert gdb.write('mon reset halt') == 'mon reset halt\n'
+
+        bkpt, running = gdb.execute_batch(['-break-insert app_main', '-exec-continue'])
+        assert bkpt.results['bkpt'] == {'number': '1', 'func': 'app_main'}
+        assert bkpt.output == 'Breakpoint 1 at 0x42000010\n'
+        assert running.cls == 'running'
+
+        stopped = gdb.wait_stopped(timeout=5)
+        assert stopped.results['reason'] == 'breakpoint-hit'
+        assert stopped.results['frame']['func'] == 'app_main'
+
+        with pytest.raises(RuntimeError, match='Undefined MI command: foo'):
+            gdb.execute('-foo').raise_for_error()
+
+        with pytest.raises(TimeoutError):
+            gdb.execute('hang', timeout=0.2)
+        with pytest.raises(TimeoutError):
+            gdb.wait_stopped(timeout=0.2)
+
+        future = gdb.submit('info registers')
+        assert future.result(5).output == 'info registers\n'
+    finally:
+        gdb.terminate()
+
+    # the complete output is still in the log file
+    with open(gdb._logfile) as fr:
+        assert '*stopped,reason="breakpoint-hit"' in fr.read()
@@ -8,7 +8,10 @@ DEFAULT_IMAGE_FN = 'flash_image.bin'
 ENCRYPTED_IMAGE_FN = f'encrypted_{DEFAULT_IMAGE_FN}'
 
 from .dut import QemuDut  # noqa
+from .efuse import QemuEfuse  # noqa
+from .pool import QemuPool  # noqa
 from .qemu import Qemu  # noqa
+from .qmp import QmpClient  # noqa
 
 
 __getattr__ = lazy_load(
@@ -16,6 +19,9 @@ __getattr__ = lazy_load(
     {
         'Qemu': Qemu,
         'QemuDut': QemuDut,
+        'QemuEfuse': QemuEfuse,
+        'QemuPool': QemuPool,
+        'QmpClient': QmpClient,
     },
     {
         'QemuApp': '.app',  # requires idf
@@ -29,6 +35,9 @@ __all__ = [
     'Qemu',
     'QemuApp',
     'QemuDut',
+    'QemuEfuse',
+    'QemuPool',
+    'QmpClient',
 ]
 
 __version__ = '2.8.1'
@@ -1,5 +1,9 @@
+import time
+from collections.abc import Callable
+from re import Match
 from typing import AnyStr
 
+import pexpect
 from pytest_embedded.dut import Dut
 
 from .qemu import Qemu
@@ -10,6 +14,9 @@ class QemuDut(Dut):
     QEMU dut class
     """
 
+    # in "icount-fast" time mode, check the emulated time every this many seconds while waiting
+    VIRTUAL_TIME_POLL_INTERVAL = 0.2
+
     def __init__(
         self,
         qemu: Qemu,
@@ -26,3 +33,54 @@ class QemuDut(Dut):
 
     def hard_reset(self):
         self._hard_reset_func()
+
+    def _expect_in_virtual_time(self, func: Callable[..., int], pattern, **kwargs) -> int:
+        timeout = kwargs.pop('timeout', -1)
+        if timeout == -1:
+            timeout = self.pexpect_proc.timeout
+
+        if self.qemu.time_mode != 'icount-fast' or timeout is None:
+            return func(pattern, timeout=timeout, **kwargs)
+
+        # the emulated time counted from the instructions is a lower bound of the guest clock, since the idle time
+        # skipped over is not counted. The host time is still the upper bound, the same as the "realtime" mode
+        virtual_start = self.qemu.virtual_time()
+        host_deadline = time.monotonic() + timeout
+        while True:
+            host_remaining = max(host_deadline - time.monotonic(), 0)
+            try:
+                index = func(pattern, timeout=min(self.VIRTUAL_TIME_POLL_INTERVAL, host_remaining), **kwargs)
+            except pexpect.TIMEOUT:
+                index = None
+
+            if index is not None and self.pexpect_proc.match is not pexpect.TIMEOUT:
+                return index
+
+            if time.monotonic() >= host_deadline:
+                reason = f'{timeout} seconds'
+            elif self.qemu.virtual_time() - virtual_start >= timeout:
+                reason = f'{timeout} seconds in the emulated time'
+            elif self.qemu.poll() is not None:
+                reason = 'QEMU exited'
+            else:
+                continue
+
+            if index is None:
+                raise pexpect.TIMEOUT(f'Timeout exceeded, {reason}.')
+            return index
+
+    @Dut._pexpect_func
+    def expect(self, pattern, **kwargs) -> Match:
+        """
+        Same as `Dut.expect()`. In "icount-fast" time mode, the timeout may expire early, once the instructions
+        executed by the guest take longer than the timeout in the emulated time.
+        """
+        return self._expect_in_virtual_time(self.pexpect_proc.expect, pattern, **kwargs)
+
+    @Dut._pexpect_func
+    def expect_exact(self, pattern, **kwargs) -> Match:
+        """
+        Same as `Dut.expect_exact()`. In "icount-fast" time mode, the timeout may expire early, once the
+        instructions executed by the guest take longer than the timeout in the emulated time.
+        """
+        return self._expect_in_virtual_time(self.pexpect_proc.expect_exact, pattern, **kwargs)
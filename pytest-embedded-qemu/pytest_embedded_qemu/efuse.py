@@ -0,0 +1,201 @@
+import functools
+import importlib.util
+import os
+from dataclasses import dataclass
+
+from .qemu import QEMU_TARGETS
+
+EfuseValue = int | bool | bytes | str
+
+
+@dataclass
+class EfuseField:
+    name: str
+    block: int
+    start: int  # bit offset in the block
+    bit_len: int
+    type: str
+    write_disable_bit: int | None = None
+
+    @property
+    def is_bytes(self) -> bool:
+        return self.type.startswith('bytes')
+
+
+@functools.lru_cache
+def efuse_fields(target: str) -> dict[str, EfuseField]:
+    """
+    eFuse field definitions of the target, loaded from the espefuse package, keyed by names and alternative names.
+    """
+    import yaml
+
+    spec = importlib.util.find_spec('espefuse')
+    if spec is None or spec.origin is None:
+        raise ModuleNotFoundError('espefuse is required for the eFuse field definitions, please install esptool')
+
+    with open(os.path.join(os.path.dirname(spec.origin), 'efuse_defs', f'{target}.yaml')) as fr:
+        defs = yaml.safe_load(fr)['EFUSES']
+
+    res = {}
+    for name, d in defs.items():
+        wr_dis = d.get('wr_dis')
+        field = EfuseField(
+            name=name,
+            block=int(d['blk']),
+            start=int(d['start']),
+            bit_len=int(d['len']),
+            type=str(d['type']),
+            write_disable_bit=wr_dis if isinstance(wr_dis, int) else None,
+        )
+        res[name] = field
+        for alt in str(d.get('alt') or '').split():
+            res.setdefault(alt, field)
+
+    return res
+
+
+class QemuEfuse:
+    """
+    Offline editor of the QEMU eFuse file, without running espefuse over another QEMU instance.
+
+    The file has the same layout as `QEMU_TARGETS[target].default_efuse`: the eFuse blocks one after another, each
+    block as little-endian 32-bit words. Like the real eFuses, burning only changes bits from 0 to 1, and the fields
+    protected by ``WR_DIS`` could not be burned anymore.
+
+    Examples:
+        >>> efuse = QemuEfuse('/tmp/efuse.bin', 'esp32c3')
+        >>> efuse.burn({'CUSTOM_MAC': '00:11:22:33:44:55', 'DIS_PAD_JTAG': 1})
+        >>> efuse.read('DIS_PAD_JTAG')
+        1
+    """
+
+    def __init__(self, path: str, target: str) -> None:
+        """
+        Args:
+            path: eFuse file path
+            target: target chip
+        """
+        if target not in QEMU_TARGETS:
+            raise ValueError(f'Target {target} is not supported by QEMU, should be one of {list(QEMU_TARGETS)}')
+
+        self.path = path
+        self.target = target
+
+        self._block_offsets = [0]
+        for words in QEMU_TARGETS[target].efuse_block_words:
+            self._block_offsets.append(self._block_offsets[-1] + words * 4)
+
+    @classmethod
+    def create(cls, path: str, target: str, fields: dict[str, EfuseValue] | None = None) -> 'QemuEfuse':
+        """
+        Write the default eFuse file of the target, then burn the `fields`. Used before QEMU starts.
+        """
+        with open(path, 'wb') as fw:
+            fw.write(QEMU_TARGETS[target].default_efuse)
+
+        efuse = cls(path, target)
+        if fields:
+            efuse.burn(fields)
+
+        return efuse
+
+    def field(self, name: str) -> EfuseField:
+        fields = efuse_fields(self.target)
+        if name not in fields:
+            raise ValueError(f'Unknown eFuse field {name} of {self.target}')
+
+        return fields[name]
+
+    def _block_bits(self, data: bytes, block: int) -> int:
+        return int.from_bytes(data[self._block_offsets[block] : self._block_offsets[block + 1]], 'little')
+
+    def _get(self, data: bytes, field: EfuseField) -> int:
+        return (self._block_bits(data, field.block) >> field.start) & ((1 << field.bit_len) - 1)
+
+    def _to_bits(self, field: EfuseField, value: EfuseValue) -> int:
+        if field.is_bytes:
+            if isinstance(value, str):
+                value = bytes.fromhex(value.replace(':', ''))
+            if not isinstance(value, bytes) or len(value) * 8 != field.bit_len:
+                raise ValueError(f'eFuse field {field.name} requires {field.bit_len // 8} bytes, got {value!r}')
+            # the bytes are stored in the given order, the first byte at the lowest address
+            return int.from_bytes(value, 'little')
+
+        value = int(value, 0) if isinstance(value, str) else int(value)
+        if value < 0 or value >= 1 << field.bit_len:
+            raise ValueError(f'eFuse field {field.name} has {field.bit_len} bits, could not hold {value}')
+
+        return value
+
+    def read(self, name: str) -> int | bytes:
+        """
+        Read the value of one eFuse field, `bytes` for bytes fields, `int` for the others.
+        """
+        field = self.field(name)
+        with open(self.path, 'rb') as fr:
+            value = self._get(fr.read(), field)
+
+        if field.is_bytes:
+            return value.to_bytes(field.bit_len // 8, 'little')
+
+        return value
+
+    def burn(self, fields: dict[str, EfuseValue]) -> None:
+        """
+        Burn several eFuse fields at once. Nothing is written if any of them is invalid.
+
+        Args:
+            fields: field name to value. Bytes fields accept `bytes` or hex strings like "00:11:22:33:44:55",
+                the others accept `int`, `bool`, or strings like "0x1f".
+
+        Raises:
+            ValueError: unknown field, value out of range, write-protected field, or changing a bit from 1 to 0
+        """
+        with open(self.path, 'rb') as fr:
+            data = bytearray(fr.read())
+
+        wr_dis = self._get(data, self.field('WR_DIS'))
+        for name, value in fields.items():
+            field = self.field(name)
+            new = self._to_bits(field, value)
+            old = self._get(data, field)
+            if new == old:
+                continue
+
+            if field.write_disable_bit is not None and wr_dis >> field.write_disable_bit & 1:
+                raise ValueError(f'eFuse field {name} is write-protected')
+
+            if old & ~new:
+                raise ValueError(f'eFuse field {name} could not be changed from {old:#x} to {new:#x}, bits are set')
+
+            begin, end = self._block_offsets[field.block], self._block_offsets[field.block + 1]
+            block_bits = self._block_bits(data, field.block) | (new << field.start)
+            data[begin:end] = block_bits.to_bytes(end - begin, 'little')
+
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'wb') as fw:
+            fw.write(data)
+        os.replace(tmp_path, self.path)
+
+
+def parse_efuse_fields(s: str | dict[str, EfuseValue] | None) -> dict[str, EfuseValue]:
+    """
+    Parse ``NAME=VALUE`` pairs separated by commas, e.g. "CUSTOM_MAC=00:11:22:33:44:55,DIS_PAD_JTAG=1".
+    """
+    if not s:
+        return {}
+
+    if isinstance(s, dict):
+        return s
+
+    res: dict[str, EfuseValue] = {}
+    for pair in s.split(','):
+        if not pair.strip():
+            continue
+
+        name, sep, value = pair.partition('=')
+        if not sep:
+            raise ValueError(f'Invalid eFuse field "{pair}", should be NAME=VALUE')
+        res[name.strip()] = value.strip()
+
+    return res
@@ -0,0 +1,114 @@
+import collections
+import hashlib
+import logging
+import shlex
+import typing as t
+
+from .qemu import Qemu
+
+
+class QemuPool:
+    """
+    Session scoped pool of running QEMU instances.
+
+    Instances are keyed by the QEMU program, the target, the cli arguments and the SHA-256 of the flash image.
+    A leased instance is attached to the message queue of the current test and resumed. When the test tears it
+    down, the instance is paused and reset via QMP, and kept idle for the next test with the same key, unless
+    there are already `qemu_pool_size` idle instances of that key.
+    """
+
+    # idle instances of each key, the one released first is leased first
+    _idle: t.ClassVar[dict[tuple, collections.deque]] = collections.defaultdict(collections.deque)
+
+    @staticmethod
+    def _image_sha256(image_path: str) -> str:
+        sha256 = hashlib.sha256()
+        with open(image_path, 'rb') as fr:
+            for chunk in iter(lambda: fr.read(1024 * 1024), b''):
+                sha256.update(chunk)
+
+        return sha256.hexdigest()
+
+    @classmethod
+    def _key(cls, qemu_cls: type[Qemu], **kwargs) -> tuple:
+        app = kwargs.get('app')
+        return (
+            qemu_cls,
+            kwargs.get('qemu_prog_path') or getattr(app, 'qemu_prog_path', None),
+            getattr(app, 'target', None),
+            kwargs.get('qemu_cli_args'),
+            kwargs.get('qemu_extra_args'),
+            kwargs.get('qemu_serial_transport'),
+            kwargs.get('qemu_time_mode'),
+            cls._image_sha256(kwargs['qemu_image_path']),
+        )
+
+    @classmethod
+    def lease(cls, qemu_cls: type[Qemu], qemu_pool_size: int, **kwargs) -> Qemu:
+        """
+        Get an idle instance of the same configuration from the pool, or start a new one.
+
+        Args:
+            qemu_cls: `Qemu` class or its subclass
+            qemu_pool_size: max amount of idle instances kept for the same configuration
+            **kwargs: keyword arguments used for initializing `qemu_cls`
+
+        Returns:
+            `Qemu` instance, owned by the pool
+        """
+        if kwargs.get('qemu_efuse_path') or '-qmp' in shlex.split(kwargs.get('qemu_cli_args') or ''):
+            logging.warning('QEMU pool does not support eFuse files or fixed QMP ports. Starting a dedicated one')
+            return qemu_cls(**kwargs)
+
+        key = cls._key(qemu_cls, **kwargs)
+        idle = cls._idle[key]
+        while idle:
+            qemu = idle.popleft()
+            if qemu.poll() is not None:
+                logging.debug('Pooled QEMU instance %s exited with code %s, dropped', qemu.pid, qemu.returncode)
+                qemu._pool_key = None
+                qemu.terminate()
+                continue
+
+            logging.debug('Reuse pooled QEMU instance %s', qemu.pid)
+            qemu._attach(kwargs['msg_queue'], kwargs.get('app'))
+            qemu.qmp_execute_cmd('cont')
+            return qemu
+
+        qemu = qemu_cls(**kwargs)
+        qemu._pool_key = key
+        qemu._pool_size = qemu_pool_size
+        return qemu
+
+    @classmethod
+    def release(cls, qemu: Qemu) -> None:
+        """
+        Give the instance back to the pool, or terminate it if the pool of its configuration is full.
+        """
+        idle = cls._idle[qemu._pool_key]
+        if qemu.poll() is None and len(idle) < qemu._pool_size:
+            try:
+                qemu._detach()
+            except Exception as e:
+                logging.debug('Failed to reset QEMU instance %s for reuse: %s', qemu.pid, str(e))
+            else:
+                idle.append(qemu)
+                return
+
+        qemu._pool_key = None
+        qemu.terminate()
+        qemu.kill()
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """
+        Terminate all idle instances. Called at the end of the session.
+        """
+        for idle in cls._idle.values():
+            while idle:
+                qemu = idle.popleft()
+                qemu._pool_key = None
+                qemu.terminate()
+                qemu.kill()
+
+        cls._idle.clear()
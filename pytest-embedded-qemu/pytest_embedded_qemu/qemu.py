@@ -1,30 +1,39 @@
-import asyncio
 import binascii
 import logging
 import os
 import shlex
 import socket
+import tempfile
+import threading
+import time
 import typing as t
+import uuid
 from dataclasses import dataclass
+from typing import AnyStr
 
-from pytest_embedded.log import DuplicateStdoutPopen
-from qemu.qmp import QMPClient
+from pytest_embedded.log import DuplicateStdoutPopen, MessageQueue
+from pytest_embedded.utils import to_bytes, to_str
 
 from . import DEFAULT_IMAGE_FN
+from .qmp import QmpClient
 
 if t.TYPE_CHECKING:
     from .app import QemuApp
+    from .efuse import EfuseValue, QemuEfuse
 
 
 @dataclass
 class QemuTarget:
     strap_mode: str
     default_efuse: bytes
+    # amount of 32-bit words of each eFuse block, in the eFuse file
+    efuse_block_words: tuple[int, ...] = ()
 
 
 QEMU_TARGETS: dict[str, QemuTarget] = {
     'esp32': QemuTarget(
         strap_mode='0x0F',
+        efuse_block_words=(7, 8, 8, 8),
         default_efuse=binascii.unhexlify(
             '00000000000000000000000000800000000000000000100000000000000000000000000000000000'
             '00000000000000000000000000000000000000000000000000000000000000000000000000000000'
@@ -34,6 +43,7 @@ QEMU_TARGETS: dict[str, QemuTarget] = {
     ),
     'esp32c3': QemuTarget(
         strap_mode='0x02',
+        efuse_block_words=(6, 6, 8, 8, 8, 8, 8, 8, 8, 8, 8),
         default_efuse=binascii.unhexlify(
             '00000000000000000000000000000000000000000000000000000000000000000000000000000c00'
             '00000000000000000000000000000000000000000000000000000000000000000000000000000000'
@@ -65,6 +75,7 @@ QEMU_TARGETS: dict[str, QemuTarget] = {
     ),
     'esp32s3': QemuTarget(
         strap_mode='0x07',
+        efuse_block_words=(6, 6, 8, 8, 8, 8, 8, 8, 8, 8, 8),
         default_efuse=binascii.unhexlify(
             '00000000000000000000000000000000000000000000000000000000000000000000000000000c00'
             '00000000000000000000000000000000000000000000000000000000000000000000000000000000'
@@ -97,6 +108,32 @@ QEMU_TARGETS: dict[str, QemuTarget] = {
 }
 
 
+class _SocketRedirectThread(threading.Thread):
+    """
+    Forward the bytes received from the QEMU serial socket to the message queue as soon as they arrive.
+    """
+
+    RECV_SIZE = 65536
+
+    def __init__(self, sock: socket.socket, msg_queue: MessageQueue) -> None:
+        super().__init__(daemon=True)
+
+        self.sock = sock
+        self.msg_queue = msg_queue  # replaced by `Qemu._attach()`
+
+    def run(self) -> None:
+        while True:
+            try:
+                data = self.sock.recv(self.RECV_SIZE)
+            except OSError:  # closed
+                break
+
+            if not data:  # QEMU exited
+                break
+
+            self.msg_queue.put(data)
+
+
 class Qemu(DuplicateStdoutPopen):
     """
     QEMU class
@@ -112,6 +149,19 @@ class Qemu(DuplicateStdoutPopen):
     QEMU_STRAP_MODE_FMT = 'driver={}.gpio,property=strap_mode,value={}'
     QEMU_SERIAL_TCP_FMT = '-serial tcp::{},server,nowait'
     QEMU_DEFAULT_QMP_FMT = '-qmp tcp:127.0.0.1:{},server,wait=off'
+    # `wait=on` makes QEMU wait for our connection before running the guest, so no output is lost
+    QEMU_SERIAL_SOCKET_FMT: t.ClassVar[dict[str, str]] = {
+        'tcp': '-serial tcp:127.0.0.1:{},server=on,wait=on',
+        'unix': '-serial unix:{},server=on,wait=on',
+    }
+
+    SERIAL_TRANSPORTS = ('stdio', 'tcp', 'unix')
+    SERIAL_CONNECT_TIMEOUT = 10
+
+    TIME_MODES = ('realtime', 'icount-fast')
+    # each instruction takes 2^shift ns of the emulated time, `sleep=off` skips over the idle time of the guest
+    QEMU_ICOUNT_FMT = '-icount shift={},sleep=off'
+    QEMU_ICOUNT_SHIFT = 3
 
     def __init__(
         self,
@@ -120,6 +170,9 @@ class Qemu(DuplicateStdoutPopen):
         qemu_cli_args: str | None = None,
         qemu_extra_args: str | None = None,
         qemu_efuse_path: str | None = None,
+        qemu_efuse_fields: str | dict | None = None,
+        qemu_serial_transport: str | None = None,
+        qemu_time_mode: str | None = None,
         app: t.Optional['QemuApp'] = None,
         **kwargs,
     ):
@@ -129,6 +182,13 @@ class Qemu(DuplicateStdoutPopen):
             qemu_prog_path: QEMU program path
             qemu_cli_args: QEMU CLI arguments
             qemu_extra_args: QEMU CLI extra arguments, will be appended to `qemu_cli_args`
+            qemu_efuse_path: eFuse file path, will be created with the default eFuses of the target
+            qemu_efuse_fields: eFuse fields burned into the eFuse file before QEMU starts,
+                "NAME=VALUE" pairs separated by commas, or a dict. Requires `qemu_efuse_path`
+            qemu_serial_transport: "stdio" to read UART0 from the QEMU stdout, "tcp" or "unix" to expose UART0 as
+                a socket chardev, read from it and write to it directly. (Default: "stdio")
+            qemu_time_mode: "realtime" to run the emulated clock along with the host clock, "icount-fast" to run
+                as fast as the host CPU allows, with instruction counting. (Default: "realtime")
         """
         self.app = app
 
@@ -145,10 +205,15 @@ class Qemu(DuplicateStdoutPopen):
         qemu_cli_args = shlex.split(qemu_cli_args or self.qemu_default_args)
         qemu_extra_args = shlex.split(qemu_extra_args or '')
 
+        from .efuse import QemuEfuse, parse_efuse_fields
+
+        efuse_fields = parse_efuse_fields(qemu_efuse_fields)
+        if efuse_fields and not self.efuse_path:
+            raise ValueError('eFuse fields could only be burned together with an eFuse file path')
+
         if self.efuse_path:
             logging.debug('The eFuse file will be saved to: %s', self.efuse_path)
-            with open(self.efuse_path, 'wb') as f:
-                f.write(QEMU_TARGETS[self.app.target].default_efuse)
+            QemuEfuse.create(self.efuse_path, self.app.target, efuse_fields)
             qemu_extra_args += [
                 '-global',
                 self.QEMU_STRAP_MODE_FMT.format(self.app.target, QEMU_TARGETS[self.app.target].strap_mode),
@@ -161,6 +226,12 @@ class Qemu(DuplicateStdoutPopen):
         self.qmp_addr = None
         self.qmp_port = None
 
+        self._qmp: QmpClient | None = None
+
+        # set by `QemuPool` while this instance is owned by the pool
+        self._pool_key: tuple | None = None
+        self._pool_size = 0
+
         dut_index = int(kwargs.pop('dut_index', 0))
         for i, v in enumerate(qemu_cli_args):
             if v == '-qmp':
@@ -180,6 +251,44 @@ class Qemu(DuplicateStdoutPopen):
                 _, self.qmp_port = s.getsockname()
             qemu_cli_args += shlex.split(self.QEMU_DEFAULT_QMP_FMT.format(self.qmp_port))
 
+        self.serial_transport = qemu_serial_transport or 'stdio'
+        if self.serial_transport not in self.SERIAL_TRANSPORTS:
+            raise ValueError(
+                f'Invalid QEMU serial transport "{self.serial_transport}", should be one of {self.SERIAL_TRANSPORTS}'
+            )
+
+        self._serial_sock_addr: tuple[str, int] | str | None = None
+        self._serial_sock: socket.socket | None = None
+        self._serial_redirect: _SocketRedirectThread | None = None
+        if self.serial_transport != 'stdio':
+            if '-serial' in qemu_cli_args or '-serial' in qemu_extra_args:
+                raise ValueError(f'"-serial" could not be set while using the "{self.serial_transport}" transport')
+
+            if self.serial_transport == 'tcp':
+                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                    s.bind(('127.0.0.1', 0))
+                    self._serial_sock_addr = s.getsockname()
+                serial_arg = self._serial_sock_addr[1]
+            else:
+                # the path length of unix sockets is limited, logdir may be too long
+                self._serial_sock_addr = os.path.join(tempfile.gettempdir(), f'qemu-{uuid.uuid4().hex[:8]}.sock')
+                serial_arg = self._serial_sock_addr
+
+            qemu_extra_args += shlex.split(self.QEMU_SERIAL_SOCKET_FMT[self.serial_transport].format(serial_arg))
+            # with `-nographic`, the monitor takes the stdio once the serial port is moved away
+            if '-monitor' not in qemu_cli_args and '-monitor' not in qemu_extra_args:
+                qemu_extra_args += ['-monitor', 'none']
+
+        self.time_mode = qemu_time_mode or 'realtime'
+        if self.time_mode not in self.TIME_MODES:
+            raise ValueError(f'Invalid QEMU time mode "{self.time_mode}", should be one of {self.TIME_MODES}')
+
+        if self.time_mode == 'icount-fast':
+            if '-icount' in qemu_cli_args or '-icount' in qemu_extra_args:
+                raise ValueError('"-icount" could not be set while using the "icount-fast" time mode')
+
+            qemu_extra_args += shlex.split(self.QEMU_ICOUNT_FMT.format(self.QEMU_ICOUNT_SHIFT))
+
         super().__init__(
             cmd=[
                 self.qemu_prog_path,
@@ -191,6 +300,79 @@ class Qemu(DuplicateStdoutPopen):
             **kwargs,
         )
 
+        if self._serial_sock_addr:
+            self._connect_serial()
+
+    def _connect_serial(self) -> None:
+        family = socket.AF_UNIX if isinstance(self._serial_sock_addr, str) else socket.AF_INET
+        deadline = time.monotonic() + self.SERIAL_CONNECT_TIMEOUT
+        while True:
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            try:
+                sock.connect(self._serial_sock_addr)
+                break
+            except OSError:
+                sock.close()
+
+            if self.poll() is not None or time.monotonic() >= deadline:
+                self.terminate()
+                raise RuntimeError(
+                    f'Failed to connect to the QEMU serial socket {self._serial_sock_addr}, '
+                    f'check the QEMU output in {self._logfile}'
+                )
+
+            time.sleep(0.01)
+
+        if family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        self._serial_sock = sock
+        self._serial_redirect = _SocketRedirectThread(sock, self._q)
+        self._serial_redirect.start()
+        logging.debug('QEMU serial connected to %s', self._serial_sock_addr)
+
+    def _close_serial(self) -> None:
+        if self._serial_sock is not None:
+            try:
+                self._serial_sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._serial_sock.close()
+            self._serial_sock = None
+
+        if self._serial_redirect is not None:
+            self._serial_redirect.join(5)
+            self._serial_redirect = None
+
+        if isinstance(self._serial_sock_addr, str) and os.path.exists(self._serial_sock_addr):
+            os.remove(self._serial_sock_addr)
+
+    @property
+    def efuse(self) -> 'QemuEfuse':
+        """
+        Offline editor of the eFuse file of this instance.
+        """
+        if not self.efuse_path:
+            raise ValueError('eFuse file path is not set')
+
+        from .efuse import QemuEfuse
+
+        return QemuEfuse(self.efuse_path, self.app.target)
+
+    def burn_efuses(self, fields: dict[str, 'EfuseValue'], reset: bool = True) -> None:
+        """
+        Burn several eFuse fields at once by editing the eFuse file directly, then reset the emulator to reload it.
+
+        Much faster than `execute_efuse_command()`, which runs espefuse over another QEMU instance.
+
+        Args:
+            fields: field name to value, e.g. ``{'CUSTOM_MAC': '00:11:22:33:44:55', 'DIS_PAD_JTAG': 1}``
+            reset: reset the emulator after burning
+        """
+        self.efuse.burn(fields)
+        if reset:
+            self._hard_reset()
+
     def execute_efuse_command(self, command: str):
         import espefuse
         import pexpect
@@ -255,24 +437,90 @@ class Qemu(DuplicateStdoutPopen):
 
         return self.QEMU_DEFAULT_ARGS
 
+    @property
+    def qmp(self) -> QmpClient:
+        """
+        Persistent QMP client of this QEMU instance, connected on the first use.
+        """
+        if self._qmp is None:
+            self._qmp = QmpClient(self.qmp_addr, self.qmp_port)
+
+        return self._qmp
+
     def qmp_execute_cmd(self, execute, arguments=None):
-        response = None
+        return self.qmp.execute(execute, arguments=arguments)
 
-        async def h_r():
-            nonlocal response
+    def virtual_time(self) -> float:
+        """
+        Emulated time in seconds, counted from the instructions executed by the guest, queried via QMP.
 
-            qmp = QMPClient()
-            try:
-                await qmp.connect((str(self.qmp_addr), int(self.qmp_port)))
-                response = await qmp.execute(execute, arguments=arguments)
-            finally:
-                await qmp.disconnect()
+        Only available in the "icount-fast" time mode. The time skipped over while the guest is idle is not counted,
+        and QEMU doesn't expose it, so this is a lower bound of the guest clock, not the guest clock itself.
+        """
+        if self.time_mode != 'icount-fast':
+            raise ValueError('Emulated time is only available in the "icount-fast" time mode')
 
-        asyncio.run(h_r())
-        return response
+        icount = self.qmp.execute('query-replay')['icount']
+        return icount * (1 << self.QEMU_ICOUNT_SHIFT) / 1e9
 
     def _hard_reset(self):
         self.qmp_execute_cmd('system_reset')
 
+    def _attach(self, msg_queue: MessageQueue, app: t.Optional['QemuApp'] = None) -> None:
+        """
+        Redirect the output produced from now on to another message queue, used when leased from `QemuPool`.
+        """
+        self._q = msg_queue
+        if app is not None:
+            self.app = app
+
+        if self._serial_redirect is not None:
+            self._serial_redirect.msg_queue = msg_queue
+
+        self._p = self.REDIRECT_CLS(msg_queue, self._logfile, os.path.getsize(self._logfile))
+        self._p.start()
+
+    def _detach(self) -> None:
+        """
+        Pause and reset the emulator, then stop redirecting its output, used when released to `QemuPool`.
+        """
+        self.qmp.execute_batch([('stop', None), ('system_reset', None)])
+
+        if self._p:
+            self._p.terminate()
+            self._p = None
+
+    def write(self, s: AnyStr) -> None:
+        if self._serial_sock is None:
+            super().write(s)
+            return
+
+        logging.debug(f'{self.SOURCE} ->: {to_str(s)}')
+        self._serial_sock.sendall(to_bytes(s, '\n'))
+
+    def close(self):
+        if self._qmp is not None:
+            self._qmp.close()
+            self._qmp = None
+
+        self._close_serial()
+
+        super().close()
+
+    def terminate(self):
+        if self._pool_key is not None:
+            from .pool import QemuPool
+
+            QemuPool.release(self)
+            return
+
+        super().terminate()
+
+    def kill(self):
+        if self._pool_key is not None:  # kept alive by the pool
+            return
+
+        super().kill()
+
     def take_screenshot(self, image_path):
         self.qmp_execute_cmd('screendump', arguments={'filename': image_path})
@@ -0,0 +1,224 @@
+import asyncio
+import concurrent.futures
+import logging
+import threading
+import time
+import typing as t
+from collections import defaultdict
+
+from pytest_embedded.utils import to_list
+from qemu.qmp import QMPClient, Runstate
+
+
+class QmpClient:
+    """
+    Persistent QMP connection to one QEMU instance.
+
+    The connection is served by an event loop running in a daemon thread, and is reused by all the commands,
+    instead of connecting and negotiating for each of them. Connects lazily on the first use, and reconnects
+    if the connection was dropped.
+
+    Examples:
+        >>> qmp = QmpClient('127.0.0.1', 4488)
+        >>> qmp.execute('query-status')
+        >>> qmp.execute_batch([('stop', None), ('system_reset', None), ('cont', None)])
+        >>> qmp.subscribe('SHUTDOWN', lambda event: print(event['data']))
+        >>> qmp.wait_event('RESET', timeout=10, cmd='system_reset')
+        >>> qmp.close()
+    """
+
+    CONNECT_TIMEOUT = 10
+
+    def __init__(self, addr: str, port: int, connect_timeout: float | None = None) -> None:
+        """
+        Args:
+            addr: QMP server address
+            port: QMP server port
+            connect_timeout: keep retrying the connection within this time, since QEMU may not listen yet when
+                it was just started. (Default: 10 seconds)
+        """
+        self.addr = addr
+        self.port = int(port)
+        self.connect_timeout = self.CONNECT_TIMEOUT if connect_timeout is None else connect_timeout
+
+        self._qmp: QMPClient | None = None
+        self._dispatch_task: asyncio.Task | None = None
+        # QEMU serves only one QMP client, concurrent commands must not connect twice
+        self._connect_lock = asyncio.Lock()
+        self._callbacks: dict[str, list[t.Callable[[dict], None]]] = defaultdict(list)
+        self._callbacks_lock = threading.Lock()
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name=f'qmp-{addr}:{port}', daemon=True)
+        self._thread.start()
+
+    def _submit(self, coro: t.Coroutine) -> concurrent.futures.Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def _connected(self) -> QMPClient:
+        async with self._connect_lock:
+            return await self._connect()
+
+    async def _connect(self) -> QMPClient:
+        if self._qmp is not None and self._qmp.runstate == Runstate.RUNNING:
+            return self._qmp
+
+        # the dispatching of the dropped connection would never end otherwise
+        if self._dispatch_task is not None:
+            self._dispatch_task.cancel()
+            self._dispatch_task = None
+
+        if self._qmp is not None:
+            await self._qmp.disconnect()
+
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            qmp = QMPClient(f'{self.addr}:{self.port}')
+            try:
+                await qmp.connect((self.addr, self.port))
+                break
+            except Exception:
+                if time.monotonic() >= deadline:
+                    raise
+                await asyncio.sleep(0.05)
+
+        self._qmp = qmp
+        self._dispatch_task = asyncio.create_task(self._dispatch_events(qmp))
+        logging.debug('QMP connected to %s:%s', self.addr, self.port)
+        return qmp
+
+    async def _dispatch_events(self, qmp: QMPClient) -> None:
+        async for event in qmp.events:
+            with self._callbacks_lock:
+                callbacks = [*self._callbacks.get(event['event'], []), *self._callbacks.get('*', [])]
+
+            for callback in callbacks:
+                try:
+                    callback(dict(event))
+                except Exception as e:
+                    logging.debug('QMP event callback %s failed: %s', callback, str(e))
+
+    async def _execute(self, cmd: str, arguments: dict[str, t.Any] | None = None) -> t.Any:
+        qmp = await self._connected()
+        return await qmp.execute(cmd, arguments=arguments)
+
+    async def _execute_batch(self, commands: list[tuple[str, dict[str, t.Any] | None]]) -> list[t.Any]:
+        qmp = await self._connected()
+        # all the commands are sent before waiting for the first response
+        return await asyncio.gather(*[qmp.execute(cmd, arguments=arguments) for cmd, arguments in commands])
+
+    def execute(self, cmd: str, arguments: dict[str, t.Any] | None = None, timeout: float | None = None) -> t.Any:
+        """
+        Execute one QMP command and wait for its response.
+
+        Args:
+            cmd: QMP command name
+            arguments: QMP command arguments
+            timeout: seconds to wait for the response. (Default: wait forever)
+
+        Returns:
+            The ``return`` value of the response
+        """
+        return self._submit(self._execute(cmd, arguments)).result(timeout)
+
+    def execute_batch(
+        self, commands: list[tuple[str, dict[str, t.Any] | None]], timeout: float | None = None
+    ) -> list[t.Any]:
+        """
+        Send several QMP commands at once, then wait for all the responses.
+
+        Args:
+            commands: list of (command name, arguments)
+            timeout: seconds to wait for all the responses. (Default: wait forever)
+
+        Returns:
+            The ``return`` values, in the same order of the commands
+        """
+        return self._submit(self._execute_batch(commands)).result(timeout)
+
+    def execute_async(self, cmd: str, arguments: dict[str, t.Any] | None = None) -> asyncio.Future:
+        """
+        Awaitable version of `execute()`, could be used in any running event loop.
+        """
+        return asyncio.wrap_future(self._submit(self._execute(cmd, arguments)))
+
+    def subscribe(self, names: str | list[str], callback: t.Callable[[dict], None]) -> None:
+        """
+        Call ``callback(event)`` in the client thread for each received event named in `names`.
+
+        Args:
+            names: event name, or list of event names, e.g. ``RESET``, ``SHUTDOWN``. ``*`` for all events.
+            callback: callable that accepts the event dict
+        """
+        with self._callbacks_lock:
+            for name in to_list(names):
+                self._callbacks[name].append(callback)
+
+        # events are only received while connected
+        self._submit(self._connected()).result()
+
+    def unsubscribe(self, names: str | list[str], callback: t.Callable[[dict], None]) -> None:
+        with self._callbacks_lock:
+            for name in to_list(names):
+                if callback in self._callbacks.get(name, []):
+                    self._callbacks[name].remove(callback)
+
+    def wait_event(
+        self,
+        names: str | list[str],
+        timeout: float | None = None,
+        cmd: str | None = None,
+        arguments: dict[str, t.Any] | None = None,
+    ) -> dict:
+        """
+        Wait for the next event named in `names`.
+
+        Args:
+            names: event name, or list of event names
+            timeout: seconds to wait. (Default: wait forever)
+            cmd: QMP command executed after subscribing, to wait for the event it triggers without a race
+            arguments: QMP command arguments
+
+        Returns:
+            The event dict
+
+        Raises:
+            TimeoutError: if no such event received within `timeout`
+        """
+        received: concurrent.futures.Future = concurrent.futures.Future()
+
+        def _on_event(event: dict) -> None:
+            if not received.done():
+                received.set_result(event)
+
+        self.subscribe(names, _on_event)
+        try:
+            if cmd:
+                self.execute(cmd, arguments, timeout=timeout)
+            return received.result(timeout)
+        except concurrent.futures.TimeoutError:
+            raise TimeoutError(f'QMP event {names} not received in {timeout} seconds')
+        finally:
+            self.unsubscribe(names, _on_event)
+
+    def close(self) -> None:
+        """
+        Disconnect, and stop the client thread.
+        """
+        if not self._loop.is_running():
+            return
+
+        async def _disconnect():
+            if self._qmp is not None:
+                await self._qmp.disconnect()
+            if self._dispatch_task is not None:
+                self._dispatch_task.cancel()
+
+        try:
+            self._submit(_disconnect()).result(5)
+        except Exception as e:
+            logging.debug('QMP disconnect from %s:%s failed: %s', self.addr, self.port, str(e))
+
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+        self._loop.close()
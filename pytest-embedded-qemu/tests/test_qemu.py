@@ -1,5 +1,10 @@
+import asyncio
+import json
 import os
 import shutil
+import socket
+import threading
+import time
 import xml.etree.ElementTree as ET
 
 import pytest
@@ -10,6 +15,217 @@ qemu_bin_required = pytest.mark.skipif(
 )
 
 
+class _FakeQmpServer:
+    """Answer every QMP command with its own name, and emit a RESET event on `system_reset`."""
+
+    def __init__(self):
+        self.connections = 0
+        self.commands = []
+
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind(('127.0.0.1', 0))
+            _, self.port = s.getsockname()
+
+        self._loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+        self._started.wait(5)
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(asyncio.start_server(self._handle, '127.0.0.1', self.port))
+        self._started.set()
+        self._loop.run_forever()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        writer.write(json.dumps({'QMP': {'version': {}, 'capabilities': []}}).encode() + b'\n')
+        decoder = json.JSONDecoder()
+        buffer = ''
+        while data := await reader.read(4096):
+            buffer += data.decode()
+            while buffer.strip():  # commands are not newline-terminated
+                try:
+                    msg, end = decoder.raw_decode(buffer.lstrip())
+                except ValueError:
+                    break
+                buffer = buffer.lstrip()[end:]
+
+                self.commands.append(msg['execute'])
+                if 'id' in msg:
+                    reply = {'return': msg['execute'], 'id': msg['id']}
+                else:  # `qmp_capabilities` is sent without id
+                    reply = {'return': {}}
+                writer.write(json.dumps(reply).encode() + b'\n')
+                if msg['execute'] == 'system_reset':
+                    event = {'event': 'RESET', 'data': {'guest': False}, 'timestamp': {'seconds': 0, 'microseconds': 0}}
+                    writer.write(json.dumps(event).encode() + b'\n')
+                await writer.drain()
+
+
+def test_qmp_client_reuses_connection():
+    from pytest_embedded_qemu import QmpClient
+
+    server = _FakeQmpServer()
+    qmp = QmpClient('127.0.0.1', server.port)
+    try:
+        for _ in range(20):
+            assert qmp.execute('query-status', timeout=5) == 'query-status'
+        assert qmp.execute_batch([('stop', None), ('cont', None)]) == ['stop', 'cont']
+
+        async def _query_status():
+            return await qmp.execute_async('query-status')
+
+        assert asyncio.run(_query_status()) == 'query-status'
+
+        events = []
+        qmp.subscribe('RESET', events.append)
+        assert qmp.wait_event('RESET', timeout=5, cmd='system_reset')['data'] == {'guest': False}
+        assert events
+
+        assert server.connections == 1
+        assert server.commands.count('qmp_capabilities') == 1
+    finally:
+        qmp.close()
+
+
+def test_qmp_client_connects_once():
+    from pytest_embedded_qemu import QmpClient
+
+    server = _FakeQmpServer()
+    qmp = QmpClient('127.0.0.1', server.port)
+    try:
+
+        async def _query_status_concurrently():
+            return await asyncio.gather(*[qmp.execute_async('query-status') for _ in range(10)])
+
+        assert asyncio.run(_query_status_concurrently()) == ['query-status'] * 10
+        assert server.connections == 1
+
+        # reconnect after the connection is dropped, and stop dispatching the events of the dropped one
+        dispatch_task = qmp._dispatch_task
+        qmp._submit(qmp._qmp.disconnect()).result(5)
+        assert qmp.execute('query-status', timeout=5) == 'query-status'
+        assert server.connections == 2
+        qmp._submit(asyncio.sleep(0)).result(5)
+        assert dispatch_task.done()
+        assert qmp._dispatch_task is not dispatch_task
+    finally:
+        qmp.close()
+
+
+_FAKE_SERIAL_QEMU = """\
+import socket
+import sys
+
+args = sys.argv[1:]
+kind, addr = args[args.index('-serial') + 1].split(',')[0].split(':', 1)
+if kind == 'tcp':
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    host, port = addr.split(':')
+    server.bind((host, int(port)))
+else:
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(addr)
+server.listen(1)
+conn, _ = server.accept()
+conn.sendall(b'boot done\\n')
+while True:
+    data = conn.recv(1024)
+    if not data:
+        break
+    conn.sendall(b'echo: ' + data)
+"""
+
+
+@pytest.mark.parametrize('transport', ['tcp', 'unix'])
+def test_qemu_serial_socket_transport(tmp_path, transport):
+    import sys
+
+    from pytest_embedded.log import MessageQueue
+    from pytest_embedded_qemu import Qemu
+
+    fake_qemu = tmp_path / 'fake_qemu.py'
+    fake_qemu.write_text(_FAKE_SERIAL_QEMU)
+    image = tmp_path / 'flash_image.bin'
+    image.write_bytes(b'\xff' * 16)
+
+    msg_queue = MessageQueue()
+    qemu = Qemu(
+        qemu_image_path=str(image),
+        qemu_prog_path=sys.executable,
+        qemu_cli_args=str(fake_qemu),
+        qemu_serial_transport=transport,
+        msg_queue=msg_queue,
+    )
+    try:
+        assert '-monitor' in qemu.args
+        assert msg_queue.get(timeout=5) == b'boot done\n'
+
+        qemu.write('hello')
+        received = b''
+        while b'\n' not in received:
+            received += msg_queue.get(timeout=5)
+        assert received == b'echo: hello\n'
+    finally:
+        qemu.terminate()
+
+    if transport == 'unix':
+        assert not os.path.exists(qemu._serial_sock_addr)
+
+
+class _FakeClockQemu:
+    """Emulated clock counted from the instructions, running at `speed` times of the host clock."""
+
+    time_mode = 'icount-fast'
+
+    def __init__(self, speed):
+        self._speed = speed
+        self._start = time.monotonic()
+
+    def virtual_time(self):
+        return (time.monotonic() - self._start) * self._speed
+
+    def poll(self):
+        return None
+
+    def _hard_reset(self):
+        pass
+
+
+@pytest.mark.parametrize(
+    'speed, min_elapsed, max_elapsed',
+    [
+        (0, 1, 2),  # idle firmware, no instructions counted, times out in the host time
+        (0.25, 1, 2),  # slower than the host clock, still bounded by the host time
+        (10, 0, 0.5),  # instructions counted past the timeout, expires early
+    ],
+)
+def test_qemu_dut_expect_in_virtual_time(tmp_path, speed, min_elapsed, max_elapsed):
+    import pexpect
+    from pytest_embedded.log import PexpectProcess
+    from pytest_embedded_qemu import QemuDut
+
+    log = tmp_path / 'dut.log'
+    log.write_bytes(b'boot done\n')
+
+    with open(log, 'rb') as fr:
+        dut = QemuDut(
+            qemu=_FakeClockQemu(speed),
+            pexpect_proc=PexpectProcess(fr),
+            msg_queue=None,
+            app=None,
+            pexpect_logfile=str(log),
+            test_case_name='test_qemu_dut_expect_in_virtual_time',
+        )
+        dut.expect_exact('boot done', timeout=1)
+
+        start = time.monotonic()
+        with pytest.raises(pexpect.TIMEOUT):
+            dut.expect('not found', timeout=1)
+        assert min_elapsed <= time.monotonic() - start < max_elapsed
+
+
 @qemu_bin_required
 def test_pexpect_write_efuse(testdir):
     testdir.makepyfile("""
@@ -57,6 +273,37 @@ def test_pexpect_write_efuse(testdir):
     result.assert_outcomes(passed=1)
 
 
+def test_qemu_efuse_offline_burn(tmp_path):
+    from pytest_embedded_qemu import QemuEfuse
+
+    efuse_path = str(tmp_path / 'efuse.bin')
+    # the same result as `burn-custom-mac 00:11:22:33:44:55` by espefuse in `test_pexpect_write_efuse`
+    efuse = QemuEfuse.create(
+        efuse_path, 'esp32', {'CUSTOM_MAC_CRC': 0xB8, 'CUSTOM_MAC': '00:11:22:33:44:55', 'MAC_VERSION': 1}
+    )
+    with open(efuse_path, 'rb') as fr:
+        content = fr.read()
+    assert content[0x50:0x7C].hex() == (
+        '000000000000000000000000b800112233445500000000000000000000000000000000010000000000000000'
+    )
+    assert efuse.read('CUSTOM_MAC') == bytes.fromhex('001122334455')
+
+    efuse = QemuEfuse.create(efuse_path, 'esp32c3')
+    assert efuse.read('WAFER_VERSION_MINOR_LO') == 3  # from the default eFuses
+
+    efuse.burn({'DIS_PAD_JTAG': 1, 'SOFT_DIS_JTAG': '0x1'})
+    assert efuse.read('DIS_PAD_JTAG') == 1
+    assert efuse.read('SOFT_DIS_JTAG') == 1
+
+    with pytest.raises(ValueError, match='could not be changed'):
+        efuse.burn({'SOFT_DIS_JTAG': 2})
+
+    # nothing written when any of the fields is invalid
+    with pytest.raises(ValueError, match='Unknown eFuse field'):
+        efuse.burn({'USB_EXCHG_PINS': 1, 'NOT_EXIST': 1})
+    assert efuse.read('USB_EXCHG_PINS') == 0
+
+
 @qemu_bin_required
 def test_pexpect_by_qemu_xtensa(testdir):
     testdir.makepyfile("""
@@ -222,3 +469,102 @@ def test_qemu_use_idf_mixin_methods(testdir):
     assert junit_report.attrib['failures'] == '5'
     assert junit_report.attrib['skipped'] == '0'
     assert junit_report.attrib['tests'] == '3'
+
+
+@qemu_bin_required
+def test_qemu_pool(testdir):
+    testdir.makepyfile("""
+        _PIDS = []
+
+        def test_first(qemu, dut):
+            _PIDS.append(qemu.pid)
+            dut.expect('Hello world!')
+
+        def test_second(qemu, dut):
+            _PIDS.append(qemu.pid)
+            dut.expect('cpu_start')
+            dut.expect('Hello world!')
+            assert _PIDS[0] == _PIDS[1]
+    """)
+
+    result = testdir.runpytest(
+        '-s',
+        '--embedded-services',
+        'idf,qemu',
+        '--app-path',
+        os.path.join(testdir.tmpdir, 'hello_world_esp32'),
+        '--qemu-pool-size',
+        '1',
+    )
+
+    result.assert_outcomes(passed=2)
+
+
+@qemu_bin_required
+@pytest.mark.parametrize('transport', ['tcp', 'unix'])
+def test_pexpect_by_qemu_serial_socket(testdir, transport):
+    testdir.makepyfile("""
+        def test_pexpect_by_qemu(dut):
+            dut.expect('Hello world!')
+            dut.expect('Restarting')
+    """)
+
+    result = testdir.runpytest(
+        '-s',
+        '--embedded-services',
+        'idf,qemu',
+        '--app-path',
+        os.path.join(testdir.tmpdir, 'hello_world_esp32'),
+        '--qemu-serial-transport',
+        transport,
+    )
+
+    result.assert_outcomes(passed=1)
+
+
+@qemu_bin_required
+def test_pexpect_by_qemu_icount_fast(testdir):
+    testdir.makepyfile("""
+        def test_pexpect_by_qemu(dut):
+            dut.expect('Hello world!')
+            assert dut.qemu.virtual_time() > 0
+            dut.expect('Restarting')
+    """)
+
+    result = testdir.runpytest(
+        '-s',
+        '--embedded-services',
+        'idf,qemu',
+        '--app-path',
+        os.path.join(testdir.tmpdir, 'hello_world_esp32'),
+        '--qemu-time-mode',
+        'icount-fast',
+    )
+
+    result.assert_outcomes(passed=1)
+
+
+@qemu_bin_required
+def test_qemu_efuse_fields_before_start(testdir):
+    testdir.makepyfile("""
+        def test_efuse_fields(dut):
+            dut.expect('Hello world!')
+            assert dut.qemu.efuse.read('JTAG_DISABLE') == 1
+
+            dut.qemu.burn_efuses({'CUSTOM_MAC_CRC': 0xB8, 'CUSTOM_MAC': '00:11:22:33:44:55', 'MAC_VERSION': 1})
+            dut.expect('Hello world!')
+    """)
+
+    result = testdir.runpytest(
+        '-s',
+        '--embedded-services',
+        'idf,qemu',
+        '--app-path',
+        os.path.join(testdir.tmpdir, 'hello_world_esp32'),
+        '--qemu-efuse-path',
+        os.path.join(testdir.tmpdir, 'efuse.bin'),
+        '--qemu-efuse-fields',
+        'JTAG_DISABLE=1',
+    )
+
+    result.assert_outcomes(passed=1)
@@ -1,11 +1,13 @@
 """Make pytest-embedded plugin work with the Wokwi CLI."""
 
 from .dut import WokwiDut
+from .session import WokwiSession
 from .wokwi import Wokwi
 
 __all__ = [
     'Wokwi',
     'WokwiDut',
+    'WokwiSession',
 ]
 
 __version__ = '2.8.1'
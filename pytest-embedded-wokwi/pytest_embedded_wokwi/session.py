@@ -0,0 +1,249 @@
+import asyncio
+import collections
+import hashlib
+import logging
+import threading
+import typing as t
+from pathlib import Path
+
+from wokwi_client import WokwiClientSync
+from wokwi_client.file_ops import FlashSection
+from wokwi_client.idf import resolveIdfFirmware
+
+
+class WokwiSession:
+    """
+    One connection to the Wokwi simulator, which skips uploading the files the server already has.
+
+    Each uploaded file is recorded by its remote name and the SHA-256 of its content. Uploading the same content
+    under the same name again is a no-op. When the simulation is started with the same arguments and none of the
+    files changed since the last start, the running simulation is restarted instead.
+
+    With ``--wokwi-keep-session``, sessions are leased to the test cases and kept connected between them, keyed by
+    the token and the server URL. A released session pauses its simulation and stops forwarding the serial output,
+    until it's leased by the next test case.
+    """
+
+    # idle sessions of each token and server, the one released first is leased first
+    _idle: t.ClassVar[dict[tuple, collections.deque]] = collections.defaultdict(collections.deque)
+
+    def __init__(self, token: str, server: str | None = None) -> None:
+        """
+        Args:
+            token: Wokwi API token
+            server: Wokwi server URL. (Default: ``WOKWI_CLI_SERVER`` env var, or the public Wokwi server)
+        """
+        self.token = token
+        self.server = server
+
+        self.client = WokwiClientSync(token, server)
+        hello = self.client.connect()
+        # cleared when disconnected, or any request failed, for example, the connection was closed by the server
+        self._connected = True
+        self.version = hello.get('version', 'unknown')
+        logging.info('Connected to Wokwi Simulator, server version: %s', self.version)
+
+        # remote file name -> SHA-256 of the uploaded content
+        self._uploaded: dict[str, str] = {}
+        self._changed = True
+        self._started_args: tuple | None = None
+
+        self._serial_callback: t.Callable[[bytes], None] | None = None
+        self._serial_callback_lock = threading.Lock()
+        self._serial_monitoring = False
+        self._serial_pending = bytearray()
+        self._serial_flush_scheduled = False
+
+    @property
+    def closed(self) -> bool:
+        return not self._connected
+
+    def _request(self, fn: t.Callable[..., t.Any], *args, **kwargs) -> t.Any:
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            self._connected = False
+            raise
+
+    def _is_uploaded(self, name: str, digest: str) -> bool:
+        if self._uploaded.get(name) == digest:
+            logging.debug('Skip uploading %s to Wokwi, unchanged', name)
+            return True
+
+        return False
+
+    def _mark_uploaded(self, name: str, digest: str) -> None:
+        self._uploaded[name] = digest
+        self._changed = True
+
+    def upload(self, name: str, content: bytes) -> str:
+        """
+        Upload the binary `content` as `name`, unless the server already has the same content.
+
+        Returns:
+            The remote file name
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        if not self._is_uploaded(name, digest):
+            self._request(self.client.upload, name, content)
+            self._mark_uploaded(name, digest)
+
+        return name
+
+    def upload_text(self, name: str, text: str) -> str:
+        """
+        Upload the `text` as `name`, unless the server already has the same content.
+
+        The Wokwi server requires JSON files, like ``diagram.json`` and the custom chip definitions, to be uploaded
+        as text instead of base64-encoded binary.
+
+        Returns:
+            The remote file name
+        """
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        if not self._is_uploaded(name, digest):
+            self._request(self.client.upload_text, name, text)
+            self._mark_uploaded(name, digest)
+
+        return name
+
+    def upload_file(self, name: str, local_path: str | Path) -> str:
+        """
+        Upload a local file as `name`, ``.json`` files as text.
+
+        Returns:
+            The remote file name
+        """
+        path = Path(local_path)
+        if path.suffix == '.json':
+            return self.upload_text(name, path.read_text(encoding='utf-8-sig'))
+
+        return self.upload(name, path.read_bytes())
+
+    def upload_idf_firmware(self, flasher_args_path: str) -> tuple[list[FlashSection], int | None]:
+        """
+        Upload each flash section listed in ``flasher_args.json``. Unchanged sections, usually the bootloader and
+        the partition table, are skipped.
+
+        Returns:
+            (flash sections, flash size in MB), used for starting the simulation
+        """
+        result = resolveIdfFirmware(flasher_args_path)
+        sections = []
+        for part in result['parts']:
+            name = self.upload(f'flash-{part["offset"]:x}.bin', part['data'])
+            sections.append(FlashSection(offset=part['offset'], file=name))
+
+        return sections, result['flash_size']
+
+    def start(self, **kwargs) -> None:
+        """
+        Start the simulation, or restart the running one if neither the arguments nor the uploaded files changed.
+
+        Args:
+            **kwargs: keyword arguments of ``WokwiClientSync.start_simulation()``
+        """
+        args = tuple(
+            sorted(
+                (k, tuple((s.offset, s.file) for s in v) if k == 'firmware' and isinstance(v, list) else repr(v))
+                for k, v in kwargs.items()
+            )
+        )
+        if not self._changed and args == self._started_args:
+            logging.info('Wokwi firmware unchanged, restarting the simulation')
+            self._request(self.client.restart_simulation, pause=False)
+        else:
+            self._request(self.client.start_simulation, **kwargs)
+
+        self._started_args = args
+        self._changed = False
+
+    def _forward_serial(self, data: bytes) -> None:
+        # called in the event loop of the client, once for each serial event. The events received in a burst are
+        # joined, and forwarded at once after the loop handled all of them
+        self._serial_pending += data
+        if not self._serial_flush_scheduled:
+            self._serial_flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush_serial)
+
+    def _flush_serial(self) -> None:
+        data = bytes(self._serial_pending)
+        self._serial_pending.clear()
+        self._serial_flush_scheduled = False
+
+        with self._serial_callback_lock:
+            callback = self._serial_callback
+
+        if callback is not None:
+            try:
+                callback(data)
+            except Exception as e:
+                logging.debug('Error forwarding Wokwi serial output: %s', str(e))
+
+    def monitor(self, callback: t.Callable[[bytes], None] | None) -> None:
+        """
+        Forward the serial output to `callback` from now on, None to drop it. The output received in a burst is
+        joined into one `bytes` object before calling `callback`.
+
+        Only one serial monitor is started for each session, the callback is swapped when the session is leased.
+        """
+        with self._serial_callback_lock:
+            self._serial_callback = callback
+
+        if callback is not None and not self._serial_monitoring:
+            self.client.serial_monitor(self._forward_serial)
+            self._serial_monitoring = True
+
+    def disconnect(self) -> None:
+        self.monitor(None)
+        self._connected = False
+        try:
+            self.client.disconnect()
+        except Exception as e:
+            logging.debug('Error during Wokwi disconnect: %s', str(e))
+
+    @classmethod
+    def lease(cls, token: str, server: str | None = None) -> 'WokwiSession':
+        """
+        Get an idle session connected to the same server with the same token, or connect a new one.
+        """
+        idle = cls._idle[(token, server)]
+        while idle:
+            session = idle.popleft()
+            if session.closed:
+                logging.debug('Idle Wokwi session was disconnected, dropped')
+                session.disconnect()
+                continue
+
+            logging.debug('Reuse idle Wokwi session')
+            return session
+
+        return cls(token, server)
+
+    @classmethod
+    def release(cls, session: 'WokwiSession') -> None:
+        """
+        Pause the simulation and keep the session idle for the next test case, or disconnect it if it's broken.
+        """
+        session.monitor(None)
+        if not session.closed:
+            try:
+                session._request(session.client.pause_simulation)
+            except Exception as e:
+                logging.debug('Failed to pause Wokwi simulation for reuse: %s', str(e))
+            else:
+                cls._idle[(session.token, session.server)].append(session)
+                return
+
+        session.disconnect()
+
+    @classmethod
+    def shutdown(cls) -> None:
+        """
+        Disconnect all idle sessions. Called at the end of the session.
+        """
+        for idle in cls._idle.values():
+            while idle:
+                idle.popleft().disconnect()
+
+        cls._idle.clear()
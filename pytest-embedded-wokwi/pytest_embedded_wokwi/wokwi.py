@@ -13,9 +13,10 @@ else:
 
 from pytest_embedded.log import DuplicateStdoutPopen, MessageQueue
 from pytest_embedded.utils import Meta
-from wokwi_client import GET_TOKEN_URL, WokwiClientSync
+from wokwi_client import GET_TOKEN_URL
 
 from .idf import IDFFirmwareResolver
+from .session import WokwiSession
 
 if t.TYPE_CHECKING:  # pragma: no cover
     from pytest_embedded_idf.app import IdfApp
@@ -49,6 +50,7 @@ class Wokwi(DuplicateStdoutPopen):
         firmware_resolver: IDFFirmwareResolver,
         wokwi_diagram: str | None = None,
         wokwi_usb_serial_jtag: bool | None = None,
+        wokwi_keep_session: bool | None = None,
         app: t.Optional['IdfApp'] = None,
         meta: Meta | None = None,
         **kwargs,
@@ -64,8 +66,10 @@ class Wokwi(DuplicateStdoutPopen):
         if not token:
             raise SystemExit(f'Set WOKWI_CLI_TOKEN in your environment. You can get it from {GET_TOKEN_URL}.')
 
-        # Initialize synchronous Wokwi client
-        self.client = WokwiClientSync(token)
+        # Connect to Wokwi, or reuse an idle connection kept from the previous test case
+        self._keep_session = bool(wokwi_keep_session)
+        self._session: WokwiSession | None = WokwiSession.lease(token) if self._keep_session else WokwiSession(token)
+        self.client = self._session.client
 
         # Prepare diagram file if not supplied
         if wokwi_diagram is None:
@@ -83,34 +87,36 @@ class Wokwi(DuplicateStdoutPopen):
             self._setup_simulation(wokwi_diagram, firmware_path, elf_path)
             self._start_serial_monitoring()
         except Exception as e:
+            self._keep_session = False  # the session may be broken, don't reuse it
             self.close()
             raise e
 
     def _setup_simulation(self, diagram: str, firmware_path: str, elf_path: str):
-        """Set up the Wokwi simulation."""
-        hello = self.client.connect()
-        logging.info('Connected to Wokwi Simulator, server version: %s', hello.get('version', 'unknown'))
+        """Set up the Wokwi simulation.
 
+        Files that the session already uploaded with the same content are skipped, and the running simulation is
+        restarted instead of started again if nothing changed.
+        """
         # Upload custom chips before diagram so the server can resolve chip
         # references in the diagram at upload time.
         custom_chips = self._upload_custom_chips(Path(diagram).parent)
 
         # Upload diagram and ELF
-        self.client.upload_file('diagram.json', Path(diagram))
-        self.client.upload_file('pytest.elf', Path(elf_path))
+        self._session.upload_file('diagram.json', diagram)
+        self._session.upload_file('pytest.elf', elf_path)
 
         if firmware_path.endswith('flasher_args.json'):
-            firmware = self.client.upload_idf_firmware(firmware_path)
-            kwargs = {'firmware': firmware.firmware, 'elf': 'pytest.elf', 'flash_size': firmware.flash_size}
+            firmware, flash_size = self._session.upload_idf_firmware(firmware_path)
+            kwargs = {'firmware': firmware, 'elf': 'pytest.elf', 'flash_size': flash_size}
         else:
-            firmware = self.client.upload_file('pytest.bin', Path(firmware_path))
+            firmware = self._session.upload_file('pytest.bin', firmware_path)
             kwargs = {'firmware': firmware, 'elf': 'pytest.elf'}
 
         if custom_chips:
             kwargs['chips'] = custom_chips
 
         logging.info('Uploaded diagram and firmware to Wokwi. Starting simulation...')
-        self.client.start_simulation(**kwargs)
+        self._session.start(**kwargs)
 
     def _upload_custom_chips(self, diagram_dir: Path) -> list[str]:
         """Upload custom chip files and return chip names.
@@ -209,53 +215,35 @@ class Wokwi(DuplicateStdoutPopen):
         The Wokwi server requires chip JSON files to be uploaded via the
         ``text`` field of the ``file:upload`` command (not base64-encoded
         binary), matching the behaviour of the official ``wokwi-cli`` TypeScript
-        client.  The wokwi-python-client public API only supports binary
-        uploads, so we send the JSON via the transport's ``request`` method
-        directly.  The binary (``.chip.wasm``) is uploaded normally under its
+        client.  `WokwiSession.upload_text` sends the JSON via the transport's
+        ``request`` method directly.  The binary (``.chip.wasm``) is uploaded normally under its
         original filename.
         """
         chip_names = []
         for json_path, binary_path, chip_name in specs:
             # Send chip JSON as text (server rejects binary-encoded chip JSON).
-            self.client._call(
-                self.client._async_client._transport.request(
-                    'file:upload', {'name': json_path.name, 'text': json_path.read_text(encoding='utf-8')}
-                )
-            )
-            self.client.upload_file(binary_path.name, binary_path)
+            self._session.upload_text(json_path.name, json_path.read_text(encoding='utf-8'))
+            self._session.upload_file(binary_path.name, binary_path)
             chip_names.append(chip_name)
             logging.info('Uploaded custom chip: %s', chip_name)
         return chip_names
 
     def _start_serial_monitoring(self):
-        """Start monitoring serial output and forward to stdout and message queue."""
-
-        def serial_callback(data: bytes):
-            # Write to stdout for live monitoring
-            try:
-                decoded = data.decode('utf-8', errors='replace')
-                print(decoded, end='', flush=True)
-            except Exception as e:
-                logging.debug(f'Error writing to stdout: {e}')
-
-            # Write to log file if available
-            try:
-                if hasattr(self, '_fw') and self._fw and not self._fw.closed:
-                    decoded = data.decode('utf-8', errors='replace')
-                    self._fw.write(decoded)
-                    self._fw.flush()
-            except Exception as e:
-                logging.debug(f'Error writing to log file: {e}')
-
-            # Put in message queue for expect() functionality
-            try:
-                if hasattr(self, '_q') and self._q:
-                    self._q.put(data)
-            except Exception as e:
-                logging.debug(f'Error putting data in message queue: {e}')
-
-        # Start monitoring in background
-        self.client.serial_monitor(serial_callback)
+        """Start forwarding the serial output to the message queue.
+
+        Same as the other transports, the output is kept as bytes and only put into the message queue. The DUT
+        listener process is the single tee that writes it to the DUT log file, the pexpect buffer, and stdout.
+        """
+        self._session.monitor(self._on_serial)
+
+    def _on_serial(self, data: bytes) -> None:
+        self._q.put(data)
+
+        # raw copy in the wokwi log file, flushed by the buffered writer in batches and on close
+        try:
+            self._fw.buffer.write(data)
+        except ValueError:  # closed
+            pass
 
     def write(self, s: str | bytes) -> None:
         """Write data to the Wokwi serial interface."""
@@ -268,9 +256,14 @@ class Wokwi(DuplicateStdoutPopen):
 
     def close(self):
         """Clean up resources."""
+        session = getattr(self, '_session', None)
+        self._session = None
         try:
-            if hasattr(self, 'client') and self.client:
-                self.client.disconnect()
+            if session is not None:
+                if self._keep_session:
+                    WokwiSession.release(session)
+                else:
+                    session.disconnect()
         except Exception as e:
             logging.debug(f'Error during Wokwi cleanup: {e}')
         finally:
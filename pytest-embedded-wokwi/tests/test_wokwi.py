@@ -1,7 +1,10 @@
 import json
 import os
+import threading
+import time
 
 import pytest
+from pytest_embedded_wokwi.session import WokwiSession
 from pytest_embedded_wokwi.wokwi import Wokwi
 
 wokwi_token_required = pytest.mark.skipif(
@@ -168,3 +171,178 @@ class TestApplySerialInterfaceOverride:
             assert result['parts'][0]['attrs']['serialInterface'] == 'USB_SERIAL_JTAG'
         finally:
             os.unlink(result_path)
+
+
+@pytest.fixture
+def wokwi_stand_in_server(monkeypatch):
+    """
+    Local websocket server speaking the Wokwi protocol. Answers all commands, records them, and sends the serial
+    output shortly after each (re)start of the simulation, one serial event for each byte. Like the Wokwi server,
+    the output is held back until the client starts listening.
+    """
+    from websockets.sync.server import serve
+
+    commands = []
+    serial_output = [b'boot\n']
+
+    def _send_serial(ws):
+        for b in serial_output[0]:
+            ws.send(json.dumps({'type': 'event', 'event': 'serial-monitor:data', 'payload': {'bytes': [b]}}))
+
+    def _handler(ws):
+        listening = False
+        started = False
+        ws.send(json.dumps({'type': 'hello', 'protocolVersion': 1, 'appVersion': 'stand-in'}))
+        for message in ws:
+            msg = json.loads(message)
+            commands.append((msg['command'], msg['params']))
+            ws.send(json.dumps({'type': 'response', 'id': msg['id'], 'result': {}}))
+            if msg['command'] == 'serial-monitor:listen':
+                listening = True
+            elif msg['command'] in ['sim:start', 'sim:restart']:
+                started = True
+            else:
+                continue
+
+            if listening and started:
+                started = False
+                # the client subscribes to the serial events a bit after receiving the response
+                threading.Timer(0.1, _send_serial, args=(ws,)).start()
+
+    server = serve(_handler, '127.0.0.1', 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv('WOKWI_CLI_SERVER', f'ws://127.0.0.1:{server.socket.getsockname()[1]}')
+
+    yield commands, serial_output
+
+    WokwiSession.shutdown()
+    server.shutdown()
+    thread.join()
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError
+        time.sleep(0.01)
+
+
+def test_wokwi_session_skip_unchanged_uploads(wokwi_stand_in_server, tmp_path):
+    commands, _ = wokwi_stand_in_server
+    flasher_args = tmp_path / 'flasher_args.json'
+    flasher_args.write_text(
+        json.dumps(
+            {
+                'flash_files': {'0x0': 'bootloader.bin', '0x8000': 'partition-table.bin', '0x10000': 'app.bin'},
+                'flash_settings': {'flash_size': '4MB'},
+            }
+        )
+    )
+    for name in ['bootloader.bin', 'partition-table.bin', 'app.bin']:
+        (tmp_path / name).write_bytes(name.encode())
+
+    def _uploaded():
+        return [params['name'] for cmd, params in commands if cmd == 'file:upload']
+
+    session = WokwiSession('dummy-token')
+    try:
+        assert session.version == 'stand-in'
+
+        session.upload_text('diagram.json', '{}')
+        firmware, flash_size = session.upload_idf_firmware(str(flasher_args))
+        assert [(s.offset, s.file) for s in firmware] == [
+            (0x0, 'flash-0.bin'),
+            (0x8000, 'flash-8000.bin'),
+            (0x10000, 'flash-10000.bin'),
+        ]
+        assert flash_size == 4
+        session.start(firmware=firmware, elf='pytest.elf', flash_size=flash_size)
+        assert _uploaded() == ['diagram.json', 'flash-0.bin', 'flash-8000.bin', 'flash-10000.bin']
+
+        # nothing changed, restart the simulation without uploading again
+        session.upload_text('diagram.json', '{}')
+        firmware, flash_size = session.upload_idf_firmware(str(flasher_args))
+        session.start(firmware=firmware, elf='pytest.elf', flash_size=flash_size)
+        assert len(_uploaded()) == 4
+        assert [cmd for cmd, _ in commands if cmd.startswith('sim:')] == ['sim:start', 'sim:restart']
+
+        # only the changed app is uploaded, and the simulation is started again
+        (tmp_path / 'app.bin').write_bytes(b'new app')
+        firmware, flash_size = session.upload_idf_firmware(str(flasher_args))
+        session.start(firmware=firmware, elf='pytest.elf', flash_size=flash_size)
+        assert _uploaded()[4:] == ['flash-10000.bin']
+        assert [cmd for cmd, _ in commands if cmd.startswith('sim:')] == ['sim:start', 'sim:restart', 'sim:start']
+    finally:
+        session.disconnect()
+
+
+def test_wokwi_session_reuse(wokwi_stand_in_server):
+    commands, _ = wokwi_stand_in_server
+
+    first_output = []
+    session = WokwiSession.lease('dummy-token')
+    session.monitor(first_output.append)
+    session.upload('pytest.bin', b'firmware')
+    session.start(firmware='pytest.bin', elf='pytest.elf')
+    _wait_for(lambda: b''.join(first_output) == b'boot\n')
+    WokwiSession.release(session)
+
+    second_output = []
+    assert WokwiSession.lease('dummy-token') is session
+    session.monitor(second_output.append)
+    session.upload('pytest.bin', b'firmware')
+    session.start(firmware='pytest.bin', elf='pytest.elf')
+    _wait_for(lambda: b''.join(second_output) == b'boot\n')
+    WokwiSession.release(session)
+
+    assert b''.join(first_output) == b'boot\n'
+    # the serial monitor is started once, asynchronously
+    assert [cmd for cmd, _ in commands].count('serial-monitor:listen') == 1
+    assert [cmd for cmd, _ in commands if cmd != 'serial-monitor:listen'] == [
+        'file:upload',
+        'sim:start',
+        'sim:pause',
+        'sim:restart',
+        'sim:pause',
+    ]
+
+    WokwiSession.shutdown()
+    assert session.closed
+
+
+@pytest.mark.usefixtures('wokwi_stand_in_server')
+def test_wokwi_session_not_reused_after_failure(monkeypatch):
+    session = WokwiSession.lease('dummy-token')
+    assert not session.closed
+
+    def _closed_by_server(*args, **kwargs):  # noqa: ARG001
+        raise ConnectionError('closed by the server')
+
+    monkeypatch.setattr(session.client, 'pause_simulation', _closed_by_server)
+    WokwiSession.release(session)
+    assert session.closed
+
+    # the broken session is disconnected instead of being kept idle
+    new_session = WokwiSession.lease('dummy-token')
+    assert new_session is not session
+    new_session.disconnect()
+
+
+def test_wokwi_session_serial_output_joined(wokwi_stand_in_server):
+    _, serial_output = wokwi_stand_in_server
+    serial_output[0] = b''.join(f'line {i}\n'.encode() for i in range(200))
+
+    received = []
+    session = WokwiSession('dummy-token')
+    try:
+        session.monitor(received.append)
+        session.start(firmware='pytest.bin', elf='pytest.elf')
+        _wait_for(lambda: b''.join(received) == serial_output[0])
+    finally:
+        session.disconnect()
+
+    # the serial events received in a burst are forwarded at once, instead of one callback for each event
+    assert all(isinstance(data, bytes) for data in received)
+    assert len(received) < len(serial_output[0])
@@ -1,17 +1,18 @@
 import functools
 import logging
+import mmap
 import os.path
 import re
-from collections.abc import Callable
+from collections.abc import Callable, Iterator
 from re import Match
-from typing import AnyStr
+from typing import AnyStr, BinaryIO
 
 import pexpect
 
 from .app import App
 from .log import MessageQueue, PexpectProcess
-from .unity import UNITY_SUMMARY_LINE_REGEX, TestSuite
-from .utils import Meta, _InjectMixinCls, remove_asci_color_code, to_bytes, to_list
+from .unity import UNITY_SUMMARY_LINE_REGEX, TestSuite, UnityParser
+from .utils import Meta, _InjectMixinCls, to_bytes, to_list, to_str
 
 
 class Dut(_InjectMixinCls):
@@ -33,6 +34,7 @@ class Dut(_InjectMixinCls):
         pexpect_logfile: str,
         test_case_name: str,
         meta: Meta | None = None,
+        unity_stdout_max_size: int | None = None,
         **kwargs,
     ) -> None:
         self._q = msg_queue
@@ -47,7 +49,11 @@ class Dut(_InjectMixinCls):
             setattr(self, k, v)
 
         # junit related
-        self.testsuite = TestSuite(self.test_case_name)
+        self.testsuite = TestSuite(
+            self.test_case_name,
+            stdout_max_size=unity_stdout_max_size,
+            stdout_dir=os.path.dirname(self.logfile),
+        )
 
     @property
     def logdir(self):
@@ -59,6 +65,76 @@ class Dut(_InjectMixinCls):
             self.testsuite.dump(junit_report)
             logging.info(f'Created unity output junit report: {junit_report}')
 
+    def search_log(self, start_marker: AnyStr, end_marker: AnyStr) -> Iterator[bytes]:
+        """
+        Search the log file for the regions delimited by `start_marker` and `end_marker`, without reading the whole
+        file into memory.
+
+        The log file is memory-mapped, and the regions are yielded one by one, from the beginning of the line of the
+        start marker to the end of the line of the end marker. The start markers inside a region are ignored.
+
+        The offsets of the markers watched by `PexpectProcess.watch_markers()` are reused, only the part of the log
+        file not read by `pexpect_proc` yet is scanned for them.
+
+        Args:
+            start_marker: the marker where a region starts
+            end_marker: the marker where a region ends
+
+        Yields:
+            Bytes of each region
+        """
+        start_marker = to_bytes(start_marker)
+        end_marker = to_bytes(end_marker)
+
+        with open(self.logfile, 'rb') as fr:
+            if not os.fstat(fr.fileno()).st_size:
+                return
+
+            with mmap.mmap(fr.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                ends = self._find_in_log(fr, mm, end_marker)
+                end = -1
+                region_end = 0
+                for start in self._find_in_log(fr, mm, start_marker):
+                    if start < region_end:
+                        continue
+
+                    while end < start + len(start_marker):
+                        end = next(ends, None)
+                        if end is None:
+                            return
+
+                    region_start = mm.rfind(b'\n', 0, start) + 1
+                    region_end = mm.find(b'\n', end + len(end_marker))
+                    region_end = len(mm) if region_end == -1 else region_end + 1
+                    yield mm[region_start:region_end]
+
+    def _find_in_log(self, fr: BinaryIO, mm: mmap.mmap, marker: bytes) -> Iterator[int]:
+        def _scan(begin: int, end: int) -> Iterator[int]:
+            i = mm.find(marker, begin, end)
+            while i != -1:
+                yield i
+                i = mm.find(marker, i + len(marker), end)
+
+        recorded = None
+        try:
+            # only if `pexpect_proc` is reading this log file
+            if os.path.sameopenfile(self.pexpect_proc.child_fd, fr.fileno()):
+                recorded = self.pexpect_proc.marker_offsets(marker)
+        except (AttributeError, OSError, ValueError):  # closed
+            pass
+
+        if recorded is None:
+            yield from _scan(0, len(mm))
+            return
+
+        watched_from, offsets = recorded
+        read_offset = min(self.pexpect_proc.read_offset, len(mm))
+        offsets = [offset for offset in offsets if offset + len(marker) <= read_offset]
+
+        yield from _scan(0, min(watched_from + len(marker) - 1, len(mm)))
+        yield from offsets
+        yield from _scan(max(read_offset - len(marker) + 1, watched_from), len(mm))
+
     def write(self, s: AnyStr) -> None:
         """
         Write to the `MessageQueue` instance
@@ -180,6 +256,9 @@ class Dut(_InjectMixinCls):
 
         Would combine the junit report into the main one if you use ``pytest --junitxml`` feature.
 
+        The output is parsed while it's being received. Each test case is added to the junit report once its result
+        line is received, with its duration as the `time` attribute.
+
         Args:
             remove_asci_escape_code: remove asci escape code in the message field. (default: True)
             timeout: timeout. (default: 60 seconds)
@@ -192,25 +271,34 @@ class Dut(_InjectMixinCls):
                 if any unity test case execution took longer than timeout value
 
         Warning:
-            - All unity test cases record would be missed if the final report block is uncaught.
+            - If the final report block is uncaught, only the test cases finished before are recorded.
         """
-        self.expect(UNITY_SUMMARY_LINE_REGEX, timeout=timeout)
-
-        if extra_before:
-            log = to_bytes(extra_before) + self.pexpect_proc.before
-        else:
-            log = self.pexpect_proc.before
-
-        if remove_asci_escape_code:
-            log = remove_asci_color_code(log)
-
-        self.testsuite.add_unity_test_cases(
-            log,
+        parser = UnityParser(
             additional_attrs={
                 'app_path': self.app.app_path,
             },
+            remove_asci_escape_code=remove_asci_escape_code,
+            record_time=True,
+            stop_at_summary=True,
         )
 
+        def _feed(data: AnyStr) -> None:
+            for testcase in parser.feed(data):
+                self.testsuite.add_test_case(testcase)
+
+        if extra_before:
+            _feed(to_bytes(extra_before))
+        _feed(self.pexpect_proc.buffer)
+
+        with self.pexpect_proc.read_callback(_feed):
+            self.expect(UNITY_SUMMARY_LINE_REGEX, timeout=timeout)
+
+        for testcase in parser.flush():
+            self.testsuite.add_test_case(testcase)
+
+        if not self.testsuite.testcases:
+            raise ValueError(f'unity test case not found, buffer:\n{to_str(self.pexpect_proc.before)}')
+
     @_InjectMixinCls.require_services('idf')
     def run_all_single_board_cases(
         self,
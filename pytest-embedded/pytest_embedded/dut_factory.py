@@ -1,6 +1,5 @@
 import contextlib
 import datetime
-import gc
 import io
 import logging
 import multiprocessing
@@ -9,6 +8,7 @@ import subprocess
 import sys
 import time
 import typing as t
+import weakref
 from collections import defaultdict
 from pathlib import Path
 
@@ -148,25 +148,35 @@ def _fixture_classes_and_options_fn(
     erase_nvs,
     skip_check_coredump,
     skip_decode_panic,
+    async_decode,
     openocd_prog_path,
     openocd_cli_args,
+    openocd_keep_session,
     gdb_prog_path,
     gdb_cli_args,
+    gdb_mi,
     no_gdb,
     qemu_image_path,
     qemu_prog_path,
     qemu_cli_args,
     qemu_extra_args,
     qemu_efuse_path,
+    qemu_efuse_fields,
+    qemu_pool_size,
+    qemu_serial_transport,
+    qemu_time_mode,
     espemu_image_path,
     espemu_prog_path,
     espemu_cli_args,
     espemu_extra_args,
     wokwi_diagram,
     wokwi_usb_serial_jtag,
+    wokwi_keep_session,
     skip_regenerate_image,
     encrypt,
     keyfile,
+    unity_stdout_max_size,
+    adaptive_timeouts,
     # pre-initialized fixtures
     dut_index,
     _pexpect_logfile,
@@ -311,6 +321,7 @@ def _fixture_classes_and_options_fn(
                         'app': None,
                         'openocd_prog_path': openocd_prog_path,
                         'openocd_cli_args': openocd_cli_args,
+                        'openocd_keep_session': openocd_keep_session,
                         'port_offset': dut_index,
                         'meta': _meta,
                     }
@@ -322,6 +333,7 @@ def _fixture_classes_and_options_fn(
                         'msg_queue': msg_queue,
                         'gdb_prog_path': gdb_prog_path,
                         'gdb_cli_args': gdb_cli_args,
+                        'gdb_mi': gdb_mi,
                         'meta': _meta,
                     }
         elif fixture == 'qemu':
@@ -343,6 +355,10 @@ def _fixture_classes_and_options_fn(
                     'qemu_cli_args': qemu_cli_args,
                     'qemu_extra_args': qemu_extra_args,
                     'qemu_efuse_path': qemu_efuse_path,
+                    'qemu_efuse_fields': qemu_efuse_fields,
+                    'qemu_pool_size': int(qemu_pool_size or 0),
+                    'qemu_serial_transport': qemu_serial_transport,
+                    'qemu_time_mode': qemu_time_mode,
                     'app': None,
                     'meta': _meta,
                     'dut_index': dut_index,
@@ -374,6 +390,7 @@ def _fixture_classes_and_options_fn(
                     {
                         'wokwi_diagram': wokwi_diagram,
                         'wokwi_usb_serial_jtag': wokwi_usb_serial_jtag,
+                        'wokwi_keep_session': wokwi_keep_session,
                         'msg_queue': msg_queue,
                         'app': None,
                         'meta': _meta,
@@ -389,7 +406,11 @@ def _fixture_classes_and_options_fn(
                 'pexpect_logfile': _pexpect_logfile,
                 'test_case_name': test_case_name,
                 'meta': _meta,
+                'unity_stdout_max_size': int(unity_stdout_max_size or 0),
             }
+            if 'idf' in _services:
+                kwargs[fixture]['adaptive_timeouts'] = bool(adaptive_timeouts)
+
             if 'idf' in _services and 'esp' not in _services:
                 # esp,idf will use IdfDut, which based on IdfUnityDutMixin already
                 from pytest_embedded_idf.unity_tester import IdfUnityDutMixin
@@ -470,6 +491,7 @@ def _fixture_classes_and_options_fn(
                         {
                             'skip_check_coredump': skip_check_coredump,
                             'skip_decode_panic': skip_decode_panic,
+                            'async_decode': async_decode,
                         }
                     )
                 elif 'esp' in _services and 'nuttx' in _services:
@@ -552,8 +574,11 @@ def openocd_gn(_fixture_classes_and_options: ClassCliOptions) -> t.Optional['Ope
         return None
 
     cls = _fixture_classes_and_options.classes['openocd']
-    kwargs = _fixture_classes_and_options.kwargs['openocd']
-    return cls(**_drop_none_kwargs(kwargs))
+    kwargs = _drop_none_kwargs(_fixture_classes_and_options.kwargs['openocd'])
+    if kwargs.pop('openocd_keep_session', False):
+        return cls.lease(**kwargs)
+
+    return cls(**kwargs)
 
 
 def gdb_gn(_fixture_classes_and_options: ClassCliOptions) -> t.Optional['Gdb']:
@@ -575,7 +600,14 @@ def qemu_gn(_fixture_classes_and_options: ClassCliOptions, app) -> t.Optional['Q
     if 'app' in kwargs and kwargs['app'] is None:
         kwargs['app'] = app
 
-    return cls(**_drop_none_kwargs(kwargs))
+    kwargs = _drop_none_kwargs(kwargs)
+    qemu_pool_size = kwargs.pop('qemu_pool_size', 0)
+    if qemu_pool_size:
+        from pytest_embedded_qemu import QemuPool
+
+        return QemuPool.lease(cls, qemu_pool_size, **kwargs)
+
+    return cls(**kwargs)
 
 
 def espemu_gn(_fixture_classes_and_options: ClassCliOptions, app) -> t.Optional['EspEmu']:
@@ -654,6 +686,43 @@ def set_parametrized_fixtures_cache(values: dict):
     PARAMETRIZED_FIXTURES_CACHE = values.copy()
 
 
+# The objects created by the fixtures and `DutFactory` which are still alive, keyed by `id()`. When one of them is
+# closed, the references to it held by the others are dropped, so that it could be freed even if the others are
+# still referred somewhere.
+_RESOURCES: 'weakref.WeakValueDictionary[int, t.Any]' = weakref.WeakValueDictionary()
+
+
+def _register_resource(obj) -> None:
+    if obj is None:
+        return
+
+    try:
+        _RESOURCES[id(obj)] = obj
+    except TypeError:  # not weak referable
+        pass
+
+
+def _drop_references(obj) -> None:
+    _RESOURCES.pop(id(obj), None)
+
+    for owner in list(_RESOURCES.values()):
+        attrs = getattr(owner, '__dict__', None)
+        if not attrs:
+            continue
+
+        for key, value in attrs.items():
+            if value is obj:
+                attrs[key] = None
+            elif isinstance(value, list):
+                for _i, val in enumerate(value):
+                    if val is obj:
+                        value[_i] = None
+            elif isinstance(value, dict):
+                for _key, val in value.items():
+                    if val is obj:
+                        value[_key] = None
+
+
 def _close_or_terminate(obj):
     if obj is None:
         del obj
@@ -682,16 +751,7 @@ def _close_or_terminate(obj):
         logging.debug('%s: %s', obj, str(e))
         return  # swallow up all error
     finally:
-        referrers = gc.get_referrers(obj)
-        for _referrer in referrers:
-            if isinstance(_referrer, list):
-                for _i, val in enumerate(_referrer):
-                    if val is obj:
-                        _referrer[_i] = None
-            elif isinstance(_referrer, dict):
-                for key, value in _referrer.items():
-                    if value is obj:
-                        _referrer[key] = None
+        _drop_references(obj)
         del obj
 
 
@@ -750,25 +810,35 @@ class DutFactory:
         erase_nvs: bool | None = None,
         skip_check_coredump: bool | None = None,
         skip_decode_panic: bool | None = None,
+        async_decode: bool | None = None,
         openocd_prog_path: str | None = None,
         openocd_cli_args: str | None = None,
+        openocd_keep_session: bool | None = None,
         gdb_prog_path: str | None = None,
         gdb_cli_args: str | None = None,
+        gdb_mi: bool | None = None,
         no_gdb: bool | None = None,
         qemu_image_path: str | None = None,
         qemu_prog_path: str | None = None,
         qemu_cli_args: str | None = None,
         qemu_extra_args: str | None = None,
         qemu_efuse_path: str | None = None,
+        qemu_efuse_fields: str | None = None,
+        qemu_pool_size: int | None = None,
+        qemu_serial_transport: str | None = None,
+        qemu_time_mode: str | None = None,
         espemu_image_path: str | None = None,
         espemu_prog_path: str | None = None,
         espemu_cli_args: str | None = None,
         espemu_extra_args: str | None = None,
         wokwi_diagram: str | None = None,
         wokwi_usb_serial_jtag: bool | None = None,
+        wokwi_keep_session: bool | None = None,
         skip_regenerate_image: bool | None = None,
         encrypt: bool | None = None,
         keyfile: str | None = None,
+        unity_stdout_max_size: int | None = None,
+        adaptive_timeouts: bool | None = None,
     ):
         """
         Create a Device Under Test (DUT) object with customizable parameters.
@@ -802,25 +872,35 @@ class DutFactory:
             erase_nvs: Erase NVS flag.
             skip_check_coredump: Skip coredump check flag.
             skip_decode_panic: Skip panic decoding flag.
+            async_decode: Decode the panic output and the core dumps in a session-level process pool.
             openocd_prog_path: OpenOCD program path.
             openocd_cli_args: OpenOCD CLI arguments.
+            openocd_keep_session: Keep the OpenOCD instance running for the following DUTs.
             gdb_prog_path: GDB program path.
             gdb_cli_args: GDB CLI arguments.
+            gdb_mi: Run GDB with the GDB/MI interpreter.
             no_gdb: No GDB flag.
             qemu_image_path: QEMU image path.
             qemu_prog_path: QEMU program path.
             qemu_cli_args: QEMU CLI arguments.
             qemu_extra_args: Additional QEMU arguments.
             qemu_efuse_path: Efuse binary path.
+            qemu_efuse_fields: Efuse fields burned before QEMU starts, comma-separated NAME=VALUE pairs.
+            qemu_pool_size: Max amount of idle QEMU instances kept for reuse.
+            qemu_serial_transport: QEMU UART0 transport, 'stdio', 'tcp' or 'unix'.
+            qemu_time_mode: QEMU time mode, 'realtime' or 'icount-fast'.
             espemu_image_path: esp-emu image path.
             espemu_prog_path: esp-emu program path.
             espemu_cli_args: esp-emu CLI arguments.
             espemu_extra_args: Additional esp-emu arguments.
             wokwi_diagram: Wokwi diagram path.
             wokwi_usb_serial_jtag: Use USB Serial JTAG instead of UART for Wokwi serial communication.
+            wokwi_keep_session: Keep the Wokwi connection alive across DUTs, and skip uploading unchanged files.
             skip_regenerate_image: Skip image regeneration flag.
             encrypt: Encryption flag.
             keyfile: Keyfile for encryption.
+            unity_stdout_max_size: Max characters of the stdout kept in the junit report for each unity test case.
+            adaptive_timeouts: Shorten the timeout of each unity test case according to its durations observed.
 
         Returns:
             DUT object: The created Device Under Test object.
@@ -878,25 +958,35 @@ class DutFactory:
                 'erase_nvs': erase_nvs,
                 'skip_check_coredump': skip_check_coredump,
                 'skip_decode_panic': skip_decode_panic,
+                'async_decode': async_decode,
                 'openocd_prog_path': openocd_prog_path,
                 'openocd_cli_args': openocd_cli_args,
+                'openocd_keep_session': openocd_keep_session,
                 'gdb_prog_path': gdb_prog_path,
                 'gdb_cli_args': gdb_cli_args,
+                'gdb_mi': gdb_mi,
                 'no_gdb': no_gdb,
                 'qemu_image_path': qemu_image_path,
                 'qemu_prog_path': qemu_prog_path,
                 'qemu_cli_args': qemu_cli_args,
                 'qemu_extra_args': qemu_extra_args,
                 'qemu_efuse_path': qemu_efuse_path,
+                'qemu_efuse_fields': qemu_efuse_fields,
+                'qemu_pool_size': qemu_pool_size,
+                'qemu_serial_transport': qemu_serial_transport,
+                'qemu_time_mode': qemu_time_mode,
                 'espemu_image_path': espemu_image_path,
                 'espemu_prog_path': espemu_prog_path,
                 'espemu_cli_args': espemu_cli_args,
                 'espemu_extra_args': espemu_extra_args,
                 'wokwi_diagram': wokwi_diagram,
                 'wokwi_usb_serial_jtag': wokwi_usb_serial_jtag,
+                'wokwi_keep_session': wokwi_keep_session,
                 'skip_regenerate_image': skip_regenerate_image,
                 'encrypt': encrypt,
                 'keyfile': keyfile,
+                'unity_stdout_max_size': unity_stdout_max_size,
+                'adaptive_timeouts': adaptive_timeouts,
                 # common
                 'test_case_name': PARAMETRIZED_FIXTURES_CACHE['test_case_name'],
                 '_meta': PARAMETRIZED_FIXTURES_CACHE['_meta'],
@@ -931,6 +1021,8 @@ class DutFactory:
             dut = dut_gn(_fixture_classes_and_options, openocd, gdb, app, serial, qemu, wokwi, espemu)
             layout.append(dut)
 
+            for obj in layout:
+                _register_resource(obj)
             cls.obj_stack.append(layout)
             return dut
 
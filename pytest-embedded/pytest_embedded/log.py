@@ -1,3 +1,4 @@
+import contextlib
 import errno
 import logging
 import multiprocessing
@@ -6,6 +7,7 @@ import subprocess
 import tempfile
 import textwrap
 import uuid
+from collections.abc import Callable
 from multiprocessing import queues
 from multiprocessing.managers import BaseManager
 from typing import AnyStr
@@ -62,6 +64,67 @@ class PexpectProcess(pexpect.fdpexpect.fdspawn):
     Use a temp file to gather multiple inputs into one output, and do `pexpect.expect()` from one place.
     """
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._read_callbacks: list[Callable[[bytes], None]] = []
+
+        # bytes read from the stream so far
+        self.read_offset = 0
+        # marker -> (the offset it's watched from, offsets of the marker found after that)
+        self._markers: dict[bytes, tuple[int, list[int]]] = {}
+        # the end of the bytes read, for the markers split into two reads
+        self._markers_tail = b''
+
+    @contextlib.contextmanager
+    def read_callback(self, callback: Callable[[bytes], None]):
+        """
+        Call `callback` with each chunk read by `expect()`, as soon as it's read, until exiting the context.
+
+        The bytes already read into the `buffer` are not passed to `callback`.
+        """
+        self._read_callbacks.append(callback)
+        try:
+            yield
+        finally:
+            self._read_callbacks.remove(callback)
+
+    def watch_markers(self, *markers: bytes) -> None:
+        """
+        Record the offsets of `markers` in the stream while reading, so that the log could be searched without
+        scanning the part already read. See `marker_offsets()`.
+        """
+        for marker in markers:
+            if marker and marker not in self._markers:
+                self._markers[marker] = (self.read_offset, [])
+
+    def marker_offsets(self, marker: bytes) -> tuple[int, list[int]] | None:
+        """
+        Returns:
+            The offset the `marker` is watched from, and the offsets of the `marker` read after that. Markers not
+            read completely yet are not included. None if the `marker` is not watched
+        """
+        return self._markers.get(marker)
+
+    def _record_markers(self, s: bytes) -> None:
+        if not self._markers:
+            self.read_offset += len(s)
+            return
+
+        data = self._markers_tail + s
+        base = self.read_offset - len(self._markers_tail)
+        for marker, (watched_from, offsets) in self._markers.items():
+            i = data.find(marker)
+            while i != -1:
+                # the ones ending in the tail were recorded with the previous read
+                if i + len(marker) > len(self._markers_tail) and base + i >= watched_from:
+                    offsets.append(base + i)
+                i = data.find(marker, i + len(marker))
+
+        self.read_offset += len(s)
+        tail_size = max(len(m) for m in self._markers) - 1
+        self._markers_tail = data[max(len(data) - tail_size, 0) :] if tail_size else b''
+
     @property
     def buffer_debug_str(self):
         return textwrap.shorten(
@@ -98,6 +161,7 @@ class PexpectProcess(pexpect.fdpexpect.fdspawn):
                     raise TIMEOUT('Timeout exceeded.')
 
             s = os.read(self.child_fd, size)
+            self._record_markers(s)
         except OSError as err:
             if err.args[0] == errno.EIO:  # Linux-style EOF
                 pass
@@ -111,6 +175,8 @@ class PexpectProcess(pexpect.fdpexpect.fdspawn):
 
         s = self._decoder.decode(s, final=False)
         self._log(s, 'read')
+        for callback in self._read_callbacks:
+            callback(s)
         return s
 
     def terminate(self, force=False):  # noqa
@@ -149,11 +215,11 @@ def live_print_call(*args, msg_queue: MessageQueue | None = None, expect_returnc
 
 
 class _PopenRedirectProcess(_ctx.Process):
-    def __init__(self, msg_queue: MessageQueue, logfile: str):
-        super().__init__(target=self._forward_io, args=(msg_queue, logfile), daemon=True)
+    def __init__(self, msg_queue: MessageQueue, logfile: str, offset: int = 0):
+        super().__init__(target=self._forward_io, args=(msg_queue, logfile, offset), daemon=True)
 
     @staticmethod
-    def _forward_io(msg_queue, logfile) -> None:
+    def _forward_io(msg_queue, logfile, offset: int = 0) -> None:
         # Binary, because the file is still being written to: a text-mode read finalizes the
         # decoder at every temporary EOF, and a UTF-8 sequence straddling that boundary raises
         # UnicodeDecodeError. `except Exception` below would swallow it and this process would
@@ -161,6 +227,7 @@ class _PopenRedirectProcess(_ctx.Process):
         # needed either - `MessageQueue.put` re-encodes with `to_bytes`, the pexpect buffer is
         # bytes, and the serial transport already forwards `read_all()` undecoded.
         with open(logfile, 'rb') as fr:
+            fr.seek(offset)
             while True:
                 try:
                     msg_queue.put(fr.read())  # msg_queue may be closed
@@ -202,14 +269,14 @@ class DuplicateStdoutPopen(subprocess.Popen):
 
         # Only start subprocess if command is not empty
         if cmd and cmd != []:
-            kwargs.update(
-                {
-                    'bufsize': 0,
-                    'stdin': subprocess.PIPE,
-                    'stdout': self._fw,
-                    'stderr': self._fw,
-                }
-            )
+            # subclasses may read `stdout` from a pipe instead, e.g. `Gdb` in MI mode
+            kwargs = {
+                'stdout': self._fw,
+                **kwargs,
+                'bufsize': 0,
+                'stdin': subprocess.PIPE,
+                'stderr': self._fw,
+            }
 
             logging.info('Executing %s', ' '.join(cmd) if isinstance(cmd, list) else cmd)
             super().__init__(cmd, **kwargs)
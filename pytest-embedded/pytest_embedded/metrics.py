@@ -0,0 +1,312 @@
+import glob
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+import typing as t
+import warnings
+
+from .scheduler import current_worker
+
+METRIC_NAME_REGEX = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*$')
+LABEL_NAME_REGEX = re.compile(r'^[a-zA-Z_][a-zA-Z0-9_]*$')
+
+# the default buckets of the Prometheus client libraries
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_UNTYPED = 'untyped'
+_COUNTER = 'counter'
+_GAUGE = 'gauge'
+_HISTOGRAM = 'histogram'
+
+
+def escape_label_value(value: t.Any) -> str:
+    """
+    Escape the backslashes, the double quotes and the line feeds in a label value.
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: dict[str, t.Any], strict: bool = True) -> str:
+    """
+    Args:
+        labels: label names and values
+        strict: validate the label names and escape the label values. The untyped samples are written as is
+    """
+    if strict:
+        for name in labels:
+            if not LABEL_NAME_REGEX.match(name):
+                raise ValueError(f'Invalid label name: {name}')
+
+    if not labels:
+        return ''
+
+    if strict:
+        return '{' + ','.join(f'{k}="{escape_label_value(v)}"' for k, v in labels.items()) + '}'
+
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _process_name() -> str:
+    names = []
+    xdist_worker = os.getenv('PYTEST_XDIST_WORKER')
+    if xdist_worker:
+        names.append(xdist_worker)
+    worker = current_worker()
+    if worker:
+        names.append(f'worker-{worker[0]}')
+
+    return '-'.join(names) or 'main'
+
+
+def is_main_process() -> bool:
+    """
+    Returns:
+        False in the pytest-xdist workers and the ``--emulator-workers`` workers
+    """
+    return _process_name() == 'main'
+
+
+class MetricSink:
+    """
+    Buffer of the metrics logged in the current process, returned by the ``log_metric`` fixture.
+
+    Calling it logs an untyped sample, one line for each call, written as is. `counter()`, `gauge()` and
+    `histogram()` log typed samples, which are validated, aggregated in memory and written under a ``# TYPE`` header.
+
+    The metrics are flushed every `FLUSH_INTERVAL` seconds and at the end of the session, into a part file of the
+    current process next to the metric file. The main process merges the part files of all the processes, including
+    the pytest-xdist workers and the ``--emulator-workers`` workers, into the metric file at the end of the session.
+    """
+
+    FLUSH_INTERVAL = 10
+
+    def __init__(self, metric_path: str | None) -> None:
+        self.metric_path = metric_path
+
+        # metric name -> {'type': ..., 'buckets': ..., 'samples': ...}
+        # samples are a list of [labels, value] for the untyped metrics, otherwise keyed by the labels:
+        # the total for counters, [timestamp, value] for gauges, [bucket counts, sum, count] for histograms
+        self._families: dict[str, dict[str, t.Any]] = {}
+        self._lock = threading.Lock()
+        # always write the part file at the first flush, so that the metric file is rewritten even if nothing logged
+        self._dirty = bool(metric_path)
+        self._flushed_at = time.monotonic()
+
+    @staticmethod
+    def part_path(metric_path: str, process_name: str) -> str:
+        return f'{metric_path}.{process_name}.part'
+
+    def __call__(self, key: str, value: t.Any, **kwargs: t.Any) -> None:
+        """
+        Log an untyped sample.
+
+        Args:
+            key: metric name
+            value: sample value
+            **kwargs: labels
+        """
+        self._log(_UNTYPED, key, value, kwargs)
+
+    def counter(self, key: str, value: float = 1, **kwargs: t.Any) -> None:
+        """
+        Increase a counter. Written as ``<key>_total``.
+
+        Args:
+            key: metric name, without the ``_total`` suffix
+            value: the amount to increase, non-negative
+            **kwargs: labels
+        """
+        if value < 0:
+            raise ValueError(f'Counter {key} can only be increased, got {value}')
+
+        self._log(_COUNTER, key.removesuffix('_total'), value, kwargs)
+
+    def gauge(self, key: str, value: float, **kwargs: t.Any) -> None:
+        """
+        Set a gauge. Only the last value of the same labels is written.
+
+        Args:
+            key: metric name
+            value: the current value
+            **kwargs: labels
+        """
+        self._log(_GAUGE, key, value, kwargs)
+
+    def histogram(self, key: str, value: float, buckets: t.Sequence[float] | None = None, **kwargs: t.Any) -> None:
+        """
+        Observe a value of a histogram.
+
+        Args:
+            key: metric name
+            value: the observed value
+            buckets: upper bounds of the buckets, the same for all the observations of the metric.
+                (Default: `DEFAULT_BUCKETS`)
+            **kwargs: labels, except ``le``
+        """
+        if 'le' in kwargs:
+            raise ValueError('"le" is reserved for the buckets of histograms')
+
+        self._log(_HISTOGRAM, key, value, kwargs, sorted(buckets or DEFAULT_BUCKETS))
+
+    def _log(
+        self,
+        metric_type: str,
+        key: str,
+        value: t.Any,
+        labels: dict[str, t.Any],
+        buckets: list[float] | None = None,
+    ) -> None:
+        if not self.metric_path:
+            warnings.warn('`--metric-path` is not specified, `log_metric` does nothing.')
+            return
+
+        strict = metric_type != _UNTYPED
+        if strict and not METRIC_NAME_REGEX.match(key):
+            raise ValueError(f'Invalid metric name: {key}')
+        labels_str = _format_labels(labels, strict)
+
+        with self._lock:
+            family = self._families.setdefault(
+                key, {'type': metric_type, 'buckets': buckets, 'samples': [] if metric_type == _UNTYPED else {}}
+            )
+            if family['type'] != metric_type:
+                raise ValueError(f'Metric {key} is already logged as {family["type"]}, not {metric_type}')
+            if family['buckets'] != buckets:
+                raise ValueError(f'Histogram {key} is already logged with buckets {family["buckets"]}')
+
+            samples = family['samples']
+            if metric_type == _UNTYPED:
+                samples.append([labels_str, str(value)])
+            elif metric_type == _COUNTER:
+                samples[labels_str] = samples.get(labels_str, 0) + value
+            elif metric_type == _GAUGE:
+                samples[labels_str] = [time.time(), value]
+            else:
+                counts, total, count = samples.get(labels_str) or [[0] * len(buckets), 0, 0]
+                samples[labels_str] = [
+                    [n + 1 if value <= bound else n for n, bound in zip(counts, buckets)],
+                    total + value,
+                    count + 1,
+                ]
+
+            self._dirty = True
+
+        if time.monotonic() - self._flushed_at >= self.FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write the metrics logged in the current process to its part file.
+        """
+        with self._lock:
+            self._flushed_at = time.monotonic()
+            if not self.metric_path or not self._dirty:
+                return
+
+            path = self.part_path(self.metric_path, _process_name())
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + '.tmp', 'w') as fw:
+                json.dump(self._families, fw)
+            os.replace(path + '.tmp', path)
+            self._dirty = False
+
+    @classmethod
+    def clear(cls, metric_path: str) -> None:
+        """
+        Remove the part files left by the previous sessions. Called by the main process at the beginning of the
+        session. The metric file itself is only rewritten by `merge()`, if any process used the ``log_metric`` fixture.
+        """
+        for path in glob.glob(glob.escape(metric_path) + '.*.part'):
+            os.remove(path)
+
+    @classmethod
+    def merge(cls, metric_path: str) -> None:
+        """
+        Merge the part files of all the processes into the metric file, and remove them. Called by the main process at
+        the end of the session. Does nothing if no process used the ``log_metric`` fixture.
+        """
+        part_paths = sorted(glob.glob(glob.escape(metric_path) + '.*.part'))
+        main_part_path = cls.part_path(metric_path, 'main')
+        if main_part_path in part_paths:  # the samples of the main process go first
+            part_paths.remove(main_part_path)
+            part_paths.insert(0, main_part_path)
+
+        families: dict[str, dict[str, t.Any]] = {}
+        for path in part_paths:
+            with open(path) as fr:
+                part = json.load(fr)
+
+            for key, family in part.items():
+                merged = families.setdefault(key, {**family, 'samples': [] if family['type'] == _UNTYPED else {}})
+                if (merged['type'], merged['buckets']) != (family['type'], family['buckets']):
+                    logging.warning(f'Metric {key} in {path} is logged in a different type or buckets, ignored')
+                    continue
+
+                cls._merge_samples(merged['type'], merged['samples'], family['samples'])
+
+        if not part_paths:
+            return
+
+        if families:
+            with open(metric_path + '.tmp', 'w') as fw:
+                for key, family in families.items():
+                    fw.write(cls._render(key, family))
+            os.replace(metric_path + '.tmp', metric_path)
+        elif os.path.exists(metric_path):  # the fixture is used but nothing logged
+            os.remove(metric_path)
+
+        for path in part_paths:
+            os.remove(path)
+
+    @staticmethod
+    def _merge_samples(metric_type: str, samples, other) -> None:
+        if metric_type == _UNTYPED:
+            samples.extend(other)
+            return
+
+        for labels_str, state in other.items():
+            if labels_str not in samples:
+                samples[labels_str] = state
+            elif metric_type == _COUNTER:
+                samples[labels_str] += state
+            elif metric_type == _GAUGE:
+                samples[labels_str] = max(samples[labels_str], state)  # the latest one
+            else:
+                counts, total, count = samples[labels_str]
+                samples[labels_str] = [[a + b for a, b in zip(counts, state[0])], total + state[1], count + state[2]]
+
+    @staticmethod
+    def _render(key: str, family: dict[str, t.Any]) -> str:
+        metric_type = family['type']
+        if metric_type == _UNTYPED:
+            return ''.join(f'{key}{labels_str} {value}\n' for labels_str, value in family['samples'])
+
+        lines = [f'# TYPE {key} {metric_type}']
+        for labels_str, state in family['samples'].items():
+            if metric_type == _COUNTER:
+                lines.append(f'{key}_total{labels_str} {_format_value(state)}')
+            elif metric_type == _GAUGE:
+                lines.append(f'{key}{labels_str} {_format_value(state[1])}')
+            else:
+                counts, total, count = state
+                # the "le" label goes after the others
+                prefix = labels_str[:-1] + ',' if labels_str else '{'
+                for bound, n in zip([*family['buckets'], math.inf], [*counts, count]):
+                    lines.append(f'{key}_bucket{prefix}le="{_format_value(bound)}"}} {n}')
+                lines.append(f'{key}_sum{labels_str} {_format_value(total)}')
+                lines.append(f'{key}_count{labels_str} {count}')
+
+        return '\n'.join(lines) + '\n'
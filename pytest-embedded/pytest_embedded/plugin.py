@@ -2,18 +2,15 @@ import argparse
 import contextlib
 import dbm
 import functools
-import gc
 import importlib
-import io
 import logging
 import multiprocessing
 import os
 import shelve
-import subprocess
+import sys
 import tempfile
 import typing as t
 import warnings
-import xml.dom.minidom
 from collections import Counter
 from operator import itemgetter
 
@@ -30,10 +27,12 @@ from .app import App
 from .dut import Dut
 from .dut_factory import (
     DutFactory,
+    _close_or_terminate,
     _ctx,
     _fixture_classes_and_options_fn,
     _listener_gn,
     _pexpect_fr_gn,
+    _register_resource,
     app_fn,
     dut_gn,
     espemu_gn,
@@ -47,7 +46,9 @@ from .dut_factory import (
     wokwi_gn,
 )
 from .log import MessageQueue, MessageQueueManager, PexpectProcess
-from .unity import JunitMerger, UnityTestReportMode, escape_illegal_xml_chars
+from .metrics import MetricSink, is_main_process
+from .scheduler import WorkerScheduler, current_worker, is_hardware_free, pin_current_worker
+from .unity import JunitMerger, UnityTestReportMode, sanitize_junit_report
 from .utils import (
     SERVICE_LIB_NAMES,
     ClassCliOptions,
@@ -107,6 +108,12 @@ def pytest_addoption(parser: pytest.Parser):
         type=_gte_one_int,
         help='Index (1-based) of the job, out of the number specified by --parallel-count. (Default: 1)',
     )
+    base_group.addoption(
+        '--emulator-workers',
+        help='Run the test cases in this amount of worker processes, each pinned to its own CPU cores, '
+        'when none of the DUTs needs a real board, e.g. with services qemu, espemu, or idf with target linux. '
+        '"auto" to decide from the available CPU cores and memory. (Default: 1)',
+    )
     base_group.addoption(
         '--check-duplicates',
         help='y/yes/true for True and n/no/false for False. '
@@ -126,6 +133,12 @@ def pytest_addoption(parser: pytest.Parser):
             "'replace' substitutes the parent Python test case with Unity test cases (default)."
         ),
     )
+    parser.addoption(
+        '--unity-stdout-max-size',
+        help='Max characters of the stdout kept in the junit report for each unity test case. '
+        'The complete stdout of a longer test case is saved into a file next to the DUT log, '
+        'and the file is referred to in the junit report. (Default: no limit)',
+    )
 
     # supports parametrization
     base_group.addoption('--root-logdir', help='set session-based root log dir. (Default: system temp folder)')
@@ -254,6 +267,22 @@ def pytest_addoption(parser: pytest.Parser):
         'and panic handler support while teardown the failing test case. '
         'Requires valid partition tool, project_description.json under the build dir. (Default: False)',
     )
+    idf_group.addoption(
+        '--adaptive-timeouts',
+        help='y/yes/true for True and n/no/false for False. '
+        'Set to True to shorten the timeout of each unity test case according to its durations observed '
+        'in the previous runs, which are recorded in the cache dir. '
+        'The timeout given, or the "timeout" attribute of the case, is never exceeded. (Default: False)',
+    )
+    idf_group.addoption(
+        '--async-decode',
+        help='y/yes/true for True and n/no/false for False. '
+        'Set to True to capture the panic output and the core dumps while teardown, and decode them in a '
+        'session-level process pool, instead of before the next test case starts. '
+        'The decoded outputs are written at the end of the session, and attached to the system-out of the test case '
+        'in the junit report, decoding errors to the system-err. The test case outcome is not changed. '
+        '(Default: False)',
+    )
 
     jtag_group = parser.getgroup('embedded-jtag')
     jtag_group.addoption('--gdb-prog-path', help='GDB program path. (Default: "xtensa-esp32-elf-gdb")')
@@ -266,11 +295,24 @@ def pytest_addoption(parser: pytest.Parser):
         help='y/yes/true for True and n/no/false for False. '
         'Set to True to skip create gdb instance automatically. (Default: False)',
     )
+    jtag_group.addoption(
+        '--gdb-mi',
+        help='y/yes/true for True and n/no/false for False. '
+        'Run GDB with the GDB/MI interpreter, and parse its output in a reader thread instead of tailing the log '
+        'file. Enables `gdb.submit()`, `gdb.execute_batch()` and `gdb.wait_stopped()`. (Default: False)',
+    )
     jtag_group.addoption('--openocd-prog-path', help='openocd program path. (Default: "openocd")')
     jtag_group.addoption(
         '--openocd-cli-args',
         help='openocd cli arguments. (Default: "-f board/esp32-wrover-kit-3.3v.cfg")',
     )
+    jtag_group.addoption(
+        '--openocd-keep-session',
+        help='y/yes/true for True and n/no/false for False. '
+        'Keep one OpenOCD instance running for each (cli args, port offset) for the whole session, '
+        'instead of starting a new one for each test case. The target is not reset between test cases. '
+        '(Default: False)',
+    )
 
     qemu_group = parser.getgroup('embedded-qemu')
     qemu_group.addoption(
@@ -293,6 +335,30 @@ def pytest_addoption(parser: pytest.Parser):
         '--qemu-efuse-path',
         help='This option makes it possible to use efuse in QEMU when it is set up.',
     )
+    qemu_group.addoption(
+        '--qemu-efuse-fields',
+        help='eFuse fields burned into the file of --qemu-efuse-path before QEMU starts, '
+        'comma-separated NAME=VALUE pairs. e.g. "CUSTOM_MAC=00:11:22:33:44:55,DIS_PAD_JTAG=1"',
+    )
+    qemu_group.addoption(
+        '--qemu-pool-size',
+        help='Keep at most this amount of idle QEMU instances for each (target, image, cli args) combination, '
+        'and lease them to the following test cases instead of starting new ones. '
+        'Leased instances are reset when returned. 0 to disable. (Default: 0)',
+    )
+    qemu_group.addoption(
+        '--qemu-serial-transport',
+        help='How the UART0 output of QEMU is read. "stdio" to read it from the QEMU stdout, '
+        '"tcp" or "unix" to expose UART0 as a socket chardev, and read from / write to the socket directly. '
+        '(Default: "stdio")',
+    )
+    qemu_group.addoption(
+        '--qemu-time-mode',
+        help='"realtime" to run the emulated clock along with the host clock. '
+        '"icount-fast" to enable instruction counting without sleeping, so the emulated time skips over the idle '
+        'time of the firmware. The expect timeouts are still measured in the host time, but may expire early once '
+        'the instructions executed take longer than the timeout in the emulated time. (Default: "realtime")',
+    )
     qemu_group.addoption(
         '--skip-regenerate-image',
         help='y/yes/true for True and n/no/false for False. '
@@ -337,6 +403,13 @@ def pytest_addoption(parser: pytest.Parser):
         'When enabled, the diagram will use the USB_SERIAL_JTAG interface and remove $serialMonitor connections. '
         '(Default: False)',
     )
+    wokwi_group.addoption(
+        '--wokwi-keep-session',
+        help='y/yes/true for True and n/no/false for False. '
+        'Keep the Wokwi connection alive across test cases, only upload the changed files, '
+        'and restart the simulation instead of starting a new one if the firmware is unchanged. '
+        '(Default: False)',
+    )
 
 
 ###########
@@ -370,13 +443,6 @@ def _str_bool(v: str) -> bool | str | None:
         return v
 
 
-def _prettify_xml(file_path: str):
-    dom = xml.dom.minidom.parse(file_path)
-    pretty_xml_as_string = dom.toprettyxml()
-    with open(file_path, 'w') as f:
-        f.write(pretty_xml_as_string)
-
-
 @pytest.fixture(autouse=True)
 def count(request):
     """
@@ -495,50 +561,11 @@ def multi_dut_generator_fixture(
 
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        def _close_or_terminate(obj):
-            if obj is None:
-                del obj
-                return
-
-            try:
-                if isinstance(obj, subprocess.Popen | multiprocessing.process.BaseProcess):
-                    obj.terminate()
-                    obj.kill()
-                elif isinstance(obj, io.IOBase):
-                    try:
-                        obj.close()
-                    except Exception as e:
-                        logging.debug('file %s closed failed with error: %s', obj, str(e))
-                else:
-                    try:
-                        obj.close()
-                    except AttributeError:
-                        try:
-                            obj.terminate()
-                        except AttributeError:
-                            pass
-                    except Exception as e:
-                        logging.debug('Not properly caught object %s: %s', obj, str(e))
-            except Exception as e:
-                logging.debug('%s: %s', obj, str(e))
-                return  # swallow up all error
-            finally:
-                referrers = gc.get_referrers(obj)
-                for _referrer in referrers:
-                    if isinstance(_referrer, list):
-                        for _i, val in enumerate(_referrer):
-                            if val is obj:
-                                _referrer[_i] = None
-                    elif isinstance(_referrer, dict):
-                        for key, value in _referrer.items():
-                            if value is obj:
-                                _referrer[key] = None
-                del obj
-
         if _COUNT == 1:
             res = None
             try:
                 res = func(*args, **kwargs)
+                _register_resource(res)
                 yield res
             finally:
                 if res:
@@ -556,6 +583,7 @@ def multi_dut_generator_fixture(
 
                 try:
                     i_res = func(*args, **current_kwargs)
+                    _register_resource(i_res)
                     res.append(i_res)
                 except Exception:
                     for item in res:  # close the earlier succeeded set up items
@@ -686,41 +714,20 @@ def metric_path(request: FixtureRequest) -> str | None:
 
 
 @pytest.fixture(scope='session')
-def log_metric(metric_path: str | None) -> t.Callable[..., None]:
+def log_metric(metric_path: str | None) -> t.Generator[MetricSink, None, None]:
     """
     Provides a function to log metrics in OpenMetrics format.
 
-    The file is cleared at the beginning of the test session.
+    Metrics are buffered in memory, and flushed periodically and at the end of the session. If the fixture is used, the
+    file is rewritten at the end of the test session with the metrics logged by all the pytest-xdist workers and the
+    ``--emulator-workers`` workers. Otherwise it's left untouched.
 
     :param metric_path: Path to the metric file, from the ``--metric-path`` option.
-    :return: A function to log metrics, or a no-op function if the path is not provided.
+    :return: A `MetricSink`, which does nothing but warns if the path is not provided.
     """
-    if not metric_path:
-
-        def no_op(key: str, value: t.Any, **kwargs: t.Any) -> None:  # noqa: ARG001
-            warnings.warn('`--metric-path` is not specified, `log_metric` does nothing.')
-
-        return no_op
-
-    if os.path.exists(metric_path):
-        os.remove(metric_path)
-    elif os.path.dirname(metric_path):
-        os.makedirs(os.path.dirname(metric_path), exist_ok=True)
-
-    def _log_metric_impl(key: str, value: t.Any, **kwargs: t.Any) -> None:
-        labels = ''
-        if kwargs:
-            label_str = ','.join(f'{k}="{v}"' for k, v in kwargs.items())
-            labels = f'{{{label_str}}}'
-
-        line = f'{key}{labels} {value}\n'
-
-        lock = filelock.FileLock(f'{metric_path}.lock')
-        with lock:
-            with open(metric_path, 'a') as f:
-                f.write(line)
-
-    return _log_metric_impl
+    sink = MetricSink(metric_path)
+    yield sink
+    sink.flush()
 
 
 @pytest.fixture(scope='session', autouse=True)
@@ -736,6 +743,80 @@ def _mp_manager():
     manager.shutdown()
 
 
+@pytest.fixture(scope='session', autouse=True)
+def _qemu_pool():
+    """
+    Terminate the idle QEMU instances kept by ``--qemu-pool-size`` at the end of the session.
+    """
+    yield
+
+    _pool_module = sys.modules.get('pytest_embedded_qemu.pool')
+    if _pool_module:
+        _pool_module.QemuPool.shutdown()
+
+
+@pytest.fixture(scope='session', autouse=True)
+def _wokwi_sessions():
+    """
+    Disconnect the idle Wokwi sessions kept by ``--wokwi-keep-session`` at the end of the session.
+    """
+    yield
+
+    _session_module = sys.modules.get('pytest_embedded_wokwi.session')
+    if _session_module:
+        _session_module.WokwiSession.shutdown()
+
+
+@pytest.fixture(scope='session', autouse=True)
+def _openocd_sessions():
+    """
+    Terminate the OpenOCD instances kept by ``--openocd-keep-session`` at the end of the session.
+    """
+    yield
+
+    _openocd_module = sys.modules.get('pytest_embedded_jtag.openocd')
+    if _openocd_module:
+        _openocd_module.OpenOcd.shutdown()
+
+
+@pytest.fixture(scope='session', autouse=True)
+def _unity_case_durations(request: FixtureRequest):
+    """
+    Save the unity case durations observed, and report the time saved by ``--adaptive-timeouts`` at the end of the
+    session.
+    """
+    yield
+
+    _unity_tester_module = sys.modules.get('pytest_embedded_idf.unity_tester')
+    if _unity_tester_module:
+        _write_session_summary(request, _unity_tester_module.CaseDurationHistory.shutdown())
+
+
+@pytest.fixture(scope='session', autouse=True)
+def _decode_pool(request: FixtureRequest):
+    """
+    Wait for the panic outputs and the core dumps queued by ``--async-decode``, and write the decoded outputs at the
+    end of the session. The decoded outputs are attached to the junit report as well, in `pytest_sessionfinish`.
+    """
+    yield
+
+    _decoder_module = sys.modules.get('pytest_embedded_idf.decoder')
+    if _decoder_module:
+        _write_session_summary(request, _decoder_module.DecodePool.shutdown())
+        request.config.stash[_junit_outputs_key] = _decoder_module.DecodePool.pop_junit_outputs()
+
+
+def _write_session_summary(request: FixtureRequest, summary: str | None) -> None:
+    if not summary:
+        return
+
+    terminal_reporter = request.config.pluginmanager.get_plugin('terminalreporter')
+    if terminal_reporter:
+        terminal_reporter.write_line(summary)
+    else:
+        logging.info(summary)
+
+
 @pytest.fixture(scope='session', autouse=True)
 def _stdout_lock():
     """
@@ -761,9 +842,9 @@ def test_case_tempdir(test_case_name: str, session_tempdir: str) -> str:
 
 @pytest.fixture
 @multi_dut_fixture
-def _meta(test_case_tempdir, port_target_cache, port_app_cache, logfile_extension) -> Meta:
+def _meta(test_case_tempdir, port_target_cache, port_app_cache, logfile_extension, cache_dir) -> Meta:
     """function scoped _meta info"""
-    return Meta(test_case_tempdir, port_target_cache, port_app_cache, logfile_extension)
+    return Meta(test_case_tempdir, port_target_cache, port_app_cache, logfile_extension, cache_dir)
 
 
 @pytest.fixture
@@ -1016,6 +1097,20 @@ def skip_decode_panic(request: FixtureRequest) -> bool | None:
     return _request_param_or_config_option_or_default(request, 'skip_decode_panic', None)
 
 
+@pytest.fixture
+@multi_dut_argument
+def adaptive_timeouts(request: FixtureRequest) -> bool | None:
+    """Enable parametrization for the same cli option"""
+    return _request_param_or_config_option_or_default(request, 'adaptive_timeouts', None)
+
+
+@pytest.fixture
+@multi_dut_argument
+def async_decode(request: FixtureRequest) -> bool | None:
+    """Enable parametrization for the same cli option"""
+    return _request_param_or_config_option_or_default(request, 'async_decode', None)
+
+
 ########
 # jtag #
 ########
@@ -1033,6 +1128,13 @@ def gdb_cli_args(request: FixtureRequest) -> str | None:
     return _request_param_or_config_option_or_default(request, 'gdb_cli_args', None)
 
 
+@pytest.fixture
+@multi_dut_argument
+def gdb_mi(request: FixtureRequest) -> bool | None:
+    """Enable parametrization for the same cli option"""
+    return _request_param_or_config_option_or_default(request, 'gdb_mi', None)
+
+
 @pytest.fixture
 @multi_dut_argument
 def no_gdb(request: FixtureRequest) -> bool:
@@ -1053,6 +1155,13 @@ def openocd_cli_args(request: FixtureRequest) -> str | None:
     return _request_param_or_config_option_or_default(request, 'openocd_cli_args', None)
 
 
+@pytest.fixture
+@multi_dut_argument
+def openocd_keep_session(request: FixtureRequest) -> bool | None:
+    """Enable parametrization for the same cli option"""
+    return _request_param_or_config_option_or_default(request, 'openocd_keep_session', None)
+
+
 ########
 # qemu #
 ########
@@ -1091,6 +1200,34 @@ def qemu_efuse_path(request: FixtureRequest) -> str | None:
     return _request_param_or_config_option_or_default(request, 'qemu_efuse_path', None)
 
 
+@pytest.fixture
+@multi_dut_argument
+def qemu_efuse_fields(request: FixtureRequest) -> str | None:
+    """Enable parametrization for the same cli option"""
+    return _request_param_or_config_option_or_default(request, 'qemu_efuse_fields', None)
+
+
+@pytest.fixture
+@multi_dut_argument
+def qemu_pool_size(request: FixtureRequest) -> str | None:
+    """Enable parametrization for the same cli option"""
+    return _request_param_or_config_option_or_default(request, 'qemu_pool_size', None)
+
+
+@pytest.fixture
+@multi_dut_argument
+def qemu_serial_transport(request: FixtureRequest) -> str | None:
+    """Enable parametrization for the same cli option"""
+    return _request_param_or_config_option_or_default(request, 'qemu_serial_transport', None)
+
+
+@pytest.fixture
+@multi_dut_argument
+def qemu_time_mode(request: FixtureRequest) -> str | None:
+    """Enable parametrization for the same cli option"""
+    return _request_param_or_config_option_or_default(request, 'qemu_time_mode', None)
+
+
 ##########
 # espemu #
 ##########
@@ -1143,6 +1280,13 @@ def keyfile(request: FixtureRequest) -> str | None:
     return _request_param_or_config_option_or_default(request, 'keyfile', None)
 
 
+@pytest.fixture
+@multi_dut_argument
+def unity_stdout_max_size(request: FixtureRequest) -> str | None:
+    """Enable parametrization for the same cli option"""
+    return _request_param_or_config_option_or_default(request, 'unity_stdout_max_size', None)
+
+
 #########
 # Wokwi #
 #########
@@ -1160,6 +1304,13 @@ def wokwi_usb_serial_jtag(request: FixtureRequest) -> bool | None:
     return _request_param_or_config_option_or_default(request, 'wokwi_usb_serial_jtag', None)
 
 
+@pytest.fixture
+@multi_dut_argument
+def wokwi_keep_session(request: FixtureRequest) -> bool | None:
+    """Enable parametrization for the same cli option"""
+    return _request_param_or_config_option_or_default(request, 'wokwi_keep_session', None)
+
+
 ####################
 # Private Fixtures #
 ####################
@@ -1208,25 +1359,35 @@ def parametrize_fixtures(
     erase_nvs,
     skip_check_coredump,
     skip_decode_panic,
+    async_decode,
     openocd_prog_path,
     openocd_cli_args,
+    openocd_keep_session,
     gdb_prog_path,
     gdb_cli_args,
+    gdb_mi,
     no_gdb,
     qemu_image_path,
     qemu_prog_path,
     qemu_cli_args,
     qemu_extra_args,
     qemu_efuse_path,
+    qemu_efuse_fields,
+    qemu_pool_size,
+    qemu_serial_transport,
+    qemu_time_mode,
     espemu_image_path,
     espemu_prog_path,
     espemu_cli_args,
     espemu_extra_args,
     wokwi_diagram,
     wokwi_usb_serial_jtag,
+    wokwi_keep_session,
     skip_regenerate_image,
     encrypt,
     keyfile,
+    unity_stdout_max_size,
+    adaptive_timeouts,
     # common fixtures
     test_case_name,
     _meta,
@@ -1368,6 +1529,7 @@ _junit_merger_key = pytest.StashKey['JunitMerger']()
 _pytest_embedded_key = pytest.StashKey['PytestEmbedded']()
 _session_tempdir_key = pytest.StashKey['session_tempdir']()
 _junit_report_path_key = pytest.StashKey[str]()
+_junit_outputs_key = pytest.StashKey[dict[str, dict[str, list[str]]]]()
 
 
 def pytest_configure(config: Config) -> None:
@@ -1389,9 +1551,11 @@ def pytest_configure(config: Config) -> None:
     config.stash[_pytest_embedded_key] = PytestEmbedded(
         parallel_count=config.getoption('parallel_count'),
         parallel_index=config.getoption('parallel_index'),
+        emulator_workers=config.getoption('emulator_workers', None),
         check_duplicates=config.getoption('check_duplicates', False),
         prettify_junit_report=_str_bool(config.getoption('prettify_junit_report', False)),
         add_target_as_marker_with_amount=_str_bool(config.getoption('add_target_as_marker_with_amount', False)),
+        metric_path=config.getoption('metric_path', None),
     )
     config.pluginmanager.register(config.stash[_pytest_embedded_key])
     config.addinivalue_line('markers', 'skip_if_soc')
@@ -1409,15 +1573,23 @@ class PytestEmbedded:
         self,
         parallel_count: int = 1,
         parallel_index: int = 1,
+        emulator_workers: str | None = None,
         check_duplicates: bool = False,
         prettify_junit_report: bool = False,
         add_target_as_marker_with_amount: bool = False,
+        metric_path: str | None = None,
     ):
         self.parallel_count = parallel_count
         self.parallel_index = parallel_index
+        self.emulator_workers = emulator_workers
+        self.worker = current_worker()
+        self._worker_results: list = []
+        if self.worker:
+            pin_current_worker()
         self.check_duplicates = check_duplicates
         self.prettify_junit_report = prettify_junit_report
         self.add_target_as_marker_with_amount = add_target_as_marker_with_amount
+        self.metric_path = metric_path
 
     @staticmethod
     def _raise_dut_failed_cases_if_exists(duts: t.Iterable[Dut]) -> None:
@@ -1517,6 +1689,14 @@ class PytestEmbedded:
             if duplicated_test_script_paths:
                 raise ValueError(f'Duplicated test scripts: {duplicated_test_script_paths}')
 
+        self._split_parallel_items(items)
+
+        # each worker process keeps every `count`-th of the test cases of this job
+        if self.worker:
+            index, count = self.worker
+            items[:] = items[index - 1 :: count]
+
+    def _split_parallel_items(self, items: list[Function]) -> None:
         if self.parallel_index == 1 and self.parallel_count == 1:
             return
 
@@ -1539,6 +1719,55 @@ class PytestEmbedded:
         )
         items[:] = items[run_case_start_index : run_case_end_index + 1]
 
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_sessionstart(self, session: Session) -> None:  # noqa: ARG002
+        if self.metric_path and is_main_process():
+            MetricSink.clear(self.metric_path)
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtestloop(self, session: Session) -> bool | None:
+        if (
+            not self.emulator_workers
+            or self.worker
+            or not session.items
+            or session.testsfailed
+            or session.config.option.collectonly
+        ):
+            return None  # the default loop
+
+        services = {session.config.getoption('embedded_services', None)} | {
+            self.get_param(item, 'embedded_services') for item in session.items
+        }
+        if not all(is_hardware_free(s) for s in services):
+            logging.warning('--emulator-workers is ignored, since some test cases require real boards')
+            return None
+
+        workers = WorkerScheduler.decide_workers(self.emulator_workers, len(session.items))
+        if workers == 1:
+            return None
+
+        scheduler = WorkerScheduler(
+            workers,
+            workdir=os.path.join(
+                os.path.realpath(session.config.getoption('root_logdir', None) or tempfile.gettempdir()),
+                'pytest-embedded',
+                f'{utcnow_str()}-workers',
+            ),
+            args=session.config.invocation_params.args,
+            invocation_dir=str(session.config.invocation_params.dir),
+        )
+        self._worker_results = scheduler.run()
+
+        terminal_reporter = session.config.pluginmanager.get_plugin('terminalreporter')
+        for result in self._worker_results:
+            if terminal_reporter:
+                terminal_reporter.write_line(result.summary())
+            else:
+                logging.info(result.summary())
+
+        session.testsfailed = sum(result.failed for result in self._worker_results)
+        return True
+
     @pytest.hookimpl(trylast=True)
     def pytest_runtest_call(self, item: Function):
         all_duts: list[Dut] = []
@@ -1559,22 +1788,25 @@ class PytestEmbedded:
         modifier: JunitMerger = session.config.stash[_junit_merger_key]
         _stash_session_tempdir = session.config.stash.get(_session_tempdir_key, None)
         _stash_junit_report_path = session.config.stash.get(_junit_report_path_key, None)
+        # attach before merging, while the test cases are still named after the pytest test cases
+        modifier.attach(session.config.stash.get(_junit_outputs_key, {}))
         if _stash_session_tempdir is not None:
             modifier.merge(sorted(find_by_suffix('.xml', _stash_session_tempdir)))
 
-        if _stash_junit_report_path:
-            # before we only modified the junit report generated by the unity test cases
-            # now we do it again to check the python test cases
-            with open(_stash_junit_report_path) as fr:
-                file_str = fr.read()
-            with open(_stash_junit_report_path, 'w') as fw:
-                fw.write(escape_illegal_xml_chars(file_str))
+        if _stash_junit_report_path and self._worker_results:
+            WorkerScheduler.merge_junit(self._worker_results, _stash_junit_report_path)
 
-            if self.prettify_junit_report:
-                _prettify_xml(_stash_junit_report_path)
+        if _stash_junit_report_path:
+            # the merged report is already sanitized, unless the worker reports are merged afterward
+            if self.prettify_junit_report or self._worker_results or not modifier.merged:
+                sanitize_junit_report(_stash_junit_report_path, prettify=self.prettify_junit_report)
 
         # escalate the session exit status to failure if the merged junit report contains failures,
         # without downgrading an already-failing run
         current_exitstatus = getattr(session, 'exitstatus', pytest.ExitCode.OK)
         if modifier.failed and current_exitstatus == pytest.ExitCode.OK:
             session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+        # metrics logged by the pytest-xdist workers and the emulator workers are flushed when their sessions end
+        if self.metric_path and is_main_process():
+            MetricSink.merge(self.metric_path)
@@ -0,0 +1,244 @@
+import logging
+import os
+import subprocess
+import sys
+import time
+import typing as t
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+
+# services that need a real board attached to the host
+HARDWARE_SERVICES = ('serial', 'esp', 'jtag')
+
+# "<index>/<count>", 1-based index, set in the environment of the worker processes
+WORKER_ENV = 'PYTEST_EMBEDDED_WORKER'
+# comma-separated CPU cores the worker process is pinned to
+WORKER_CPUS_ENV = 'PYTEST_EMBEDDED_WORKER_CPUS'
+
+
+def is_hardware_free(embedded_services: str | None) -> bool:
+    """
+    Check if none of the DUTs configured by `embedded_services` needs a real board.
+
+    Args:
+        embedded_services: value of ``--embedded-services``, DUTs separated by "|"
+
+    Returns:
+        True if all DUTs are emulated or run on the host, e.g. ``qemu``, ``espemu``, or ``idf`` with target ``linux``
+    """
+    for dut_services in (embedded_services or '').split('|'):
+        if {s.strip() for s in dut_services.split(',')} & set(HARDWARE_SERVICES):
+            return False
+
+    return True
+
+
+def available_cpus() -> list[int]:
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS and Windows
+        return list(range(os.cpu_count() or 1))
+
+
+def available_memory() -> int | None:
+    """
+    Available memory in bytes, None if unknown.
+    """
+    try:
+        with open('/proc/meminfo') as fr:
+            for line in fr:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def current_worker() -> tuple[int, int] | None:
+    """
+    Returns:
+        (1-based index, count) of the current worker process, None if not running in a worker process
+    """
+    s = os.getenv(WORKER_ENV)
+    if not s:
+        return None
+
+    index, count = s.split('/')
+    return int(index), int(count)
+
+
+def pin_current_worker() -> None:
+    """
+    Pin the current worker process to its CPU cores. The emulators started later inherit the affinity.
+    """
+    cpus = os.getenv(WORKER_CPUS_ENV)
+    if not cpus or not hasattr(os, 'sched_setaffinity'):
+        return
+
+    os.sched_setaffinity(0, {int(c) for c in cpus.split(',')})
+
+
+@dataclass
+class WorkerResult:
+    index: int
+    returncode: int
+    junit_path: str
+    log_path: str
+    tests: int = 0
+    failures: int = 0
+    errors: int = 0
+    skipped: int = 0
+
+    @property
+    def failed(self) -> int:
+        return self.failures + self.errors
+
+    def summary(self) -> str:
+        return (
+            f'worker {self.index}: {self.tests} tests, {self.failures} failed, {self.errors} errors, '
+            f'{self.skipped} skipped, exit code {self.returncode}. Log: {self.log_path}'
+        )
+
+
+class WorkerScheduler:
+    """
+    Run the collected test cases in several pytest worker processes, for DUTs that need no hardware.
+
+    Each worker process runs the same pytest command, collects the same test cases, and keeps every
+    `count`-th of them. Workers are pinned to disjoint sets of CPU cores, so are the emulators they started. Each
+    worker keeps its own log dirs and junit report, the junit reports are merged into the main one at last.
+    """
+
+    # memory reserved for each worker and its emulators, while deciding the amount of workers automatically
+    MEMORY_PER_WORKER = 512 * 1024 * 1024
+
+    def __init__(
+        self,
+        workers: int,
+        workdir: str,
+        args: t.Sequence[str],
+        invocation_dir: str | None = None,
+    ) -> None:
+        """
+        Args:
+            workers: amount of worker processes
+            workdir: dir to store the logs and junit reports of the workers
+            args: pytest command line arguments, the same as the main process
+            invocation_dir: dir to run pytest in
+        """
+        self.workers = workers
+        self.workdir = workdir
+        self.args = list(args)
+        self.invocation_dir = invocation_dir
+
+        os.makedirs(self.workdir, exist_ok=True)
+
+    @classmethod
+    def decide_workers(cls, workers: str, items_count: int) -> int:
+        """
+        Args:
+            workers: amount of worker processes, or "auto" to decide from the available CPU cores and memory
+            items_count: amount of the test cases
+
+        Returns:
+            amount of worker processes, at most one worker for each test case
+        """
+        if workers == 'auto':
+            n = len(available_cpus())
+            memory = available_memory()
+            if memory is not None:
+                n = min(n, memory // cls.MEMORY_PER_WORKER)
+        else:
+            n = int(workers)
+
+        return max(1, min(n, items_count))
+
+    def _cpus_of(self, index: int) -> list[int]:
+        cpus = available_cpus()
+        if len(cpus) < self.workers:
+            return cpus
+
+        return cpus[index - 1 :: self.workers]
+
+    def run(self) -> list[WorkerResult]:
+        """
+        Start all the workers, and wait for all of them to finish.
+        """
+        procs = []
+        for i in range(1, self.workers + 1):
+            result = WorkerResult(
+                index=i,
+                returncode=-1,
+                junit_path=os.path.join(self.workdir, f'worker-{i}.xml'),
+                log_path=os.path.join(self.workdir, f'worker-{i}.log'),
+            )
+            env = {
+                **os.environ,
+                WORKER_ENV: f'{i}/{self.workers}',
+                WORKER_CPUS_ENV: ','.join(str(c) for c in self._cpus_of(i)),
+            }
+            cmd = [
+                sys.executable,
+                '-m',
+                'pytest',
+                *self.args,
+                f'--junitxml={result.junit_path}',
+                # workers share the same cache dir
+                '-p',
+                'no:cacheprovider',
+            ]
+            fw = open(result.log_path, 'w')
+            logging.debug('Starting worker %s: %s', i, ' '.join(cmd))
+            procs.append((subprocess.Popen(cmd, cwd=self.invocation_dir, env=env, stdout=fw, stderr=fw), fw, result))
+
+        start = time.monotonic()
+        for proc, fw, result in procs:
+            result.returncode = proc.wait()
+            fw.close()
+            self._read_junit(result)
+
+        logging.info('%s workers finished in %.2f seconds', self.workers, time.monotonic() - start)
+        return [result for _, _, result in procs]
+
+    @staticmethod
+    def _read_junit(result: WorkerResult) -> None:
+        if not os.path.isfile(result.junit_path):
+            result.errors = 1  # crashed before writing the report
+            return
+
+        root = ET.parse(result.junit_path).getroot()
+        for testsuite in root.iter('testsuite'):
+            result.tests += int(testsuite.get('tests', 0))
+            result.failures += int(testsuite.get('failures', 0))
+            result.errors += int(testsuite.get('errors', 0))
+            result.skipped += int(testsuite.get('skipped', 0))
+
+        if result.returncode not in (0, 1, 5) and not result.failed:  # internal error, usage error, interrupted...
+            result.errors += 1
+
+    @staticmethod
+    def merge_junit(results: list[WorkerResult], junit_path: str) -> None:
+        """
+        Move the test cases of the worker junit reports into the first test suite of the main junit report.
+        """
+        tree = ET.parse(junit_path)
+        root = tree.getroot()
+        main_suite = root if root.tag == 'testsuite' else root.find('testsuite')
+        if main_suite is None:
+            main_suite = ET.SubElement(root, 'testsuite', {'name': 'pytest'})
+
+        for result in results:
+            if not os.path.isfile(result.junit_path):
+                continue
+
+            for testsuite in ET.parse(result.junit_path).getroot().iter('testsuite'):
+                main_suite.extend(testsuite.findall('testcase'))
+                for attr in ('tests', 'failures', 'errors', 'skipped'):
+                    main_suite.set(attr, str(int(main_suite.get(attr, 0)) + int(testsuite.get(attr, 0))))
+                main_suite.set('time', f'{float(main_suite.get("time", 0)) + float(testsuite.get("time", 0)):.3f}')
+
+        tree.write(junit_path, encoding='utf-8', xml_declaration=True)
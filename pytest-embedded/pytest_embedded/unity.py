@@ -1,14 +1,18 @@
+import codecs
 import enum
 import logging
 import os
 import re
+import shutil
+import time
 import xml.etree.ElementTree as ET
+from collections.abc import Iterator
 from copy import deepcopy
 from functools import reduce
-from typing import Any, AnyStr
-from xml.sax.saxutils import escape
+from typing import Any, AnyStr, TextIO
+from xml.sax.saxutils import escape, quoteattr
 
-from .utils import to_str
+from .utils import remove_asci_color_code, to_str
 
 UNITY_BASIC_REGEX = re.compile(
     #        foo.c:          100:        test_case:                FAIL           :Expected 2 was 1
@@ -27,6 +31,16 @@ UNITY_SUMMARY_LINE_REGEX = re.compile(
     re.MULTILINE,
 )
 
+# the line-oriented pieces of the regexes above, used by `UnityParser`
+UNITY_FIXTURE_START_REGEX = re.compile(r'TEST\((?P<group>[^\s,]+), (?P<name>[^\r\n)]+)\)')
+UNITY_FIXTURE_RESULT_REGEX = re.compile(
+    r'(?:(?P<file>.+):(?P<line>\d+)::)?(?P<result>PASS|FAIL|IGNORE)(?::(?P<message>.+))?'
+)
+UNITY_SUMMARY_COUNTS_REGEX = re.compile(r'^(?P<dashes>-+)?\s*(\d+) Tests (\d+) Failures (\d+) Ignored')
+_UNITY_RESULT_WORD_REGEX = re.compile(r'PASS|FAIL|IGNORE')
+_UNSAFE_FILENAME_CHARS_REGEX = re.compile(r'[^\w.-]+')
+_UNITY_SUMMARY_DASHES_REGEX = re.compile(r'^-+\s*$')
+
 # https://www.w3.org/TR/xml11/#NT-Char
 # https://www.w3.org/TR/xml11/#NT-RestrictedChar
 _avoid_compatibility_chars = [
@@ -59,6 +73,10 @@ ILLEGAL_XML_CHAR_REGEX = re.compile(
 )
 
 
+# also escape the whitespaces in attribute values, same as `ElementTree` does
+_ATTR_ENTITIES = {'\n': '&#10;', '\r': '&#13;', '\t': '&#09;'}
+
+
 def escape_illegal_xml_chars(s: str) -> str:
     return ILLEGAL_XML_CHAR_REGEX.sub('', s)
 
@@ -89,6 +107,8 @@ class TestCase:
             raise ValueError('Unity test case result should be one of "PASS", "FAIL", "IGNORE"')
 
         self.attrs = kwargs
+        #: time when the result of the case is received, only recorded by a live `UnityParser`
+        self.timestamp: float | None = None
 
         self._xml = None
 
@@ -96,8 +116,8 @@ class TestCase:
         if self._xml:
             return self._xml
 
-        message = self.attrs.pop('message', '').strip()
-        stdout = self.attrs.pop('stdout', '').strip()
+        message = self.attrs.get('message', '').strip()
+        stdout = self.attrs.get('stdout', '').strip()
 
         sub_attrs = {}
         text = None
@@ -123,7 +143,7 @@ class TestCase:
                 if text:
                     child.text = escape(text)
 
-        attrs = deepcopy(self.attrs)
+        attrs = {k: v for k, v in self.attrs.items() if k not in ('message', 'stdout')}
         attrs['name'] = self.name
         testcase = ET.Element('testcase', attrib=escape_dict_value(attrs))
         if child is not None:
@@ -133,11 +153,183 @@ class TestCase:
         return self._xml
 
 
+class UnityParser:
+    """
+    Incremental parser of the unity test output.
+
+    The output is fed as it arrives and split into lines. Each test case is created as soon as its result line is
+    received, so the cases finished before a crash or a timeout are kept. Both the basic format and the fixture
+    format are parsed line by line, in one pass over the output. The format is switched to the fixture one at the
+    first ``TEST(group, name)`` line.
+
+    Examples:
+        >>> parser = UnityParser({'app_path': app_path}, record_time=True)
+        >>> for chunk in chunks:
+        ...     for case in parser.feed(chunk):
+        ...         print(case.name, case.result)
+        >>> parser.flush()
+    """
+
+    def __init__(
+        self,
+        additional_attrs: dict[str, Any] | None = None,
+        remove_asci_escape_code: bool = True,
+        record_time: bool = False,
+        stop_at_summary: bool = False,
+    ) -> None:
+        """
+        Args:
+            additional_attrs: attributes added to each test case
+            remove_asci_escape_code: remove asci escape code in each line. (default: True)
+            record_time: record the duration of each test case as the `time` attribute, and the time its result is
+                received as `TestCase.timestamp`. Only meaningful when the output is fed as it arrives. For the
+                basic format, the case starts when the previous one finished. (default: False)
+            stop_at_summary: ignore the output after the unity summary block. (default: False)
+        """
+        self.additional_attrs = additional_attrs or {}
+        self.remove_asci_escape_code = remove_asci_escape_code
+        self.record_time = record_time
+        self.stop_at_summary = stop_at_summary
+
+        self.format: TestFormat | None = None
+        self.finished = False
+        self.testcases: list[TestCase] = []
+
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        self._partial: list[str] = []  # chunks of the incomplete last line
+        self._prev_dashes = False
+        self._fixture: dict[str, Any] | None = None  # the fixture case waiting for its result
+        self._fixture_stdout: list[str] = []
+        self._started_at = time.perf_counter()
+
+    def feed(self, data: AnyStr) -> list[TestCase]:
+        """
+        Feed the next chunk of the output.
+
+        Returns:
+            The test cases whose result lines are completed by this chunk
+        """
+        if self.finished or not data:
+            return []
+
+        text = self._decoder.decode(data) if isinstance(data, bytes) else data
+        if '\n' not in text:
+            self._partial.append(text)
+            return []
+
+        first, *lines = text.split('\n')
+        self._partial.append(first)
+        lines.insert(0, ''.join(self._partial))
+        self._partial = [lines.pop()]
+
+        res: list[TestCase] = []
+        for line in lines:
+            if self.finished:
+                break
+            self._parse_line(line, res)
+
+        return res
+
+    def flush(self) -> list[TestCase]:
+        """
+        Parse the incomplete last line, at the end of the output.
+
+        Returns:
+            The test case of the last line, if any
+        """
+        line = ''.join(self._partial) + self._decoder.decode(b'', final=True)
+        self._partial = []
+
+        res: list[TestCase] = []
+        if line and not self.finished:
+            self._parse_line(line, res)
+
+        return res
+
+    def _parse_line(self, line: str, res: list[TestCase]) -> None:
+        line = line.rstrip('\r')
+        if self.remove_asci_escape_code:
+            line = remove_asci_color_code(line)
+
+        if self.stop_at_summary:
+            summary = UNITY_SUMMARY_COUNTS_REGEX.match(line)
+            if summary and (summary.group('dashes') or self._prev_dashes):
+                self.finished = True
+                return
+            self._prev_dashes = bool(_UNITY_SUMMARY_DASHES_REGEX.match(line))
+
+        rest = line
+        while True:
+            if self._fixture is None:
+                start = UNITY_FIXTURE_START_REGEX.search(rest)
+                if start is None:
+                    if self.format != TestFormat.FIXTURE and _UNITY_RESULT_WORD_REGEX.search(rest):
+                        for item in UNITY_BASIC_REGEX.finditer(rest):
+                            self.format = TestFormat.BASIC
+                            res.append(self._add_case(item.groupdict()))
+                    return
+
+                self.format = TestFormat.FIXTURE
+                self._fixture = start.groupdict()
+                self._fixture_stdout = []
+                self._started_at = time.perf_counter()
+                rest = rest[start.end() :]
+
+            # the result may be in the same line, or after the stdout of the case
+            result = UNITY_FIXTURE_RESULT_REGEX.search(rest) if _UNITY_RESULT_WORD_REGEX.search(rest) else None
+            if result is None:
+                self._fixture_stdout.append(rest)
+                return
+
+            self._fixture_stdout.append(rest[: result.start()])
+            attrs = {**self._fixture, 'stdout': '\n'.join(self._fixture_stdout), **result.groupdict()}
+            self._fixture = None
+            self._fixture_stdout = []
+            res.append(self._add_case(attrs))
+
+            rest = rest[result.end() :]
+            if not rest:
+                return
+
+    def _add_case(self, groups: dict[str, Any]) -> TestCase:
+        attrs = {k: v for k, v in groups.items() if v is not None}
+        attrs.update(self.additional_attrs)
+
+        now = time.perf_counter()
+        if self.record_time:
+            attrs.setdefault('time', round(now - self._started_at, 3))
+
+        testcase = TestCase(**attrs)
+        if self.record_time:
+            testcase.timestamp = time.time()
+        self._started_at = now
+
+        self.testcases.append(testcase)
+        return testcase
+
+
 class TestSuite:
-    def __init__(self, name: str | None = None, **kwargs):
+    def __init__(
+        self,
+        name: str | None = None,
+        stdout_max_size: int | None = None,
+        stdout_dir: str | None = None,
+        **kwargs,
+    ):
+        """
+        Args:
+            name: test suite name
+            stdout_max_size: max characters of the stdout kept in each test case. The complete stdout of a longer one
+                is moved into a file under `stdout_dir`, only its tail is kept and the file is referred to in the
+                junit report. (Default: no limit)
+            stdout_dir: directory of the stdout files
+        """
         # required
         self.name = name or kwargs.pop('name')  # may overwrite later
 
+        self.stdout_max_size = stdout_max_size
+        self.stdout_dir = stdout_dir
+
         # default stats
         self.attrs: dict[str, Any] = {
             'errors': 0,
@@ -155,35 +347,42 @@ class TestSuite:
     def failed_cases(self) -> list[TestCase]:
         return [case for case in self.testcases if case.result == 'FAIL']
 
-    def add_unity_test_cases(self, s: AnyStr, additional_attrs: dict[str, Any] | None = None) -> None:
-        s = to_str(s)
+    def limit_stdout(self, testcase: TestCase) -> None:
+        """
+        Move the stdout of the test case into a file if it's longer than `stdout_max_size`.
+        """
+        stdout = testcase.attrs.get('stdout')
+        if not stdout or not self.stdout_max_size or not self.stdout_dir or len(stdout) <= self.stdout_max_size:
+            return
 
-        # check format
-        check = UNITY_FIXTURE_REGEX.search(s)
-        if check:
-            regex = UNITY_FIXTURE_REGEX
-        else:
-            regex = UNITY_BASIC_REGEX
+        os.makedirs(self.stdout_dir, exist_ok=True)
+        filename = f'{len(self.testcases)}-{_UNSAFE_FILENAME_CHARS_REGEX.sub("_", testcase.name)[:64]}.stdout.log'
+        filepath = os.path.join(self.stdout_dir, filename)
+        with open(filepath, 'w', encoding='utf-8') as fw:
+            fw.write(stdout)
 
-        # real parsing
-        res = regex.finditer(s)
-        for item in res:
-            attrs = {k: v for k, v in item.groupdict().items() if v is not None}
+        testcase.attrs['stdout'] = (
+            f'[{len(stdout) - self.stdout_max_size} characters truncated, complete stdout: {filepath}]\n'
+            f'{stdout[-self.stdout_max_size :]}'
+        )
 
-            if additional_attrs:
-                attrs.update(additional_attrs)
+    def add_test_case(self, testcase: TestCase) -> None:
+        self.limit_stdout(testcase)
+        self.testcases.append(testcase)
+        if testcase.result == 'FAIL':
+            self.attrs['failures'] += 1
+        elif testcase.result == 'IGNORE':
+            self.attrs['skipped'] += 1
 
-            testcase = TestCase(**attrs)
-            self.testcases.append(testcase)
-            if testcase.result == 'FAIL':
-                self.attrs['failures'] += 1
-            elif testcase.result == 'IGNORE':
-                self.attrs['skipped'] += 1
+        self.attrs['tests'] += 1
 
-            self.attrs['tests'] += 1
+    def add_unity_test_cases(self, s: AnyStr, additional_attrs: dict[str, Any] | None = None) -> None:
+        parser = UnityParser(additional_attrs, remove_asci_escape_code=False)
+        for testcase in parser.feed(s) + parser.flush():
+            self.add_test_case(testcase)
 
         if not self.testcases:
-            raise ValueError(f'unity test case not found, buffer:\n{s}')
+            raise ValueError(f'unity test case not found, buffer:\n{to_str(s)}')
 
     def to_xml(self) -> ET.Element:
         if self._xml:
@@ -207,10 +406,143 @@ class TestSuite:
             fw.write(escape_illegal_xml_chars(ET.tostring(self.to_xml(), encoding='unicode')))
 
 
+class _PrettyXmlWriter:
+    """
+    Write the elements of `XMLPullParser` events with indentation, as soon as they're complete.
+
+    An element with children is written as its start tag when its first child starts, other elements are written as
+    a whole at their end. Only the element being parsed and its ancestors are kept in memory.
+    """
+
+    def __init__(self, fw: TextIO, indent: str = '\t') -> None:
+        self._fw = fw
+        self._indent = indent
+        self._stack: list[list[Any]] = []  # [element, opened]
+
+    def _open_parent(self) -> None:
+        parent = self._stack[-1]
+        if parent[1]:
+            return
+
+        elem = parent[0]
+        depth = len(self._stack) - 1
+        self._fw.write(f'\n{self._indent * depth}{_start_tag(elem.tag, elem.attrib)}')
+        if elem.text and elem.text.strip():
+            self._fw.write(f'\n{self._indent * (depth + 1)}{escape(elem.text.strip())}')
+        parent[1] = True
+
+    def start(self, elem: ET.Element) -> None:
+        if self._stack:
+            self._open_parent()
+        self._stack.append([elem, False])
+
+    def end(self, elem: ET.Element) -> None:
+        _, opened = self._stack.pop()
+        prefix = f'\n{self._indent * len(self._stack)}'
+        if opened:
+            self._fw.write(f'{prefix}</{elem.tag}>')
+        elif elem.text:
+            self._fw.write(f'{prefix}{_start_tag(elem.tag, elem.attrib)}{escape(elem.text)}</{elem.tag}>')
+        else:
+            self._fw.write(f'{prefix}{_start_tag(elem.tag, elem.attrib)[:-1]} />')
+
+        if self._stack:
+            self._stack[-1][0].remove(elem)
+
+
+def sanitize_junit_report(path: str, prettify: bool = False, chunk_size: int = 1 << 20) -> None:
+    """
+    Remove the illegal XML characters from the junit report, and prettify it if required, in one pass.
+
+    The report is processed in chunks of `chunk_size` characters. When prettifying, the elements are written as soon
+    as they're parsed, the memory usage is bounded by the largest test case instead of the whole report.
+
+    Args:
+        path: junit report file path, overwritten in place
+        prettify: indent the elements with tabs
+        chunk_size: characters read at a time
+    """
+    tmp_path = path + '.tmp'
+    with (
+        open(path, encoding='utf-8', errors='ignore', newline='') as fr,
+        open(tmp_path, 'w', encoding='utf-8', newline='') as fw,
+    ):
+        if not prettify:
+            while chunk := fr.read(chunk_size):
+                fw.write(escape_illegal_xml_chars(chunk))
+        else:
+            fw.write('<?xml version="1.0" encoding="utf-8"?>')
+            parser = ET.XMLPullParser(events=('start', 'end'))
+            writer = _PrettyXmlWriter(fw)
+            while True:
+                chunk = fr.read(chunk_size)
+                if chunk:
+                    parser.feed(escape_illegal_xml_chars(chunk))
+                else:
+                    parser.close()
+
+                for event, elem in parser.read_events():
+                    if event == 'start':
+                        writer.start(elem)
+                    else:
+                        writer.end(elem)
+
+                if not chunk:
+                    break
+            fw.write('\n')
+
+    os.replace(tmp_path, path)
+
+
+def _read_root_attrib(path: str) -> dict[str, str]:
+    with open(path, 'rb') as fr:
+        for _, elem in ET.iterparse(fr, events=('start',)):
+            return dict(elem.attrib)
+
+    return {}
+
+
+def _iter_root_children(path: str) -> Iterator[ET.Element]:
+    """
+    Yield the children of the root element one by one, each is dropped from the tree once it's consumed.
+    """
+    with open(path, 'rb') as fr:
+        root = None
+        depth = 0
+        for event, elem in ET.iterparse(fr, events=('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                depth += 1
+                continue
+
+            depth -= 1
+            if depth == 1:
+                yield elem
+                root.remove(elem)
+
+
+def _start_tag(tag: str, attrib: dict[str, str]) -> str:
+    attrs = ''.join(f' {k}={quoteattr(str(v), _ATTR_ENTITIES)}' for k, v in attrib.items())
+    return f'<{tag}{attrs}>'
+
+
 class JunitMerger:
+    """
+    Merge the junit reports of the unity test cases, ``dut.xml`` or ``dut-[INDEX].xml``, into the main junit report.
+
+    The reports are never loaded as a whole. The main report is read twice with `iterparse`, first to index the test
+    cases to be merged by name, then to write the merged report element by element. The time is linear to the size
+    of the reports, and only one test case is kept in memory at a time. The illegal XML characters are removed while
+    writing, `merged` is set once the main report is rewritten.
+    """
+
     SUB_JUNIT_FILENAME = 'dut.xml'
     # multi-dut junit reports should be dut-[INDEX].xml
 
+    CONTAINER_TAGS = ('testsuites', 'testsuite')
+    COUNTER_ATTRS = ('errors', 'failures', 'skipped', 'tests')
+
     def __init__(self, main_junit: str | None, unity_test_report_mode: str | None = None) -> None:
         self.junit_path = main_junit
         self.unity_test_report_mode = unity_test_report_mode or UnityTestReportMode.REPLACE.value
@@ -218,6 +550,7 @@ class JunitMerger:
         self._junit = None
 
         self.failed = False
+        self.merged = False
 
     @property
     def junit(self) -> ET.ElementTree:
@@ -231,17 +564,58 @@ class JunitMerger:
     def _int_add(*args) -> str:
         return reduce(lambda a, b: str(int(a) + int(b)), args)
 
+    def _merge_multi_dut_junit_files(self, junit_files: list[str], merged_dut_junit_filepath: str) -> None:
+        roots = [_read_root_attrib(f) for f in junit_files]
+        attrib = dict(roots[0])
+        for k in self.COUNTER_ATTRS:
+            attrib[k] = self._int_add(*[r.get(k, 0) for r in roots])
+
+        tmp_filepath = merged_dut_junit_filepath + '.tmp'
+        with open(tmp_filepath, 'w', encoding='utf-8') as fw:
+            fw.write(_start_tag('testsuite', attrib))
+            for _junit_file in junit_files:
+                logging.debug(f'Merging {_junit_file} to {merged_dut_junit_filepath}')
+                for elem in _iter_root_children(_junit_file):
+                    fw.write(ET.tostring(elem, encoding='unicode'))
+            fw.write('</testsuite>')
+
+        os.replace(tmp_filepath, merged_dut_junit_filepath)
+
+    def _index_test_cases(self, names: set[str]) -> dict[str, tuple[int, bool]]:
+        """
+        Returns:
+            test case name -> (index of its parent test suite, if the test case failed), only for the given `names`.
+            The first test case is used if there're test cases with the same name.
+        """
+        index: dict[str, tuple[int, bool]] = {}
+        parents: list[tuple[ET.Element, int]] = []
+        suite_count = 0
+        with open(self.junit_path, 'rb') as fr:
+            for event, elem in ET.iterparse(fr, events=('start', 'end')):
+                if event == 'start':
+                    if elem.tag in self.CONTAINER_TAGS:
+                        parents.append((elem, suite_count))
+                        suite_count += 1
+                    continue
+
+                if elem.tag in self.CONTAINER_TAGS:
+                    parents.pop()
+                elif parents and elem in parents[-1][0]:
+                    name = elem.get('name')
+                    if elem.tag == 'testcase' and name in names and name not in index:
+                        index[name] = (parents[-1][1], elem.find('failure') is not None)
+                    parents[-1][0].remove(elem)
+
+        return index
+
     def merge(self, junit_files: list[str]):
         if not self.junit_path:
             return
 
         # first round, merge the multi dut ones
-        test_case_dir_sub_junit_files = {}
+        test_case_dir_sub_junit_files: dict[str, list[str]] = {}
         for file in junit_files:
-            if os.path.dirname(file) not in test_case_dir_sub_junit_files:
-                test_case_dir_sub_junit_files[os.path.dirname(file)] = [file]
-            else:
-                test_case_dir_sub_junit_files[os.path.dirname(file)].append(file)
+            test_case_dir_sub_junit_files.setdefault(os.path.dirname(file), []).append(file)
 
         _merged_multi_dut_junit_files = []
         for _dir, _junit_files in test_case_dir_sub_junit_files.items():
@@ -249,30 +623,7 @@ class JunitMerger:
 
             # multi-dut, multi junit files
             if len(_junit_files) > 1:
-                _data = None
-                for _junit_file in _junit_files:
-                    logging.debug(f'Merging {_junit_file} to {merged_dut_junit_filepath}')
-                    _junit = ET.parse(_junit_file)
-                    _root = _junit.getroot()
-
-                    if _data is None:
-                        _data = _junit
-                    else:
-                        _data.getroot().extend(_root)
-                        _data.getroot().attrib['errors'] = self._int_add(
-                            _data.getroot().attrib['errors'], _root.attrib['errors']
-                        )
-                        _data.getroot().attrib['failures'] = self._int_add(
-                            _data.getroot().attrib['failures'], _root.attrib['failures']
-                        )
-                        _data.getroot().attrib['skipped'] = self._int_add(
-                            _data.getroot().attrib['skipped'], _root.attrib['skipped']
-                        )
-                        _data.getroot().attrib['tests'] = self._int_add(
-                            _data.getroot().attrib['tests'],
-                            _root.attrib['tests'],
-                        )
-                _data.write(merged_dut_junit_filepath)
+                self._merge_multi_dut_junit_files(_junit_files, merged_dut_junit_filepath)
             # multi-dut, single junit file
             elif _junit_files[0] != merged_dut_junit_filepath:
                 _junit_file = _junit_files[0]
@@ -281,48 +632,131 @@ class JunitMerger:
 
             _merged_multi_dut_junit_files.append(merged_dut_junit_filepath)
 
+        if not _merged_multi_dut_junit_files:
+            return
+
         # second round, merge the test case junit report back to the main junit report
-        for file in _merged_multi_dut_junit_files:
-            logging.debug(f'Merging {file} to {self.junit_path}')
-            merging_xml = ET.parse(file)
-            merging_cases = merging_xml.findall('testcase')
-            merging_parent = merging_xml.getroot()
-
-            # a normal file path should be /tmp/pytest-embedded/<test_case_name>/dut.xml
-            test_case_name = os.path.basename(os.path.dirname(file))
-            junit_parent = self.junit.find(f'.//testcase[@name="{test_case_name}"]...')
-            junit_case = self.junit.find(f'.//testcase[@name="{test_case_name}"]')
-            if junit_case is None:
-                self.junit.write('debug.xml')
+        # a normal file path should be /tmp/pytest-embedded/<test_case_name>/dut.xml
+        merging = [(os.path.basename(os.path.dirname(f)), f) for f in _merged_multi_dut_junit_files]
+        index = self._index_test_cases({name for name, _ in merging})
+
+        # test suite index -> counter deltas, and the files merged into it in order
+        suite_deltas: dict[int, dict[str, int]] = {}
+        suite_files: dict[int, list[str]] = {}
+        for test_case_name, file in merging:
+            if test_case_name not in index:
+                shutil.copyfile(self.junit_path, 'debug.xml')
                 raise ValueError(f'Could\'t find test case {test_case_name}, dumped into "debug.xml" for debugging')
 
-            junit_case_is_fail = junit_case.find('failure') is not None
-
-            junit_case.attrib['is_unity_case'] = '0'
-            if self.unity_test_report_mode == UnityTestReportMode.REPLACE.value:
-                junit_parent.remove(junit_case)
-
-            for case in merging_cases:
-                case.attrib['is_unity_case'] = '1'
-                junit_parent.append(case)
-
-            junit_parent.attrib['errors'] = self._int_add(
-                junit_parent.attrib['errors'], merging_parent.attrib['errors']
-            )
-            junit_parent.attrib['failures'] = self._int_add(
-                junit_parent.attrib['failures'],
-                merging_parent.attrib['failures'],
-                -int(junit_case_is_fail),
-            )
-            junit_parent.attrib['skipped'] = self._int_add(
-                junit_parent.attrib['skipped'], merging_parent.attrib['skipped']
-            )
-            junit_parent.attrib['tests'] = self._int_add(
-                junit_parent.attrib['tests'], merging_parent.attrib['tests'], -1
-            )
-
-            if int(junit_parent.attrib['failures']) > 0:
-                self.failed = True
-
-        self.junit.write(self.junit_path)
+            logging.debug(f'Merging {file} to {self.junit_path}')
+            suite_index, junit_case_is_fail = index[test_case_name]
+            merging_attrib = _read_root_attrib(file)
+
+            deltas = suite_deltas.setdefault(suite_index, dict.fromkeys(self.COUNTER_ATTRS, 0))
+            deltas['errors'] += int(merging_attrib['errors'])
+            deltas['failures'] += int(merging_attrib['failures']) - int(junit_case_is_fail)
+            deltas['skipped'] += int(merging_attrib['skipped'])
+            deltas['tests'] += int(merging_attrib['tests']) - 1
+            suite_files.setdefault(suite_index, []).append(file)
+
+        merged_case_names = {name: index[name][0] for name, _ in merging}
+        self._write_merged(suite_deltas, suite_files, merged_case_names)
         logging.debug(f'Merged junit report dumped to {os.path.realpath(self.junit_path)}')
+
+    def attach(self, outputs: dict[str, dict[str, list[str]]]) -> None:
+        """
+        Append texts to the ``system-out`` or ``system-err`` of the test cases in the main junit report. Should be
+        called before `merge()`, while the test cases are still named after the pytest test cases.
+
+        Args:
+            outputs: test case name -> tag -> texts. The first test case is used if there're test cases with the same
+                name, the same as `merge()`
+        """
+        if not self.junit_path or not outputs or not os.path.isfile(self.junit_path):
+            return
+
+        outputs = dict(outputs)
+        tmp_path = self.junit_path + '.tmp'
+        parents: list[ET.Element] = []
+        with open(self.junit_path, 'rb') as fr, open(tmp_path, 'w', encoding='utf-8') as fw:
+            fw.write('<?xml version="1.0" encoding="utf-8"?>')
+            for event, elem in ET.iterparse(fr, events=('start', 'end')):
+                if event == 'start':
+                    if elem.tag in self.CONTAINER_TAGS:
+                        fw.write(escape_illegal_xml_chars(_start_tag(elem.tag, elem.attrib)))
+                        parents.append(elem)
+                    continue
+
+                if elem.tag in self.CONTAINER_TAGS:
+                    parents.pop()
+                    fw.write(f'</{elem.tag}>')
+                    continue
+
+                if not parents or elem not in parents[-1]:
+                    continue  # not a direct child of a test suite
+
+                if elem.tag == 'testcase' and elem.get('name') in outputs:
+                    for tag, texts in outputs.pop(elem.get('name')).items():
+                        sub_elem = elem.find(tag)
+                        if sub_elem is None:
+                            sub_elem = ET.SubElement(elem, tag)
+                        sub_elem.text = '\n'.join([sub_elem.text, *texts] if sub_elem.text else texts)
+
+                fw.write(escape_illegal_xml_chars(ET.tostring(elem, encoding='unicode')))
+                parents[-1].remove(elem)
+
+        os.replace(tmp_path, self.junit_path)
+
+    def _write_merged(
+        self,
+        suite_deltas: dict[int, dict[str, int]],
+        suite_files: dict[int, list[str]],
+        merged_case_names: dict[str, int],
+    ) -> None:
+        replace = self.unity_test_report_mode == UnityTestReportMode.REPLACE.value
+
+        tmp_path = self.junit_path + '.tmp'
+        parents: list[tuple[ET.Element, int]] = []
+        suite_count = 0
+        with open(self.junit_path, 'rb') as fr, open(tmp_path, 'w', encoding='utf-8') as fw:
+            fw.write('<?xml version="1.0" encoding="utf-8"?>')
+            for event, elem in ET.iterparse(fr, events=('start', 'end')):
+                if event == 'start':
+                    if elem.tag in self.CONTAINER_TAGS:
+                        attrib = dict(elem.attrib)
+                        for k, delta in suite_deltas.get(suite_count, {}).items():
+                            attrib[k] = self._int_add(attrib.get(k, 0), delta)
+                        if suite_count in suite_deltas and int(attrib.get('failures', 0)) > 0:
+                            self.failed = True
+
+                        fw.write(escape_illegal_xml_chars(_start_tag(elem.tag, attrib)))
+                        parents.append((elem, suite_count))
+                        suite_count += 1
+                    continue
+
+                if elem.tag in self.CONTAINER_TAGS:
+                    _, suite_index = parents.pop()
+                    for file in suite_files.get(suite_index, []):
+                        for case in _iter_root_children(file):
+                            if case.tag != 'testcase':
+                                continue
+                            case.attrib['is_unity_case'] = '1'
+                            fw.write(escape_illegal_xml_chars(ET.tostring(case, encoding='unicode')))
+                    fw.write(f'</{elem.tag}>')
+                    continue
+
+                if not parents or elem not in parents[-1][0]:
+                    continue  # not a direct child of a test suite
+
+                parent, suite_index = parents[-1]
+                if elem.tag == 'testcase' and merged_case_names.get(elem.get('name')) == suite_index:
+                    elem.attrib['is_unity_case'] = '0'
+                    if replace:
+                        parent.remove(elem)
+                        continue
+
+                fw.write(escape_illegal_xml_chars(ET.tostring(elem, encoding='unicode')))
+                parent.remove(elem)
+
+        os.replace(tmp_path, self.junit_path)
+        self.merged = True
@@ -197,6 +197,7 @@ class Meta:
     port_target_cache: dict[str, str]
     port_app_cache: dict[str, str]
     logfile_extension: str = '.log'
+    cache_dir: str | None = None
 
     def hit_port_target_cache(self, port: str, target: str) -> bool:
         if self.port_target_cache.get(port, None) == target:
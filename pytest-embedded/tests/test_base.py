@@ -186,6 +186,32 @@ def test_parallel_run(testdir, parallel_count, parallel_index, res):
     result.assert_outcomes(passed=res)
 
 
+def test_emulator_workers(testdir):
+    testdir.makepyfile(r"""
+        import os
+        import pytest
+
+        @pytest.mark.parametrize('i', range(4))
+        def test_pid(dut, i):
+            with open(f'pid-{i}', 'w') as fw:
+                fw.write(str(os.getpid()))
+
+        def test_fail(dut):
+            assert False
+    """)
+
+    junit_path = os.path.join(testdir.tmpdir, 'report.xml')
+    result = testdir.runpytest('--emulator-workers', '2', '--junitxml', junit_path)
+
+    assert result.ret == pytest.ExitCode.TESTS_FAILED
+    assert len({Path(testdir.tmpdir, f'pid-{i}').read_text() for i in range(4)}) == 2
+
+    testsuite = ET.parse(junit_path).getroot().find('testsuite')
+    assert testsuite.attrib['tests'] == '5'
+    assert testsuite.attrib['failures'] == '1'
+    assert len(testsuite.findall('testcase')) == 5
+
+
 def test_expect(testdir):
     testdir.makepyfile(r"""
         import re
@@ -419,6 +445,80 @@ def test_expect_unity_test_ouput(testdir, capsys):
     assert capsys.readouterr().out.count("raise AssertionError('Unity test failed')") == 2
 
 
+def test_unity_parser_incremental():
+    from pytest_embedded.unity import TestFormat, UnityParser
+
+    output = (
+        b'TEST(group, test_case)foo.c:100::FAIL:Expected 2 was 1\r\n'
+        b'TEST(group, test case 2)\r\n'
+        b'some \xe2\x80\x94 output\r\n'
+        b'foo bar.c:101::PASS\r\n'
+        b'TEST(group, test case 3) IGNORE\r\n'
+        b'-------------------\r\n'
+        b'3 Tests 1 Failures 1 Ignored\r\n'
+        b'FAIL\r\n'
+        b'TEST(group, after summary) PASS\r\n'
+    )
+
+    parser = UnityParser({'app_path': 'foo'}, record_time=True, stop_at_summary=True)
+    emitted = []
+    for i in range(len(output)):
+        cases = parser.feed(output[i : i + 1])
+        emitted.extend(cases)
+        # each case is emitted once its result line is complete
+        if cases:
+            assert output[: i + 1].endswith(b'\n')
+    emitted.extend(parser.flush())
+
+    assert parser.format == TestFormat.FIXTURE
+    assert parser.finished
+    assert [(c.name, c.result) for c in emitted] == [
+        ('test_case', 'FAIL'),
+        ('test case 2', 'PASS'),
+        ('test case 3', 'IGNORE'),
+    ]
+    assert emitted[0].attrs['message'] == 'Expected 2 was 1'
+    assert emitted[1].attrs['stdout'] == '\nsome — output\n'
+    assert emitted[1].attrs['file'] == 'foo bar.c'
+    assert all(c.attrs['app_path'] == 'foo' for c in emitted)
+    assert all(isinstance(c.attrs['time'], float) and c.timestamp for c in emitted)
+
+    parser = UnityParser()
+    cases = parser.feed('foo.c:100:test_case:FAIL:Expected 2 was 1\nfoo bar.c:102:test case: 3:PASS')
+    assert [(c.name, c.result) for c in cases] == [('test_case', 'FAIL')]
+    cases = parser.flush()
+    assert [(c.name, c.result) for c in cases] == [('test case: 3', 'PASS')]
+    assert parser.format == TestFormat.BASIC
+    assert 'time' not in cases[0].attrs
+
+
+def test_expect_unity_test_output_keeps_finished_cases(testdir):
+    testdir.makepyfile(r"""
+        import pexpect
+        import pytest
+
+        def test_expect_unity_test_output_timeout(dut):
+            dut.write(
+                'foo.c:100:test_case:PASS\n'
+                'foo.c:101:test_case_2:FAIL:Expected 1 was 2\n'
+                'Guru Meditation Error\n'
+            )
+            with pytest.raises(pexpect.TIMEOUT):
+                dut.expect_unity_test_output(timeout=1)
+
+            assert [c.name for c in dut.testsuite.testcases] == ['test_case', 'test_case_2']
+            assert dut.testsuite.attrs['failures'] == 1
+            assert dut.testsuite.testcases[0].attrs['time'] < 1
+    """)
+
+    result = testdir.runpytest()
+
+    # the assertions passed, only failed by the recorded unity case
+    result.assert_outcomes(failed=1)
+    result.stdout.fnmatch_lines(['*- test_case_2'])
+    result.stdout.no_fnmatch_line('*AssertionError: assert*')
+
+
 def test_expect_unity_test_output_multi_dut(testdir):
     testdir.makepyfile(r"""
         import pytest
@@ -547,6 +647,128 @@ def test_expect_unity_test_output_multi_dut_with_illegal_chars(testdir):
     assert junit_report[1].get('app_path') == f'{testdir.tmpdir}/bar'
 
 
+def test_expect_unity_test_output_stdout_max_size(testdir):
+    testdir.makepyfile(r"""
+        import glob
+        import os
+
+        def test_unity_stdout(dut):
+            dut.write(
+                'TEST(group, short)\n'
+                'short output\n'
+                ' PASS\n'
+                'TEST(group, long case)\n'
+                + 'long output line\n' * 10 +
+                'the last line\n'
+                ' PASS\n'
+                '-----\n'
+                '2 Tests 0 Failures 0 Ignored\n'
+                'OK\n'
+            )
+            dut.expect_unity_test_output()
+
+            short, long = dut.testsuite.testcases
+            assert short.attrs['stdout'] == '\nshort output\n '
+
+            stdout_files = glob.glob(os.path.join(os.path.dirname(dut.logfile), '*.stdout.log'))
+            assert [os.path.basename(f) for f in stdout_files] == ['1-long_case.stdout.log']
+            with open(stdout_files[0]) as fr:
+                assert fr.read().count('long output line') == 10
+            assert long.attrs['stdout'].startswith(f'[156 characters truncated, complete stdout: {stdout_files[0]}]\n')
+            assert long.attrs['stdout'].endswith('the last line\n ')
+    """)
+
+    result = testdir.runpytest('--unity-stdout-max-size', '30')
+
+    result.assert_outcomes(passed=1)
+
+
+@pytest.mark.parametrize('mode', ['replace', 'merge'])
+def test_junit_merger(tmp_path, monkeypatch, mode):
+    from pytest_embedded.unity import JunitMerger
+
+    monkeypatch.chdir(tmp_path)  # for the debug.xml
+
+    main_junit = tmp_path / 'report.xml'
+    main_junit.write_text(
+        '<?xml version="1.0" encoding="utf-8"?><testsuites>'
+        '<testsuite name="pytest" errors="0" failures="1" skipped="0" tests="3">'
+        '<testcase name="test_a"><failure message="Unity test failed" /></testcase>'
+        '<testcase name="test_b" />'
+        '<testcase name="test_c"><system-out>a &amp; b</system-out></testcase>'
+        '</testsuite></testsuites>'
+    )
+    for name, index, cases in [
+        ('test_a', 0, '<testcase name="a1" /><testcase name="a2"><failure message="x" /></testcase>'),
+        ('test_a', 1, '<testcase name="a3" />'),
+        ('test_b', None, '<testcase name="b1" />'),
+    ]:
+        failures = cases.count('<failure')
+        tests = cases.count('<testcase')
+        (tmp_path / name).mkdir(exist_ok=True)
+        (tmp_path / name / ('dut.xml' if index is None else f'dut-{index}.xml')).write_text(
+            f'<testsuite name="{name}" errors="0" failures="{failures}" skipped="0" tests="{tests}">{cases}</testsuite>'
+        )
+
+    merger = JunitMerger(str(main_junit), mode)
+    merger.merge(sorted(str(p) for p in tmp_path.glob('test_*/*.xml')))
+
+    assert merger.failed
+    assert [c.get('name') for c in ET.parse(tmp_path / 'test_a' / 'dut.xml').getroot()] == ['a1', 'a2', 'a3']
+
+    testsuite = ET.parse(main_junit).getroot()[0]
+    names = [(c.get('name'), c.get('is_unity_case')) for c in testsuite]
+    if mode == 'replace':
+        assert names == [('test_c', None), ('a1', '1'), ('a2', '1'), ('a3', '1'), ('b1', '1')]
+    else:
+        assert names == [
+            ('test_a', '0'),
+            ('test_b', '0'),
+            ('test_c', None),
+            ('a1', '1'),
+            ('a2', '1'),
+            ('a3', '1'),
+            ('b1', '1'),
+        ]
+    assert testsuite.find('testcase[@name="test_c"]/system-out').text == 'a & b'
+    assert testsuite.attrib == {'name': 'pytest', 'errors': '0', 'failures': '1', 'skipped': '0', 'tests': '5'}
+
+    with pytest.raises(ValueError, match='test_d'):
+        (tmp_path / 'test_d').mkdir()
+        (tmp_path / 'test_d' / 'dut.xml').write_text('<testsuite errors="0" failures="0" skipped="0" tests="0" />')
+        JunitMerger(str(main_junit), mode).merge([str(tmp_path / 'test_d' / 'dut.xml')])
+
+
+@pytest.mark.parametrize('prettify', [False, True])
+def test_sanitize_junit_report(tmp_path, prettify):
+    from pytest_embedded.unity import sanitize_junit_report
+
+    report = tmp_path / 'report.xml'
+    report.write_text(
+        '<?xml version="1.0" encoding="utf-8"?><testsuites><testsuite name="pytest" tests="2">'
+        '<testcase name="a &amp; b"><failure message="x\x86y">line 1\nline 2 &lt;\x7f&gt;</failure></testcase>'
+        '<testcase name="c" />'
+        '</testsuite></testsuites>',
+        encoding='utf-8',
+    )
+
+    # chunk boundaries in the middle of the tags and the entities
+    sanitize_junit_report(str(report), prettify=prettify, chunk_size=7)
+
+    content = report.read_text(encoding='utf-8')
+    assert '\x86' not in content
+    assert '\x7f' not in content
+    if prettify:
+        assert '\n\t\t<testcase name="c" />' in content
+
+    testsuite = ET.parse(report).getroot()[0]
+    assert testsuite.attrib == {'name': 'pytest', 'tests': '2'}
+    assert testsuite[0].get('name') == 'a & b'
+    assert testsuite[0][0].get('message') == 'xy'
+    assert testsuite[0][0].text == 'line 1\nline 2 <>'
+    assert testsuite[1].get('name') == 'c'
+
+
 def test_expect_before_match(testdir):
     testdir.makepyfile(r"""
         import pexpect
@@ -824,6 +1046,102 @@ def test_log_metric_without_path(pytester):
     result.assert_outcomes(passed=1)
 
 
+def test_log_metric_untyped_as_is(pytester):
+    metric_file = pytester.path / 'metrics.txt'
+    pytester.makepyfile("""
+        def test_metric(log_metric):
+            log_metric('boot-time', 1, **{'sdk-version': 'v5'})
+    """)
+
+    result = pytester.runpytest(f'--metric-path={metric_file}')
+    result.assert_outcomes(passed=1)
+
+    assert metric_file.read_text() == 'boot-time{sdk-version="v5"} 1\n'
+
+
+def test_log_metric_not_used(pytester):
+    metric_file = pytester.path / 'metrics.txt'
+    metric_file.write_text('previous 1\n')
+    pytester.makepyfile("""
+        def test_no_metric():
+            pass
+    """)
+
+    result = pytester.runpytest(f'--metric-path={metric_file}')
+    result.assert_outcomes(passed=1)
+
+    assert metric_file.read_text() == 'previous 1\n'
+
+
+def test_log_metric_typed(pytester):
+    metric_file = pytester.path / 'metrics.txt'
+    pytester.makepyfile(r"""
+        def test_metric_1(log_metric):
+            log_metric.counter('flash_retries', target='esp32')
+            log_metric.gauge('free_heap', 1000, path='C:\\a "b"\n')
+            log_metric.histogram('boot_time', 0.3, buckets=[0.5, 1])
+
+        def test_metric_2(log_metric):
+            log_metric.counter('flash_retries_total', 2, target='esp32')
+            log_metric.gauge('free_heap', 900, path='C:\\a "b"\n')
+            log_metric.histogram('boot_time', 0.8, buckets=[0.5, 1])
+            log_metric('untyped', 1)
+    """)
+
+    result = pytester.runpytest(f'--metric-path={metric_file}')
+    result.assert_outcomes(passed=2)
+
+    assert metric_file.read_text() == (
+        '# TYPE flash_retries counter\n'
+        'flash_retries_total{target="esp32"} 3\n'
+        '# TYPE free_heap gauge\n'
+        'free_heap{path="C:\\\\a \\"b\\"\\n"} 900\n'
+        '# TYPE boot_time histogram\n'
+        'boot_time_bucket{le="0.5"} 1\n'
+        'boot_time_bucket{le="1"} 2\n'
+        'boot_time_bucket{le="+Inf"} 2\n'
+        'boot_time_sum 1.1\n'
+        'boot_time_count 2\n'
+        'untyped 1\n'
+    )
+    assert not list(pytester.path.glob('metrics.txt.*'))
+
+
+def test_log_metric_merge_workers(tmp_path, monkeypatch):
+    from pytest_embedded.metrics import MetricSink
+
+    metric_path = str(tmp_path / 'metrics.txt')
+    MetricSink.clear(metric_path)
+    for worker in ['gw0', 'gw1']:
+        monkeypatch.setenv('PYTEST_XDIST_WORKER', worker)
+        sink = MetricSink(metric_path)
+        sink.counter('cases', target='esp32')
+        sink.histogram('duration', 2, buckets=[1, 5], target='esp32')
+        sink(f'{worker}_only', 1)
+        sink.flush()
+
+    with pytest.raises(ValueError, match='already logged as counter'):
+        sink.gauge('cases', 1)
+    with pytest.raises(ValueError, match='reserved'):
+        sink.histogram('duration', 1, le='1')
+
+    MetricSink.merge(metric_path)
+    with open(metric_path) as fr:
+        assert fr.read() == (
+            '# TYPE cases counter\n'
+            'cases_total{target="esp32"} 2\n'
+            '# TYPE duration histogram\n'
+            'duration_bucket{target="esp32",le="1"} 0\n'
+            'duration_bucket{target="esp32",le="5"} 2\n'
+            'duration_bucket{target="esp32",le="+Inf"} 2\n'
+            'duration_sum{target="esp32"} 4\n'
+            'duration_count{target="esp32"} 2\n'
+            'gw0_only 1\n'
+            'gw1_only 1\n'
+        )
+    assert os.listdir(tmp_path) == ['metrics.txt']
+
+
 # ---------------------------------------------------------------------------
 # Tests for the stdout-lock feature (_stdout_lock / set_stdout_lock / _listen)
 # ---------------------------------------------------------------------------
@@ -1092,3 +1410,141 @@ def test_forward_io_preserves_carriage_returns(tmp_path):
     finally:
         p.terminate()
         p.join(timeout=5)
+
+
+def test_forward_io_starts_from_offset(tmp_path):
+    from pytest_embedded.log import MessageQueue, _PopenRedirectProcess
+
+    logfile = str(tmp_path / 'redirect.log')
+    with open(logfile, 'wb') as fw:
+        fw.write(b'already consumed\n')
+
+    q = MessageQueue()
+    p = _PopenRedirectProcess(q, logfile, os.path.getsize(logfile))
+    p.start()
+    try:
+        with open(logfile, 'ab') as fw:
+            fw.write(b'new output\n')
+            fw.flush()
+        assert _drain(q) == b'new output\n'
+    finally:
+        p.terminate()
+        p.join(timeout=5)
+
+
+class _FakeResource:
+    def __init__(self, *others):
+        self.others = list(others)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_close_or_terminate_drops_references():
+    from pytest_embedded.dut_factory import _close_or_terminate, _register_resource
+
+    serial = _FakeResource()
+    dut = _FakeResource(serial)
+    dut.serial = serial
+    kept = [serial]  # not created by the fixtures
+    for obj in (serial, dut):
+        _register_resource(obj)
+
+    _close_or_terminate(serial)
+    assert serial.closed
+    assert dut.serial is None
+    assert dut.others == [None]
+    assert kept == [serial]
+
+
+class _CountingResource(_FakeResource):
+    visits = 0
+
+    def __getattribute__(self, name):
+        if name == '__dict__':
+            type(self).visits += 1
+        return super().__getattribute__(name)
+
+
+def test_close_or_terminate_flat_cost():
+    """
+    Only the live fixture-created objects are visited while teardown, no matter how much the heap grows
+    """
+    from pytest_embedded.dut_factory import _RESOURCES, _close_or_terminate, _register_resource
+
+    heap = []
+    baseline = len(_RESOURCES)
+    for _ in range(5000):
+        serial = _CountingResource()
+        dut = _CountingResource(serial)
+        for obj in (serial, dut):
+            _register_resource(obj)
+        heap.append([{'name': 'case', 'stdout': 'foo'} for _ in range(50)])
+        assert len(_RESOURCES) == baseline + 2
+
+        _CountingResource.visits = 0
+        for obj in (dut, serial):
+            _close_or_terminate(obj)
+        # closing the dut visits the serial, closing the serial visits nothing
+        assert _CountingResource.visits == 1
+        assert len(_RESOURCES) == baseline
+
+
+@pytest.mark.skipif(not os.getenv('PYTEST_EMBEDDED_BENCHMARK'), reason='set PYTEST_EMBEDDED_BENCHMARK to run')
+def test_close_or_terminate_flat_cost_benchmark():
+    """
+    Benchmark the teardown of a 5000-test session, while the heap keeps growing like the junit trees do
+    """
+    import statistics
+    import time
+
+    from pytest_embedded.dut_factory import _close_or_terminate, _register_resource
+
+    heap = []
+    durations = []
+    for _ in range(5000):
+        serial = _FakeResource()
+        dut = _FakeResource(serial)
+        for obj in (serial, dut):
+            _register_resource(obj)
+        heap.append([{'name': 'case', 'stdout': 'foo'} for _ in range(50)])
+
+        start = time.perf_counter()
+        for obj in (dut, serial):
+            _close_or_terminate(obj)
+        durations.append(time.perf_counter() - start)
+
+    first = statistics.median(durations[:500])
+    last = statistics.median(durations[-500:])
+    assert last < first * 3 + 50e-6, f'teardown took {first * 1e6:.1f}us first, {last * 1e6:.1f}us last'
+
+
+def test_search_log(tmp_path):
+    from pytest_embedded.dut import Dut
+    from pytest_embedded.log import PexpectProcess
+
+    logfile = tmp_path / 'dut.log'
+    first = b'boot\nCore 0 START\nfoo\nEND xx\n'
+    second = b'bar START\nbaz START\nqux END\n'
+    logfile.write_bytes(first + second[:14])
+
+    fr = open(logfile, 'rb')
+    pexpect_proc = PexpectProcess(fr)
+    pexpect_proc.watch_markers(b'START', b'END')
+    while pexpect_proc.read_offset < len(first) + 14:
+        pexpect_proc.read_nonblocking(3, timeout=0)  # markers split into several reads
+    assert pexpect_proc.marker_offsets(b'START') == (0, [12, len(first) + 4])
+    assert pexpect_proc.marker_offsets(b'END') == (0, [22])
+
+    with open(logfile, 'ab') as fw:
+        fw.write(second[14:] + b'START\nnot ended\n')
+
+    dut = Dut.__new__(Dut)
+    dut.logfile = str(logfile)
+    dut.pexpect_proc = pexpect_proc
+    assert list(dut.search_log('START', 'END')) == [b'Core 0 START\nfoo\nEND xx\n', second]
+
+    dut.pexpect_proc = None  # scanned
+    assert list(dut.search_log('START', 'END')) == [b'Core 0 START\nfoo\nEND xx\n', second]
+    fr.close()